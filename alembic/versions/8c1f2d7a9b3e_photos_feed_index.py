@@ -0,0 +1,26 @@
+"""photos feed index
+
+Revision ID: 8c1f2d7a9b3e
+Revises: 5507b57d5d0b
+Create Date: 2026-10-19 10:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1f2d7a9b3e'
+down_revision: Union[str, None] = '5507b57d5d0b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_photos_created_at_id', 'photos', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_photos_created_at_id', table_name='photos')
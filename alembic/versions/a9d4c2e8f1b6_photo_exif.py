@@ -0,0 +1,52 @@
+"""photo exif
+
+Revision ID: a9d4c2e8f1b6
+Revises: f5c1a9d3e7b2
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d4c2e8f1b6'
+down_revision: Union[str, None] = 'f5c1a9d3e7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photos', sa.Column('taken_at', sa.DateTime(), nullable=True))
+    op.add_column('photos', sa.Column('camera_make', sa.String(length=64), nullable=True))
+    op.add_column('photos', sa.Column('camera_model', sa.String(length=64), nullable=True))
+    op.add_column('photos', sa.Column('lens', sa.String(length=100), nullable=True))
+    op.add_column('photos', sa.Column('width', sa.Integer(), nullable=True))
+    op.add_column('photos', sa.Column('height', sa.Integer(), nullable=True))
+    op.add_column('photos', sa.Column('orientation', sa.SmallInteger(), nullable=True))
+    op.add_column('photos', sa.Column('gps_latitude', sa.Float(), nullable=True))
+    op.add_column('photos', sa.Column('gps_longitude', sa.Float(), nullable=True))
+    op.create_index(op.f('ix_photos_taken_at'), 'photos', ['taken_at'], unique=False)
+    op.create_index('ix_photos_gps', 'photos', ['gps_latitude', 'gps_longitude'], unique=False)
+    op.create_index('ix_photos_camera_make_lower', 'photos', [sa.text('lower(camera_make)')], unique=False)
+    op.create_index('ix_photos_camera_model_lower', 'photos', [sa.text('lower(camera_model)')], unique=False)
+    op.create_index('ix_photos_lens_lower', 'photos', [sa.text('lower(lens)')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_photos_lens_lower', table_name='photos')
+    op.drop_index('ix_photos_camera_model_lower', table_name='photos')
+    op.drop_index('ix_photos_camera_make_lower', table_name='photos')
+    op.drop_index('ix_photos_gps', table_name='photos')
+    op.drop_index(op.f('ix_photos_taken_at'), table_name='photos')
+    op.drop_column('photos', 'gps_longitude')
+    op.drop_column('photos', 'gps_latitude')
+    op.drop_column('photos', 'orientation')
+    op.drop_column('photos', 'height')
+    op.drop_column('photos', 'width')
+    op.drop_column('photos', 'lens')
+    op.drop_column('photos', 'camera_model')
+    op.drop_column('photos', 'camera_make')
+    op.drop_column('photos', 'taken_at')
@@ -0,0 +1,28 @@
+"""photo placeholders
+
+Revision ID: b3e7f2a5d8c4
+Revises: a9d4c2e8f1b6
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e7f2a5d8c4'
+down_revision: Union[str, None] = 'a9d4c2e8f1b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photos', sa.Column('lqip', sa.Text(), nullable=True))
+    op.add_column('photos', sa.Column('dominant_color', sa.String(length=7), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('photos', 'dominant_color')
+    op.drop_column('photos', 'lqip')
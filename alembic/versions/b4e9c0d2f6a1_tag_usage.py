@@ -0,0 +1,41 @@
+"""tag usage
+
+Revision ID: b4e9c0d2f6a1
+Revises: 8c1f2d7a9b3e
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e9c0d2f6a1'
+down_revision: Union[str, None] = '8c1f2d7a9b3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('tag_usage',
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.Column('usage_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('tag_id')
+    )
+    op.create_index(op.f('ix_tag_usage_updated_at'), 'tag_usage', ['updated_at'], unique=False)
+    # backfill from existing photo links
+    op.execute(
+        "INSERT INTO tag_usage (tag_id, usage_count, updated_at) "
+        "SELECT tags.id, COUNT(association_table.photos), CURRENT_TIMESTAMP "
+        "FROM tags LEFT JOIN association_table ON association_table.tags = tags.id "
+        "GROUP BY tags.id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_tag_usage_updated_at'), table_name='tag_usage')
+    op.drop_table('tag_usage')
@@ -0,0 +1,26 @@
+"""comments photo index
+
+Revision ID: d7a3e5f1c2b8
+Revises: b4e9c0d2f6a1
+Create Date: 2026-10-19 11:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3e5f1c2b8'
+down_revision: Union[str, None] = 'b4e9c0d2f6a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_comments_photo_id_created_at_id', 'comments', ['photo_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_comments_photo_id_created_at_id', table_name='comments')
@@ -0,0 +1,49 @@
+"""photo fingerprints
+
+Revision ID: e2b8f4a6c9d1
+Revises: d7a3e5f1c2b8
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b8f4a6c9d1'
+down_revision: Union[str, None] = 'd7a3e5f1c2b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photos', sa.Column('sha256', sa.String(length=64), nullable=True))
+    op.add_column('photos', sa.Column('dhash_0', sa.Integer(), nullable=True))
+    op.add_column('photos', sa.Column('dhash_1', sa.Integer(), nullable=True))
+    op.add_column('photos', sa.Column('dhash_2', sa.Integer(), nullable=True))
+    op.add_column('photos', sa.Column('dhash_3', sa.Integer(), nullable=True))
+    op.add_column('photos', sa.Column('similar_to_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('photos_similar_to_id_fkey', 'photos', 'photos', ['similar_to_id'], ['id'],
+                          ondelete='SET NULL')
+    op.create_index(op.f('ix_photos_sha256'), 'photos', ['sha256'], unique=False)
+    op.create_index(op.f('ix_photos_dhash_0'), 'photos', ['dhash_0'], unique=False)
+    op.create_index(op.f('ix_photos_dhash_1'), 'photos', ['dhash_1'], unique=False)
+    op.create_index(op.f('ix_photos_dhash_2'), 'photos', ['dhash_2'], unique=False)
+    op.create_index(op.f('ix_photos_dhash_3'), 'photos', ['dhash_3'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_photos_dhash_3'), table_name='photos')
+    op.drop_index(op.f('ix_photos_dhash_2'), table_name='photos')
+    op.drop_index(op.f('ix_photos_dhash_1'), table_name='photos')
+    op.drop_index(op.f('ix_photos_dhash_0'), table_name='photos')
+    op.drop_index(op.f('ix_photos_sha256'), table_name='photos')
+    op.drop_constraint('photos_similar_to_id_fkey', 'photos', type_='foreignkey')
+    op.drop_column('photos', 'similar_to_id')
+    op.drop_column('photos', 'dhash_3')
+    op.drop_column('photos', 'dhash_2')
+    op.drop_column('photos', 'dhash_1')
+    op.drop_column('photos', 'dhash_0')
+    op.drop_column('photos', 'sha256')
@@ -0,0 +1,26 @@
+"""photo thumbnails
+
+Revision ID: f5c1a9d3e7b2
+Revises: e2b8f4a6c9d1
+Create Date: 2026-10-19 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5c1a9d3e7b2'
+down_revision: Union[str, None] = 'e2b8f4a6c9d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photos', sa.Column('thumbnails', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('photos', 'thumbnails')
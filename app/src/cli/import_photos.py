@@ -0,0 +1,316 @@
+"""
+Bulk import of photo metadata from CSV or NDJSON.
+
+    python -m app.src.cli.import_photos library.ndjson
+    python -m app.src.cli.import_photos library.csv --db-url postgresql://...
+
+Every record has photo_url and owner (username or email), optionally description,
+created_at (ISO 8601), tags and ratings:
+    NDJSON: {"photo_url": "...", "owner": "anna", "tags": ["sea", "sun"], "ratings": {"bob": 5}}
+    CSV:    photo_url,owner,description,created_at,tags,ratings
+            https://...,anna,Sea,,sea sun,bob:5 carl@example.com:4
+
+Records are streamed into temporary staging tables (COPY on Postgres, executemany elsewhere),
+then owners, raters and tags are resolved with a few set-wise statements, photos get ids
+from an explicit offset, and photo ratings and tag usage are rebuilt in one pass each.
+The whole import is one transaction. The trending leaderboard is rebuilt after it commits,
+so imported rates count right away.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+import argparse
+import csv
+import json
+import sys
+import time
+
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table, create_engine, func,
+                        insert, literal, select, update)
+from redis.exceptions import RedisError
+from sqlalchemy.engine import Connection
+
+from app.src.conf.config import settings
+from app.src.database.bulk import bulk_insert, reset_sequences
+from app.src.database.models import Photo, Rate, Tag, User, association_table
+from app.src.repository.tags import rebuild_usage, valid_tag_names
+from app.src.services import trending
+
+CHUNK = 10_000
+
+staging = MetaData()
+staging_photos = Table(
+    "import_photos", staging,
+    Column("seq", Integer, primary_key=True),
+    Column("photo_url", String(255), nullable=False),
+    Column("owner", String(100), nullable=False),
+    Column("description", String(255)),
+    Column("created_at", DateTime),
+    Column("owner_id", Integer),
+    prefixes=["TEMPORARY"],
+)
+staging_tags = Table(
+    "import_tags", staging,
+    Column("seq", Integer, nullable=False),
+    Column("name", String(40), nullable=False),
+    prefixes=["TEMPORARY"],
+)
+staging_rates = Table(
+    "import_rates", staging,
+    Column("seq", Integer, nullable=False),
+    Column("rater", String(100), nullable=False),
+    Column("rate", Integer, nullable=False),
+    Column("user_id", Integer),
+    prefixes=["TEMPORARY"],
+)
+
+
+@dataclass
+class ImportStats:
+    records: int = 0
+    invalid: int = 0
+    photos: int = 0
+    unknown_owner: int = 0
+    tags_created: int = 0
+    rates: int = 0
+
+
+def _split(value) -> list[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return value.split()
+    return [str(item) for item in value]
+
+
+def _ratings(value) -> dict[str, int]:
+    """
+    Ratings as {"user": rate} or [{"user": ..., "rate": ...}] (NDJSON), "user:rate ..." (CSV)
+    """
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        pairs = value.items()
+    elif isinstance(value, list):
+        pairs = [(item["user"], item["rate"]) for item in value]
+    else:
+        pairs = [item.rsplit(":", 1) for item in value.split()]
+    ratings = {}
+    for user, rate in pairs:
+        rate = int(rate)
+        if not 1 <= rate <= 5:
+            raise ValueError(f"rate {rate} is out of 1..5")
+        ratings[str(user)] = rate
+    return ratings
+
+
+def parse_record(raw: dict) -> dict:
+    """
+    Validate and normalize one input record
+
+    Args:
+        raw (dict): record from CSV or NDJSON
+
+    Raises:
+        ValueError: required field is missing or a value is invalid
+
+    Returns:
+        dict: photo_url, owner, description, created_at, tags (valid names), ratings ({user: rate})
+    """
+    photo_url = (raw.get("photo_url") or "").strip()
+    owner = str(raw.get("owner") or "").strip()
+    if not photo_url or not owner:
+        raise ValueError("photo_url and owner are required")
+    created_at = raw.get("created_at") or None
+    return {
+        "photo_url": photo_url[:255],
+        "owner": owner,
+        "description": (raw.get("description") or "").strip()[:255] or None,
+        "created_at": datetime.fromisoformat(created_at) if created_at else None,
+        "tags": valid_tag_names(_split(raw.get("tags"))),
+        "ratings": _ratings(raw.get("ratings")),
+    }
+
+
+def read_records(file: TextIO, file_format: str) -> Iterator[dict]:
+    """
+    Read raw records lazily
+
+    Args:
+        file (TextIO): opened input
+        file_format (str): "csv" or "ndjson"
+
+    Returns:
+        Iterator[dict]: raw records
+    """
+    if file_format == "csv":
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def load_staging(conn: Connection, records: Iterable[dict], stats: ImportStats, chunk_size: int = CHUNK) -> None:
+    """
+    Create staging tables and fill them in chunks, invalid records are counted and skipped
+
+    Args:
+        conn (Connection): database connection in a transaction
+        records (Iterable[dict]): raw records
+        stats (ImportStats): counters to update
+        chunk_size (int, optional): records per COPY. Defaults to CHUNK.
+    """
+    staging.create_all(conn)
+    records = iter(records)
+    seq = 0
+    while chunk := list(islice(records, chunk_size)):
+        photos, tags, rates = [], [], []
+        for raw in chunk:
+            stats.records += 1
+            try:
+                record = parse_record(raw)
+            except (ValueError, KeyError, TypeError) as err:
+                stats.invalid += 1
+                print(f"record {stats.records} skipped: {err}", file=sys.stderr)
+                continue
+            seq += 1
+            photos.append({"seq": seq, "photo_url": record["photo_url"], "owner": record["owner"],
+                           "description": record["description"], "created_at": record["created_at"]})
+            tags.extend({"seq": seq, "name": name} for name in record["tags"])
+            rates.extend({"seq": seq, "rater": rater, "rate": rate} for rater, rate in record["ratings"].items())
+        bulk_insert(conn, staging_photos, photos)
+        bulk_insert(conn, staging_tags, tags)
+        bulk_insert(conn, staging_rates, rates)
+
+
+def _resolve_users(conn: Connection, table: Table, name_column: str, id_column: str) -> None:
+    """
+    Fill user ids of staging rows by email, then by username, both are unique indexes
+    """
+    for user_column in (User.email, User.username):
+        user_id = select(User.id).where(user_column == table.c[name_column]).scalar_subquery()
+        conn.execute(update(table).where(table.c[id_column].is_(None)).values({id_column: user_id}))
+
+
+def merge_staging(conn: Connection, stats: ImportStats) -> None:
+    """
+    Move staged records into the real tables with set-wise statements
+
+    Args:
+        conn (Connection): database connection in the transaction of load_staging
+        stats (ImportStats): counters to update
+    """
+    if conn.dialect.name == "postgresql":
+        # new photos use ids above the current max, keep the app from taking them meanwhile
+        conn.exec_driver_sql("LOCK TABLE photos IN SHARE ROW EXCLUSIVE MODE")
+    offset = conn.execute(select(func.coalesce(func.max(Photo.id), 0))).scalar()
+    now = datetime.now()
+
+    _resolve_users(conn, staging_photos, "owner", "owner_id")
+    _resolve_users(conn, staging_rates, "rater", "user_id")
+    stats.unknown_owner = conn.execute(
+        select(func.count()).select_from(staging_photos).where(staging_photos.c.owner_id.is_(None))
+    ).scalar()
+
+    imported = staging_photos.c.owner_id.is_not(None)
+    # tags.name has no index, a set difference reads it once instead of once per staged tag
+    new_names = (
+        select(staging_tags.c.name)
+        .join(staging_photos, staging_photos.c.seq == staging_tags.c.seq)
+        .where(imported)
+        .except_(select(Tag.name))
+    )
+    stats.tags_created = conn.execute(insert(Tag).from_select(["name"], new_names)).rowcount
+
+    stats.photos = conn.execute(insert(Photo).from_select(
+        ["id", "photo_url", "description", "owner_id", "rating", "created_at", "updated_at"],
+        select(staging_photos.c.seq + offset, staging_photos.c.photo_url, staging_photos.c.description,
+               staging_photos.c.owner_id, literal(0.0),
+               func.coalesce(staging_photos.c.created_at, literal(now, DateTime)), literal(now, DateTime))
+        .where(imported),
+    )).rowcount
+
+    tag_ids = select(Tag.name, func.min(Tag.id).label("id")).group_by(Tag.name).subquery()
+    conn.execute(insert(association_table).from_select(
+        ["photos", "tags"],
+        select(staging_tags.c.seq + offset, tag_ids.c.id)
+        .join(staging_photos, staging_photos.c.seq == staging_tags.c.seq)
+        .join(tag_ids, tag_ids.c.name == staging_tags.c.name)
+        .where(imported),
+    ))
+
+    stats.rates = conn.execute(insert(Rate).from_select(
+        ["rate", "photo_id", "user_id", "created_at", "updated_at"],
+        select(staging_rates.c.rate, staging_rates.c.seq + offset, staging_rates.c.user_id,
+               literal(now, DateTime), literal(now, DateTime))
+        .join(staging_photos, staging_photos.c.seq == staging_rates.c.seq)
+        .where(imported, staging_rates.c.user_id.is_not(None),
+               staging_rates.c.user_id != staging_photos.c.owner_id),
+    )).rowcount
+
+    # imported photos only have imported rates, so one grouped pass over them is enough
+    averages = (
+        select(Rate.photo_id, func.avg(Rate.rate).label("rating"))
+        .where(Rate.photo_id > offset)
+        .group_by(Rate.photo_id)
+        .subquery()
+    )
+    conn.execute(update(Photo).where(Photo.id == averages.c.photo_id).values(rating=averages.c.rating))
+
+    rebuild_usage(conn)
+    reset_sequences(conn)
+    staging.drop_all(conn)
+
+
+def import_records(conn: Connection, records: Iterable[dict], chunk_size: int = CHUNK) -> ImportStats:
+    """
+    Import photos with tags and ratings
+
+    Args:
+        conn (Connection): database connection in a transaction
+        records (Iterable[dict]): raw records, see module docstring
+        chunk_size (int, optional): records per COPY. Defaults to CHUNK.
+
+    Returns:
+        ImportStats: numbers of read, skipped and created rows
+    """
+    stats = ImportStats()
+    load_staging(conn, records, stats, chunk_size)
+    merge_staging(conn, stats)
+    return stats
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Import photo metadata from CSV or NDJSON")
+    parser.add_argument("path", help="input file, '-' for stdin")
+    parser.add_argument("--format", choices=("csv", "ndjson"),
+                        help="input format, guessed from the file extension by default")
+    parser.add_argument("--db-url", default=settings.sqlalchemy_database_url)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK)
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    file = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+    engine = create_engine(args.db_url)
+    start = time.perf_counter()
+    try:
+        with engine.begin() as conn:
+            stats = import_records(conn, read_records(file, file_format), args.chunk_size)
+    finally:
+        if file is not sys.stdin:
+            file.close()
+    print(f"imported {stats.photos} photos, {stats.rates} rates, {stats.tags_created} new tags "
+          f"in {time.perf_counter() - start:.1f}s; skipped {stats.invalid} invalid records "
+          f"and {stats.unknown_owner} with unknown owner", file=sys.stderr)
+    try:
+        with engine.connect() as conn:
+            trending.rebuild(conn)
+    except RedisError as err:
+        print(f"trending leaderboard not rebuilt: {err}, run python -m app.src.cli.rebuild_trending",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
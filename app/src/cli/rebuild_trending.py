@@ -0,0 +1,34 @@
+"""
+Rebuild the trending leaderboard in Redis from the rates table.
+
+    python -m app.src.cli.rebuild_trending
+    python -m app.src.cli.rebuild_trending --db-url postgresql://...
+
+Bulk imports run it on their own. Run it once when deploying the leaderboard to a database
+with existing rates, and as a maintenance job after restoring a database or losing Redis data.
+It is safe while the app serves requests: rates given during the rebuild are replayed onto it.
+"""
+import argparse
+import sys
+import time
+
+from sqlalchemy import create_engine
+
+from app.src.conf.config import settings
+from app.src.services import trending
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the trending leaderboard from the rates table")
+    parser.add_argument("--db-url", default=settings.sqlalchemy_database_url)
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.db_url)
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        photos = trending.rebuild(conn)
+    print(f"trending leaderboard rebuilt with {photos} photos in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,72 @@
-import cloudinary
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
     sqlalchemy_database_url: str
     jwt_secret_key: str
-    jwt_algorithm: str
-    mail_username: str
-    mail_password: str
-    mail_from: str
-    mail_port: int
-    mail_server: str
-    mail_from_name: str
-    redis_host: str
+    jwt_algorithm: str = "HS256"
+    mail_username: str = ""
+    mail_password: str = ""
+    mail_from: str = ""
+    mail_port: int = 465
+    mail_server: str = ""
+    mail_from_name: str = ""
+    mail_starttls: bool = False
+    mail_ssl_tls: bool = True
+    mail_use_credentials: bool = True
+    mail_validate_certs: bool = True
+    mail_timeout: float = 60.0
+    mail_pool_size: int = 4
+    mail_batch_size: int = 50
+    mail_idle_timeout: float = 60.0
+    redis_host: str = "localhost"
     redis_port: int = "6380"
-    cloudinary_name: str
-    cloudinary_api_key: str
-    cloudinary_api_secret: str
+    cloudinary_name: str = ""
+    cloudinary_api_key: str = ""
+    cloudinary_api_secret: str = ""
+    log_file: str = "info.log"
+    log_level: str = "INFO"
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+    log_batch_size: int = 100
+    log_flush_interval: float = 1.0
+    debug: bool = False
+    query_repeat_threshold: int = 10
+    trending_prior_votes: int = 5
+    trending_decay_seconds: int = 86400
+    tag_index_refresh_seconds: float = 5.0
+    upload_concurrency: int = 8
+    bulk_upload_max_files: int = 100
+    batch_max_ids: int = 100
+    # candidates share one of 4 dHash bands, which finds every match only up to 3 differing bits
+    near_duplicate_distance: int = Field(3, ge=0, le=3)
+    thumbnail_sizes: list[int] = [128, 512, 1024]
+    thumbnail_quality: int = 80
+    thumbnail_workers: int = 2
+    photo_cache_control: str = "public, max-age=0, s-maxage=60, stale-while-revalidate=30"
+    job_backend: str = "redis"
+    job_stream: str = "photoshare:jobs"
+    job_concurrency: int = 8
+    job_max_attempts: int = 5
+    job_retry_delay: float = 2.0
+    job_retry_max_delay: float = 600.0
+    job_visibility_timeout: int = 300
+    rate_limit_backend: str = "redis"
+    rate_limits: dict[str, str] = {"login": "10/minute", "signup": "5/minute", "upload": "60/minute",
+                                   "transform": "20/minute", "qr": "60/minute"}
+    server_bind: str = "0.0.0.0:8000"
+    server_workers: int = 0
+    server_loop: str = "uvloop"
+    server_http: str = "httptools"
+    server_backlog: int = 2048
+    server_keepalive: int = 5
+    server_max_requests: int = 10000
+    server_max_requests_jitter: int = 1000
+    server_timeout: int = 60
+    server_graceful_timeout: int = 30
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
 
 settings = Settings()
 
-
-cloudinary_config = cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
\ No newline at end of file
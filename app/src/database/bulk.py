@@ -0,0 +1,65 @@
+"""
+Bulk loading helpers: COPY on Postgres, executemany elsewhere.
+"""
+from datetime import datetime
+import io
+
+from sqlalchemy import Table
+from sqlalchemy.engine import Connection
+
+
+def _csv_field(value) -> str:
+    """
+    Field of a COPY csv line. NULL is an unquoted empty field, so every text value is quoted
+    and empty strings stay empty strings
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        value = "t" if value else "f"
+    elif isinstance(value, (int, float)):
+        return str(value)
+    elif isinstance(value, datetime):
+        value = value.isoformat(sep=" ")
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def bulk_insert(conn: Connection, table: Table, rows: list[dict]) -> None:
+    """
+    Insert rows with COPY on Postgres and executemany elsewhere
+
+    Args:
+        conn (Connection): database connection
+        table (Table): target table
+        rows (list[dict]): rows, all with the same keys
+    """
+    if not rows:
+        return
+    if conn.dialect.name != "postgresql":
+        conn.execute(table.insert(), rows)
+        return
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(_csv_field(row[column]) for column in columns) + "\n")
+    buffer.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def reset_sequences(conn: Connection) -> None:
+    """
+    Move Postgres id sequences past rows inserted with explicit ids
+
+    Args:
+        conn (Connection): database connection
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    for table in ("users", "photos", "tags", "comments", "rates"):
+        conn.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+        )
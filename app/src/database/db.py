@@ -2,9 +2,13 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.src.conf.config import settings
+from app.src.services.metrics import track_pool
+from app.src.database import profiling
 
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
+track_pool(engine)
+profiling.install(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -15,3 +19,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_session_factory() -> sessionmaker:
+    """
+    Session factory for work that outlives the request, e.g. streamed responses:
+    sessions from get_db are closed before the response body is sent.
+    """
+    return SessionLocal
@@ -1,4 +1,5 @@
-from sqlalchemy import String, DateTime, ForeignKey, Table, Column, Boolean, Float
+from sqlalchemy import (String, DateTime, ForeignKey, Table, Column, Boolean, Float, Index, JSON, SmallInteger, Text,
+                        func)
 from sqlalchemy.orm import declarative_base, mapped_column, Mapped, relationship
 from datetime import datetime
 
@@ -25,6 +26,13 @@ class Tag(Base):
     name: Mapped[str] = mapped_column(String(40), nullable=False)
 
 
+class TagUsage(Base):
+    __tablename__ = 'tag_usage'
+    tag_id: Mapped[int] = mapped_column(ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
+    usage_count: Mapped[int] = mapped_column(default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now, index=True)
+
+
 class Comment(BaseTable):
     __tablename__ = 'comments'
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -32,6 +40,9 @@ class Comment(BaseTable):
     photo_id: Mapped[int] = mapped_column(ForeignKey("photos.id"))
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
 
+    # keyset pagination and counts of photo's comments
+    __table_args__ = (Index("ix_comments_photo_id_created_at_id", "photo_id", "created_at", "id"),)
+
 
 class Photo(BaseTable):
     __tablename__ = 'photos'
@@ -44,6 +55,51 @@ class Photo(BaseTable):
     tags: Mapped[list[Tag]] = relationship("Tag", secondary="association_table", backref="photos")
     comments: Mapped[list[Comment]] = relationship("Comment")
     rating: Mapped[Float] = mapped_column(Float, nullable=True, default=0.0)
+    # deduplication fingerprints: content hash and 64-bit dHash in 16-bit bands, see services/image_hash.py
+    sha256: Mapped[str] = mapped_column(String(64), nullable=True, index=True)
+    dhash_0: Mapped[int] = mapped_column(nullable=True, index=True)
+    dhash_1: Mapped[int] = mapped_column(nullable=True, index=True)
+    dhash_2: Mapped[int] = mapped_column(nullable=True, index=True)
+    dhash_3: Mapped[int] = mapped_column(nullable=True, index=True)
+    # closest near duplicate found at upload
+    similar_to_id: Mapped[int] = mapped_column(ForeignKey("photos.id", ondelete="SET NULL"), nullable=True)
+    # urls of WebP renditions by max size, e.g. {"128": url, "512": url}, see services/thumbnails.py
+    thumbnails: Mapped[dict] = mapped_column(JSON, nullable=True)
+    # EXIF metadata, see services/exif.py; width and height as displayed
+    taken_at: Mapped[datetime] = mapped_column(DateTime, nullable=True, index=True)
+    camera_make: Mapped[str] = mapped_column(String(64), nullable=True)
+    camera_model: Mapped[str] = mapped_column(String(64), nullable=True)
+    lens: Mapped[str] = mapped_column(String(100), nullable=True)
+    width: Mapped[int] = mapped_column(nullable=True)
+    height: Mapped[int] = mapped_column(nullable=True)
+    orientation: Mapped[int] = mapped_column(SmallInteger, nullable=True)
+    gps_latitude: Mapped[float] = mapped_column(Float, nullable=True)
+    gps_longitude: Mapped[float] = mapped_column(Float, nullable=True)
+    # tiny WebP data URI and hex colour shown while the image loads, see services/placeholders.py
+    lqip: Mapped[str] = mapped_column(Text, nullable=True)
+    dominant_color: Mapped[str] = mapped_column(String(7), nullable=True)
+
+    # keyset pagination of the feed: one range scan per page
+    __table_args__ = (Index("ix_photos_created_at_id", "created_at", "id"),
+                      Index("ix_photos_gps", "gps_latitude", "gps_longitude"))
+
+    @property
+    def exif(self) -> dict | None:
+        """
+        EXIF columns as one dict for responses, None when the photo has no metadata.
+        The GPS position is left out, it is only used by search filters
+        """
+        values = {name: getattr(self, name) for name in EXIF_COLUMNS if not name.startswith("gps_")}
+        return values if any(value is not None for value in values.values()) else None
+
+
+EXIF_COLUMNS = ("taken_at", "camera_make", "camera_model", "lens", "width", "height",
+                "orientation", "gps_latitude", "gps_longitude")
+
+# case insensitive equality filters of find_photos
+Index("ix_photos_camera_make_lower", func.lower(Photo.camera_make))
+Index("ix_photos_camera_model_lower", func.lower(Photo.camera_model))
+Index("ix_photos_lens_lower", func.lower(Photo.lens))
 
 
 class User(BaseTable):
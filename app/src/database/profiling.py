@@ -0,0 +1,168 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+import logging
+import re
+import time
+import warnings
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+
+from app.src.conf.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# "IN (?, ?, ?)" and "VALUES (?, ?), (?, ?)" differ only by number of bound parameters
+_PARAM = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+_PARAM_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)(?:\s*,\s*\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\))*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class NPlusOneWarning(UserWarning):
+    """
+    Same statement shape was executed too many times within one request
+    """
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Normalize SQL statement so executions differing only in bound parameters compare equal
+
+    Args:
+        statement (str): SQL statement as sent to DBAPI cursor
+
+    Returns:
+        str: normalized statement
+    """
+    return _PARAM_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """
+    Number of queries, rows and DB time collected while tracking is active
+    """
+    __slots__ = ("count", "rows", "duration", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.rows = 0
+        self.duration = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, rowcount: int, elapsed: float) -> None:
+        self.count += 1
+        self.duration += elapsed
+        if rowcount and rowcount > 0:
+            self.rows += rowcount
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        Statement shapes executed more than threshold times
+        """
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    start = conn.info.pop("query_start", None)
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+    stats.record(statement, cursor.rowcount, elapsed)
+
+
+def install(engine: Engine) -> None:
+    """
+    Hook engine cursor events, queries are counted only while tracking is active
+
+    Args:
+        engine (Engine): SQLAlchemy engine
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def current_stats() -> QueryStats | None:
+    """
+    Query stats of the current request, None if tracking is not active
+    """
+    return _current_stats.get()
+
+
+def check_n_plus_one(stats: QueryStats, threshold: int | None = None, label: str = "") -> None:
+    """
+    Warn with NPlusOneWarning for every statement shape repeated above the threshold
+
+    Args:
+        stats (QueryStats): collected stats
+        threshold (int, optional): allowed repetitions. Defaults to settings.query_repeat_threshold
+        label (str, optional): request description for the message
+    """
+    threshold = settings.query_repeat_threshold if threshold is None else threshold
+    for shape, count in stats.repeated(threshold):
+        message = f"{label}: statement executed {count} times (threshold {threshold}): {shape[:300]}"
+        logger.warning(message)
+        warnings.warn(message, NPlusOneWarning, stacklevel=2)
+
+
+@contextmanager
+def track_queries(threshold: int | None = None, label: str = "") -> Iterator[QueryStats]:
+    """
+    Collect query stats for the enclosed block and check it for N+1 patterns
+
+    Args:
+        threshold (int, optional): allowed repetitions of one statement shape
+        label (str, optional): block description for N+1 warnings
+
+    Yields:
+        QueryStats: stats being collected
+    """
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+    check_n_plus_one(stats, threshold, label or "block")
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware counting queries per request in debug mode.
+    Adds X-DB-Query-Count, X-DB-Rows and X-DB-Time-Ms response headers
+    and warns about N+1 patterns
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.debug:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"].extend([
+                    (b"x-db-query-count", str(stats.count).encode()),
+                    (b"x-db-rows", str(stats.rows).encode()),
+                    (b"x-db-time-ms", f"{stats.duration * 1000:.3f}".encode()),
+                ])
+            await send(message)
+
+        with track_queries(label=f"{scope['method']} {scope['path']}") as stats:
+            await self.app(scope, receive, send_wrapper)
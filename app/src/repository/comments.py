@@ -1,25 +1,54 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func, tuple_
 from pydantic import ValidationError
 from copy import copy
+from datetime import datetime
 
 from app.src.database.models import Comment
 from app.src.schemas import CommentModel
 
 
-async def get_comments(photo_id: int, db: Session) -> list[Comment] | None:
+async def get_comments_page(photo_id: int, db: Session, limit: int,
+                            after: tuple[datetime, int] | None = None) -> list[Comment]:
     """
-    Get specidied user's comment to specified photo from the database
+    Get page of photo's comments from oldest, keyset paginated by (created_at, id)
 
     Args:
         photo_id (int): id of the photo
         db (Session): database session
+        limit (int): max number of comments
+        after (tuple[datetime, int], optional): (created_at, id) of the last comment of the previous page
 
     Returns:
-        list[Comment]: list of comment object
-    """    
-    comments = db.query(Comment).filter(Comment.photo_id == photo_id).all()
+        list[Comment]: list of comment objects
+    """
+    comments = db.query(Comment).filter(Comment.photo_id == photo_id)
+    if after is not None:
+        comments = comments.filter(tuple_(Comment.created_at, Comment.id) > tuple_(*after))
+    return comments.order_by(Comment.created_at, Comment.id).limit(limit).all()
+
+
+async def count_comments(photo_ids: list[int], db: Session) -> dict[int, int]:
+    """
+    Count comments of several photos in one query
 
-    return comments
+    Args:
+        photo_ids (list[int]): ids of the photos
+        db (Session): database session
+
+    Returns:
+        dict[int, int]: number of comments by photo id, 0 for photos without comments
+    """
+    counts = dict.fromkeys(photo_ids, 0)
+    if photo_ids:
+        rows = (
+            db.query(Comment.photo_id, func.count(Comment.id))
+            .filter(Comment.photo_id.in_(photo_ids))
+            .group_by(Comment.photo_id)
+            .all()
+        )
+        counts.update(rows)
+    return counts
 
 
 async def get_comment_by_user(photo_id: int, user_id: int, db: Session) -> Comment | None:
@@ -1,11 +1,14 @@
+from collections import Counter, defaultdict
 from typing import List, Optional
-from datetime import date
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from pydantic import ValidationError
+from datetime import date, datetime
+from sqlalchemy.orm import Session, selectinload, joinedload, raiseload
+from sqlalchemy import or_, tuple_, exists, func
 
 from app.src.database.models import Photo, Tag
-from app.src.schemas import PhotoModel, TagModel
+from app.src.schemas import PhotoModel, MetadataFilter
+from app.src.conf.config import settings
+from app.src.repository.tags import valid_tag_names, resolve_tags, adjust_usage
+from app.src.services import trending, image_hash
 
 
 async def create_photo(db: Session, photo_to_create: PhotoModel, user_id: int, tags_list: list[str]):
@@ -22,31 +25,218 @@ async def create_photo(db: Session, photo_to_create: PhotoModel, user_id: int, t
         [ResponseType]: PhotoModel
     """
 
-    new_photo = Photo(**photo_to_create.model_dump())
+    new_photo = _new_photo(photo_to_create)
 
     valid_tags = process_tags(db, tags_list)
     for tag in valid_tags:
         new_photo.tags.append(tag)
 
     db.add(new_photo)
+    adjust_usage(db, [tag.id for tag in valid_tags], 1)
     db.commit()
     db.refresh(new_photo)
 
     return new_photo
 
 
-async def get_photo_by_id(db: Session, photo_id: int):
+DHASH_COLUMNS = (Photo.dhash_0, Photo.dhash_1, Photo.dhash_2, Photo.dhash_3)
+
+
+def _new_photo(photo_to_create: PhotoModel) -> Photo:
+    data = photo_to_create.model_dump()
+    dhash = data.pop("dhash")
+    data.update(data.pop("exif") or {})
+    if dhash is not None:
+        data.update((column.key, band) for column, band in zip(DHASH_COLUMNS, image_hash.bands(dhash)))
+    return Photo(**data)
+
+
+def photo_loaders(tags: str | None = "selectin", owner: bool = False) -> list:
+    """
+    photo_loaders
+    Loader options for queries whose photos are serialized in responses.
+    In debug mode any other relationship raises on lazy load, so a new N+1 fails loudly
+    Args:
+        tags (str | None, optional): "selectin" for lists, "joined" for one photo, None to skip.
+            Defaults to "selectin".
+        owner (bool, optional): load owner in the same query. Defaults to False.
+
+    Returns:
+        list: options for Query.options
+    """
+    options = []
+    if tags == "selectin":
+        options.append(selectinload(Photo.tags))
+    elif tags == "joined":
+        options.append(joinedload(Photo.tags))
+    if owner:
+        options.append(joinedload(Photo.user))
+    if settings.debug:
+        options.append(raiseload("*", sql_only=True))
+    return options
+
+
+async def create_photos(db: Session, photos_to_create: list[tuple[PhotoModel, list[str]]]) -> list[Photo]:
+    """
+    create_photos
+    A function to create many photo records with their tags in one transaction
+    Args:
+        db (Session): database
+        photos_to_create (list[tuple[PhotoModel, list[str]]]): photo schemas with their tags
+
+    Returns:
+        list[Photo]: created photos in the given order
+    """
+    names_per_photo = [valid_tag_names(tags_list) for _, tags_list in photos_to_create]
+    tags = resolve_tags(db, (name for names in names_per_photo for name in names))
+
+    new_photos = []
+    usage = Counter()
+    for (photo_to_create, _), names in zip(photos_to_create, names_per_photo):
+        new_photo = _new_photo(photo_to_create)
+        new_photo.tags = [tags[name] for name in names]
+        usage.update(tags[name].id for name in names)
+        new_photos.append(new_photo)
+    db.add_all(new_photos)
+
+    tags_by_delta = defaultdict(list)
+    for tag_id, delta in usage.items():
+        tags_by_delta[delta].append(tag_id)
+    for delta, tag_ids in tags_by_delta.items():
+        adjust_usage(db, tag_ids, delta)
+
+    db.flush()
+    photo_ids = [photo.id for photo in new_photos]
+    db.commit()
+    # commit expires the photos, load them back with one query instead of one per photo
+    db.query(Photo).filter(Photo.id.in_(photo_ids)).all()
+    return new_photos
+
+
+async def get_photos_by_sha256(db: Session, hashes: list[str]) -> dict[str, Photo]:
+    """
+    get_photos_by_sha256
+    Find stored copies of files by content hash with one query
+    Args:
+        db (Session): database
+        hashes (list[str]): hex SHA-256 of files
+
+    Returns:
+        dict[str, Photo]: the oldest photo for every hash that is already stored
+    """
+    if not hashes:
+        return {}
+    photos = db.query(Photo).filter(Photo.sha256.in_(set(hashes))).order_by(Photo.id.desc()).all()
+    return {photo.sha256: photo for photo in photos}
+
+
+async def find_similar_photos(db: Session, hashes: list[int], max_distance: int) -> dict[int, int]:
+    """
+    find_similar_photos
+    Find near duplicates by dHash with one query: candidates share at least one 16-bit band,
+    which every photo within distance 3 does, then exact Hamming distance is checked
+    Args:
+        db (Session): database
+        hashes (list[int]): dHashes of new images
+        max_distance (int): max number of different bits, up to 3
+
+    Returns:
+        dict[int, int]: id of the closest photo for every hash that has one
+    """
+    if not hashes:
+        return {}
+    values = [set() for _ in DHASH_COLUMNS]
+    for dhash in hashes:
+        for band_values, band in zip(values, image_hash.bands(dhash)):
+            band_values.add(band)
+    candidates = (
+        db.query(Photo.id, *DHASH_COLUMNS)
+        .filter(or_(*(column.in_(band_values) for column, band_values in zip(DHASH_COLUMNS, values))))
+        .all()
+    )
+    similar = {}
+    for dhash in hashes:
+        best = None
+        for photo_id, *bands in candidates:
+            if None in bands:
+                continue
+            distance = image_hash.hamming(dhash, image_hash.from_bands(bands))
+            if distance <= max_distance and (best is None or (distance, photo_id) < best):
+                best = (distance, photo_id)
+        if best:
+            similar[dhash] = best[1]
+    return similar
+
+
+async def is_photo_url_shared(db: Session, photo_url: str, photo_id: int) -> bool:
+    """
+    is_photo_url_shared
+    Check if other photos use the same stored file, exact duplicates reuse it
+    Args:
+        db (Session): database
+        photo_url (str): url of the stored file
+        photo_id (int): photo to exclude
+
+    Returns:
+        bool: the file is used by another photo
+    """
+    return db.query(exists().where(Photo.photo_url == photo_url, Photo.id != photo_id)).scalar()
+
+
+async def get_photo_by_id(db: Session, photo_id: int, with_tags: bool = False, with_owner: bool = False):
     """
     get_photo_by_id
     A function to find photo in database by photo's id
     Args:
         db (Session): database
         photo_id (int): photo to be returned
+        with_tags (bool, optional): load tags in the same query, for serialized photos. Defaults to False.
+        with_owner (bool, optional): load owner in the same query. Defaults to False.
 
     Returns:
         Photo or None: The photo object if found, otherwise `None`
     """
-    return db.query(Photo).filter(Photo.id == photo_id).first()
+    photos = db.query(Photo)
+    if with_tags or with_owner:
+        photos = photos.options(*photo_loaders("joined" if with_tags else None, with_owner))
+    return photos.filter(Photo.id == photo_id).first()
+
+
+async def get_photos_by_ids(db: Session, photo_ids: list[int]) -> list[Photo]:
+    """
+    get_photos_by_ids
+    A function to get many photos with one IN query and one query for their tags
+    Args:
+        db (Session): database
+        photo_ids (list[int]): ids of the photos
+
+    Returns:
+        List[Photo]: found photos in the order of photo_ids, missing ids are skipped
+    """
+    if not photo_ids:
+        return []
+    photos = db.query(Photo).options(*photo_loaders()).filter(Photo.id.in_(photo_ids)).all()
+    by_id = {photo.id: photo for photo in photos}
+    return [by_id[photo_id] for photo_id in photo_ids if photo_id in by_id]
+
+
+async def get_feed(db: Session, limit: int, after: Optional[tuple[datetime, int]] = None):
+    """
+    get_feed
+    A function to get page of photos ordered from newest, keyset paginated by (created_at, id)
+    Args:
+        db (Session): database
+        limit (int): max number of photos to return
+        after (Optional[tuple[datetime, int]], optional): (created_at, id) of the last photo
+            of the previous page. Defaults to None for the first page.
+
+    Returns:
+        List[Photo]: photos with tags loaded
+    """
+    photos = db.query(Photo).options(*photo_loaders())
+    if after is not None:
+        photos = photos.filter(tuple_(Photo.created_at, Photo.id) < tuple_(*after))
+    return photos.order_by(Photo.created_at.desc(), Photo.id.desc()).limit(limit).all()
 
 
 async def edit_photo_tags(db: Session, photo_id: int, new_tags: str):
@@ -75,8 +265,15 @@ async def edit_photo_tags(db: Session, photo_id: int, new_tags: str):
     if not new_tags:
         return None
 
+    old_ids = {tag.id for tag in photo.tags}
+    new_ids = {tag.id for tag in new_tags}
+    adjust_usage(db, old_ids - new_ids, -1)
+    adjust_usage(db, new_ids - old_ids, 1)
+
     photo.tags.clear()
     photo.tags = new_tags
+    # links live in association table, bump the photo row so its ETag changes
+    photo.updated_at = datetime.now()
 
     db.commit()
     return photo
@@ -86,7 +283,9 @@ async def edit_photo_tags(db: Session, photo_id: int, new_tags: str):
 def process_tags(db: Session, tags_list: list[str]) -> list:
     """
     process_tags
-    A function to check if provided tags exisit in database and return a list of valid tags
+    A function to check if provided tags exisit in database and return a list of valid tags.
+    Tag names are normalized first, so case and leading '#' do not create new tags.
+    New tags are flushed, not committed, the caller commits them together with the photo
     Args:
         db (Session): database
         tags_list (list[str]): list of strings to be added as tags to photo
@@ -96,26 +295,9 @@ def process_tags(db: Session, tags_list: list[str]) -> list:
                    limited to the first 5 unique valid tags found or created.
     """
 
-    valid_tags = []
-    unique_tags_name = set()
-    for tag_name in tags_list:
-        if tag_name in unique_tags_name:
-            continue
-        try:
-            tag_data = TagModel(name=tag_name)
-            tag = db.query(Tag).filter(Tag.name == tag_data.name).first()
-            if not tag:
-                tag = Tag(name=tag_data.name)
-                db.add(tag)
-                db.commit()
-            unique_tags_name.add(tag_name)
-            valid_tags.append(tag)
-
-        except ValidationError as e:
-            print(f"Tag validation error for '{tag_name}':", e.errors())
-            continue
-
-    return valid_tags[:5]
+    names = valid_tag_names(tags_list)
+    tags = resolve_tags(db, names)
+    return [tags[name] for name in names]
 
 
 async def edit_photo_description(db: Session, photo_id: int, user_id: int, new_description: str):
@@ -164,8 +346,10 @@ async def delete_photo(db: Session, photo_id: int,):
     )
     if not photo:
         return False
+    adjust_usage(db, [tag.id for tag in photo.tags], -1)
     db.delete(photo)
     db.commit()
+    trending.safely(trending.remove_photo, photo_id)
     return True
 
 
@@ -176,12 +360,13 @@ async def find_photos(db: Session,
                       max_rating: Optional[float] = None,
                       start_date: Optional[date] = None,
                       end_date: Optional[date] = None,
+                      metadata: Optional[MetadataFilter] = None,
                       ):
     """
     find_photos
     Searches for photos in the database that match specified filters. Photos can be filtered by
-    a keyword present in their description or tags, a rating range, and/or a creation date range.
-    Results can be sorted by rating or creation date in descending order
+    a keyword present in their description or tags, a rating range, a creation date range and/or
+    EXIF metadata. Results can be sorted by rating, creation date or capture date in descending order
 
     Args:
         db (Session): database
@@ -191,16 +376,23 @@ async def find_photos(db: Session,
         max_rating (Optional[float], optional): maximal photo rating to be used as filter to query. Defaults to None.
         start_date (Optional[date], optional): minimal photo creation date to be used as filter to query. Defaults to None.
         end_date (Optional[date], optional): maximal photo creation date to be used as filter to query. Defaults to None.
+        metadata (Optional[MetadataFilter], optional): EXIF filters, each one uses an index. Defaults to None.
 
     Returns:
-        List[Photo]: A list of Photo objects that match the criteria. Returns an empty list if no keyword is provided or no photos match the criteria.
+        List[Photo]: A list of Photo objects that match the criteria. Returns an empty list if neither keyword
+        nor metadata filter is provided or no photos match the criteria.
     """
 
     q = key_word.strip() if key_word else ""
-    if not q:
+    metadata_filters = _metadata_filters(metadata) if metadata else []
+    if not q and not metadata_filters:
         return []
 
-    photos = db.query(Photo).filter(
+    photos = db.query(Photo).options(*photo_loaders())
+    if metadata_filters:
+        photos = photos.filter(*metadata_filters)
+    if q:
+        photos = photos.filter(
             or_(
                 Photo.description.ilike(f"%{q}%"),
                 Photo.tags.any(Tag.name.ilike(f"%{q}%")),
@@ -225,4 +417,43 @@ async def find_photos(db: Session,
     elif sort_by == 'date':
         photos = photos.order_by(Photo.created_at.desc())
 
+    elif sort_by == 'taken':
+        # photos without EXIF last on every database, Postgres sorts NULL first in descending order
+        photos = photos.order_by(Photo.taken_at.desc().nulls_last(), Photo.id.desc())
+
     return photos.all()
+
+
+def _metadata_filters(metadata: MetadataFilter) -> list:
+    """
+    _metadata_filters
+    Conditions for EXIF filters, text fields compare lowercased to match the lower() indexes
+    Args:
+        metadata (MetadataFilter): filters from request
+
+    Returns:
+        list: SQLAlchemy conditions
+    """
+    conditions = []
+    for column, value in ((Photo.camera_make, metadata.camera_make),
+                          (Photo.camera_model, metadata.camera_model),
+                          (Photo.lens, metadata.lens)):
+        if value and value.strip():
+            conditions.append(func.lower(column) == value.strip().lower())
+    if metadata.taken_from:
+        conditions.append(Photo.taken_at >= metadata.taken_from)
+    if metadata.taken_to:
+        conditions.append(Photo.taken_at <= metadata.taken_to)
+    if metadata.min_latitude is not None:
+        conditions.append(Photo.gps_latitude >= metadata.min_latitude)
+    if metadata.max_latitude is not None:
+        conditions.append(Photo.gps_latitude <= metadata.max_latitude)
+    if metadata.min_longitude is not None:
+        conditions.append(Photo.gps_longitude >= metadata.min_longitude)
+    if metadata.max_longitude is not None:
+        conditions.append(Photo.gps_longitude <= metadata.max_longitude)
+    if metadata.min_width:
+        conditions.append(Photo.width >= metadata.min_width)
+    if metadata.min_height:
+        conditions.append(Photo.height >= metadata.min_height)
+    return conditions
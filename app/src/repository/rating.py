@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.src.database.models import User, Photo, Rate
+from app.src.services import trending
 
 
 async def rate_photo(db: Session, user_id: int, photo_id: int, rate: int):
@@ -36,6 +37,7 @@ async def rate_photo(db: Session, user_id: int, photo_id: int, rate: int):
     photo = db.query(Photo).filter(Photo.id == photo_id).first()
     photo.rating = average_rating
     db.commit()
+    trending.safely(trending.record_rate, photo, rate)
 
     return new_rate
 
@@ -81,6 +83,7 @@ async def delete_rate(rate_id: int, db: Session):
         return False
 
     photo_id = rate.photo_id
+    rate_value = rate.rate
 
     db.delete(rate)
     db.commit()
@@ -94,4 +97,5 @@ async def delete_rate(rate_id: int, db: Session):
         photo.rating = average_rating
 
     db.commit()
+    trending.safely(trending.remove_rate, photo, rate_value)
     return True
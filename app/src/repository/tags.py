@@ -0,0 +1,134 @@
+from datetime import datetime
+from typing import Iterable, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import select, update, delete, func, literal, DateTime
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.src.database.models import Tag, TagUsage, association_table
+from app.src.schemas import TagModel
+
+MAX_TAGS_PER_PHOTO = 5
+
+
+def normalize_tag(name: str) -> str:
+    """
+    normalize_tag
+    Canonical tag name, so "#Sea", "sea" and " SEA" become one tag
+    Args:
+        name (str): tag as entered by user
+
+    Returns:
+        str: lowercase name without leading '#' and surrounding whitespace
+    """
+    return name.strip().lstrip("#").strip().lower()
+
+
+def valid_tag_names(tags_list: Iterable[str], limit: int = MAX_TAGS_PER_PHOTO) -> list[str]:
+    """
+    valid_tag_names
+    Normalized, unique and valid tag names in the given order
+    Args:
+        tags_list (Iterable[str]): tags as entered by user
+        limit (int, optional): max number of names. Defaults to 5.
+
+    Returns:
+        list[str]: first `limit` valid names
+    """
+    names = []
+    for tag_name in tags_list:
+        tag_name = normalize_tag(tag_name)
+        if tag_name in names:
+            continue
+        try:
+            names.append(TagModel(name=tag_name).name)
+        except ValidationError as e:
+            print(f"Tag validation error for '{tag_name}':", e.errors())
+            continue
+        if len(names) == limit:
+            break
+    return names
+
+
+def resolve_tags(db: Session, names: Iterable[str]) -> dict[str, Tag]:
+    """
+    resolve_tags
+    Find tags by names with one query and create missing ones, caller commits
+    Args:
+        db (Session): database
+        names (Iterable[str]): valid normalized tag names
+
+    Returns:
+        dict[str, Tag]: tag by name, new tags are flushed and have ids
+    """
+    names = set(names)
+    if not names:
+        return {}
+    # with duplicate names in old data the oldest tag wins
+    tags = {tag.name: tag for tag in db.scalars(select(Tag).where(Tag.name.in_(names)).order_by(Tag.id.desc()))}
+    new_tags = [Tag(name=name) for name in names - tags.keys()]
+    if new_tags:
+        db.add_all(new_tags)
+        db.flush()
+        tags.update((tag.name, tag) for tag in new_tags)
+    return tags
+
+
+def adjust_usage(db: Session, tag_ids: Iterable[Optional[int]], delta: int) -> None:
+    """
+    adjust_usage
+    Change usage counts of tags attached to or detached from a photo, caller commits
+    Args:
+        db (Session): database
+        tag_ids (Iterable[int]): ids of the tags
+        delta (int): +1 on attach, -1 on detach
+    """
+    tag_ids = {tag_id for tag_id in tag_ids if tag_id is not None}
+    if not tag_ids or not delta:
+        return
+    now = datetime.now()
+    existing = set(db.scalars(select(TagUsage.tag_id).where(TagUsage.tag_id.in_(tag_ids))))
+    if existing:
+        db.execute(
+            update(TagUsage)
+            .where(TagUsage.tag_id.in_(existing))
+            .values(usage_count=TagUsage.usage_count + delta, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    db.add_all(TagUsage(tag_id=tag_id, usage_count=max(delta, 0), updated_at=now)
+               for tag_id in tag_ids - existing)
+
+
+async def get_usage_changes(db: Session, since: Optional[datetime] = None) -> list[tuple[int, str, int, datetime]]:
+    """
+    get_usage_changes
+    Tags with usage counts changed since the given time
+    Args:
+        db (Session): database
+        since (Optional[datetime], optional): lower bound of updated_at. Defaults to None for all tags.
+
+    Returns:
+        list[tuple]: (tag_id, name, usage_count, updated_at) rows
+    """
+    query = select(TagUsage.tag_id, Tag.name, TagUsage.usage_count, TagUsage.updated_at).join(Tag)
+    if since is not None:
+        query = query.where(TagUsage.updated_at >= since)
+    return [tuple(row) for row in db.execute(query)]
+
+
+def rebuild_usage(conn: Connection) -> None:
+    """
+    rebuild_usage
+    Recount usage of all tags from photo links, for bulk loaded data
+    Args:
+        conn (Connection): database connection in a transaction
+    """
+    conn.execute(delete(TagUsage))
+    counts = (
+        select(Tag.id, func.count(association_table.c.photos), literal(datetime.now(), DateTime))
+        .select_from(Tag)
+        .outerjoin(association_table, association_table.c.tags == Tag.id)
+        .group_by(Tag.id)
+    )
+    conn.execute(TagUsage.__table__.insert().from_select(["tag_id", "usage_count", "updated_at"], counts))
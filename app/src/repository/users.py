@@ -1,13 +1,17 @@
 from datetime import datetime, timedelta
+from typing import Iterator
 
 from operator import not_
 from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import and_
 
-from app.src.database.models import User, Photo, Comment
+from app.src.database.models import User, Photo, Comment, Rate
 from app.src.schemas import UserModel, RoleOptions
 
+# rows per fetch of the export cursors, objects of a batch are released once streamed
+EXPORT_BATCH_SIZE = 500
+
 
 async def get_user_by_id(user_id: int, db: Session) -> User | None:
     """
@@ -86,6 +90,19 @@ async def update_token(user: User, token: str | None, db: Session) -> None:
     db.commit()
 
 
+async def update_password(user: User, hashed_password: str, db: Session) -> None:
+    """
+    Update password hash in the database
+
+    Args:
+        user (User): The user to update the password for.
+        hashed_password (str): The new password hash.
+        db (Session): The database session.
+    """
+    user.password = hashed_password
+    db.commit()
+
+
 async def update_avatar(email: str, url: str, db: Session) -> User:
     """
     Update user's avatar
@@ -192,6 +209,14 @@ async def change_user_email(user: User, email: str, db: Session) -> User:
     return current_user
 
 
+def _users_photos(user_id: int, db: Session):
+    return db.query(Photo).filter(Photo.owner_id == user_id)
+
+
+def _users_comments(user_id: int, db: Session):
+    return db.query(Comment).filter(Comment.user_id == user_id)
+
+
 def get_users_photos(user_id: int, db: Session) -> list:
     """
     Get list of user's photos.
@@ -203,7 +228,7 @@ def get_users_photos(user_id: int, db: Session) -> list:
     Returns:
         [list]: User's photos list.
     """
-    return db.query(Photo).filter(Photo.owner_id == user_id).all()
+    return _users_photos(user_id, db).all()
 
 
 def get_users_comments(user_id: int, db: Session) -> list:
@@ -217,7 +242,53 @@ def get_users_comments(user_id: int, db: Session) -> list:
     Returns:
         [list]: User's comments list.
     """
-    return db.query(Comment).filter(Comment.user_id == user_id).all()
+    return _users_comments(user_id, db).all()
+
+
+def iter_users_photos(user_id: int, db: Session, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Photo]:
+    """
+    Stream user's photos with their tags from a server side cursor.
+
+    Args:
+        user_id (int): User id to get photos.
+        db (Session): The database session.
+        batch_size (int, optional): Rows fetched per round trip.
+
+    Returns:
+        Iterator[Photo]: User's photos ordered by id.
+    """
+    query = _users_photos(user_id, db).options(selectinload(Photo.tags)).order_by(Photo.id)
+    return iter(query.yield_per(batch_size))
+
+
+def iter_users_comments(user_id: int, db: Session, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Comment]:
+    """
+    Stream user's comments from a server side cursor.
+
+    Args:
+        user_id (int): User id to get comments.
+        db (Session): The database session.
+        batch_size (int, optional): Rows fetched per round trip.
+
+    Returns:
+        Iterator[Comment]: User's comments ordered by id.
+    """
+    return iter(_users_comments(user_id, db).order_by(Comment.id).yield_per(batch_size))
+
+
+def iter_users_rates(user_id: int, db: Session, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Rate]:
+    """
+    Stream rates given by the user from a server side cursor.
+
+    Args:
+        user_id (int): User id to get rates.
+        db (Session): The database session.
+        batch_size (int, optional): Rows fetched per round trip.
+
+    Returns:
+        Iterator[Rate]: User's rates ordered by id.
+    """
+    return iter(db.query(Rate).filter(Rate.user_id == user_id).order_by(Rate.id).yield_per(batch_size))
 
 
 async def get_active_users(db: Session, photo_created_from: datetime | None = None,
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, Depends, status, Security, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
 
@@ -7,8 +7,8 @@ from app.src.database.db import get_db
 from app.src.database.models import User
 from app.src.repository import users as repository_users
 from app.src.services.auth import auth_service, RoleChecker
-from app.src.services.email import send_email
-from app.src.routes.users import red
+from app.src.services import jobs, tasks
+from app.src.services.rate_limit import RateLimit
 
 # logs for testing
 #import tests.logging as log
@@ -18,19 +18,20 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 security = HTTPBearer()
 
 
-@router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+@router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(RateLimit("signup"))])
+async def signup(body: UserModel, request: Request, db: Session = Depends(get_db)):
     """
     **User sign-up endpoint**
 
     Args:
     - body (UserModel): user info dictionary
-    - background_tasks (BackgroundTasks): async ring scheduler
     - request (Request): request object
     - db (Session, optional): database session.
 
     Raises:
     - HTTPException: 409 Account already exists
+    - HTTPException: 429 Too many requests
 
     Returns:
     - UserResponse: execution result
@@ -45,11 +46,12 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
 
     body.password = auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
+    await jobs.enqueue(tasks.CONFIRM_EMAIL, email=new_user.email, username=new_user.username,
+                       host=str(request.base_url))
     return {"user": new_user, "detail": "User created successfully"}
 
 
-@router.post("/login", response_model=TokenModel)
+@router.post("/login", response_model=TokenModel, dependencies=[Depends(RateLimit("login"))])
 async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """
     **User login endpoint**
@@ -62,6 +64,7 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
     - HTTPException: 401 Invalid email
     - HTTPException: 401 Email not confirmed
     - HTTPException: 401 Invalid password
+    - HTTPException: 429 Too many requests
 
     Returns:
     - [TokenModel]: token dictionary {access_token, refresh_token, token_type}
@@ -136,7 +139,6 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
 
 @router.post('/request_email')
 async def request_email(body: RequestEmail,
-                        background_tasks: BackgroundTasks, 
                         request: Request,
                         db: Session = Depends(get_db)):
     """
@@ -144,7 +146,6 @@ async def request_email(body: RequestEmail,
 
     Args:
     - body (RequestEmail): object with email request parameters
-    - background_tasks (BackgroundTasks): async ring scheduler
     - request (Request): request object
     - db (Session, optional): database session.
 
@@ -156,7 +157,7 @@ async def request_email(body: RequestEmail,
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+        await jobs.enqueue(tasks.CONFIRM_EMAIL, email=user.email, username=user.username, host=str(request.base_url))
     return {"message": "Check your email for confirmation."}
 
 
@@ -173,7 +174,7 @@ async def logout(token: str = Depends(auth_service.oauth2_scheme),
     Returns:
     - message: message
     """                 
-    red.set(token, 1)
-    red.expire(token, 900)
+    auth_service.r.set(token, 1)
+    auth_service.r.expire(token, 900)
     return {"message": "Logged out"}
 
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.src.services.metrics import REGISTRY, CONTENT_TYPE
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics() -> PlainTextResponse:
+    """
+    **Application metrics in Prometheus text format**
+
+    Returns:
+    - PlainTextResponse: current values of all registered metrics
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
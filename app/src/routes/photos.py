@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, status, HTTPException, Query
+from fastapi import APIRouter, Depends, UploadFile, File, Form, status, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from typing import Optional, List, Union
 from pydantic import ValidationError
 from datetime import date
+import asyncio
 
 from app.src.schemas import (
     PhotoResponse,
@@ -17,9 +20,15 @@ from app.src.schemas import (
     CommentModel,
     CommentDb,
     CommentResponse,
+    CommentPage,
     RateDb,
     RatingOptions, 
     RateResponse, 
+    PhotoFeedResponse,
+    PhotoBatchResponse,
+    BulkUploadResponse,
+    TrendingPhotoResponse,
+    MetadataFilter,
 )
 from app.src.database.db import get_db
 from app.src.database.models import User, Photo, Comment
@@ -29,11 +38,59 @@ from app.src.repository import rating as repository_rating
 from app.src.services.auth import auth_service, RoleChecker
 from app.src.services.qr_code_service import generate_qr_code
 from app.src.services import cloudinary_services
+from app.src.services import trending
+from app.src.services import image_hash
+from app.src.services import jobs, tasks
+from app.src.services import exif
+from app.src.services import placeholders
+from app.src.services import rate_limit
+from app.src.services.rate_limit import UserRateLimit
+from app.src.services.pagination import encode_cursor, decode_cursor
+from app.src.services.http_cache import weak_etag, etag_matches
 from app.src.conf.config import settings
 
 router = APIRouter(prefix="/photos", tags=["photos"])
 
-@router.post("/upload", response_model=PhotoResponse, status_code=status.HTTP_201_CREATED)
+
+def _parse_ids(ids: str, max_ids: int) -> list[int]:
+    """
+    Parse comma separated ids, duplicates are dropped and order is kept
+
+    Raises:
+        HTTPException: 422 ids are not integers or there are too many of them
+    """
+    try:
+        parsed = list(dict.fromkeys(int(item) for item in ids.split(",") if item.strip()))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="IDs must be comma separated integers")
+    if not parsed or len(parsed) > max_ids:
+        raise HTTPException(status_code=422, detail=f"Provide from 1 to {max_ids} IDs")
+    return parsed
+
+
+async def _enqueue_thumbnails(photos: list) -> None:
+    """
+    Render thumbnails of new raster photos in the background, EXIF reading sets width of every image Pillow reads
+    """
+    for photo in photos:
+        if not photo.thumbnails and photo.width is not None and settings.thumbnail_sizes:
+            await jobs.enqueue(tasks.RENDER_THUMBNAILS, photo_id=photo.id)
+
+
+async def _inspect_upload(file: UploadFile) -> tuple[dict, str, int | None, dict]:
+    """
+    EXIF, fingerprints and placeholder of an uploaded file. The content is read once and
+    dropped afterwards, the file is rewound for the upload
+    """
+    await file.seek(0)
+    data = await file.read()
+    await file.seek(0)
+    sha256, dhash = await image_hash.fingerprint(data)
+    return exif.read_exif(data), sha256, dhash, await placeholders.create_placeholder(data)
+
+
+@router.post("/upload", response_model=PhotoResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(UserRateLimit("upload"))])
 async def create_photo(
         file: UploadFile = File(...),
         description: str = Form(...),
@@ -44,6 +101,8 @@ async def create_photo(
     """
     **Create photo endpoint**\n
     Uploads photo into cloudinaty and create a new record in database.
+    An exact copy of a stored image reuses its file, near duplicates are flagged with `similar_to_id`.
+    A blurred placeholder is stored with the photo, WebP thumbnails are rendered by a background job.
 
     Args:
     - file (UploadFile, optional): File to upload
@@ -53,6 +112,7 @@ async def create_photo(
     - db (Session, optional): database session.
 
     Raises:
+    - HTTPException: 429 Too many requests
     - HTTPException: 500 Failed to upload photo
     - HTTPException: 500 Failed to retrieve secure URL for photo
 
@@ -60,25 +120,48 @@ async def create_photo(
     - [PhotoResponse]: response object 
     """    
     tags_list = tags.strip().split(" ")
-    file.file.seek(0)
-    upload_result = await cloudinary_services.upload_photo(file.file) 
+    photo_exif, sha256, dhash, placeholder = await _inspect_upload(file)
+    duplicate = (await repository_photos.get_photos_by_sha256(db, [sha256])).get(sha256)
+
+    if duplicate:
+        # the same file is already stored, no need to upload it again
+        photo_url = duplicate.photo_url
+        photo_thumbnails = duplicate.thumbnails
+        similar_to_id = duplicate.id
+        detail = "Photo successfully uploaded, the same image is already stored"
+    else:
+        upload_result = await cloudinary_services.upload_photo(file.file)
 
-    if not upload_result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to upload photo",
-        )
+        if not upload_result:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to upload photo",
+            )
 
-    if "secure_url" not in upload_result:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to retrieve secure URL for photo",
+        if "secure_url" not in upload_result:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to retrieve secure URL for photo",
+            )
+
+        photo_url = upload_result["secure_url"]
+        photo_thumbnails = None
+        similar = await repository_photos.find_similar_photos(
+            db, [dhash] if dhash is not None else [], settings.near_duplicate_distance
         )
+        similar_to_id = similar.get(dhash)
+        detail = "Photo successfully uploaded, similar photo found" if similar_to_id else "Photo successfully uploaded"
 
     photo_create = PhotoModel(
-        photo_url=upload_result["secure_url"],
+        photo_url=photo_url,
         owner_id=current_user.id,
         description=description,
+        sha256=sha256,
+        dhash=dhash,
+        similar_to_id=similar_to_id,
+        thumbnails=photo_thumbnails,
+        exif=photo_exif or None,
+        **placeholder,
     )
 
     created_photo = await repository_photos.create_photo(
@@ -87,6 +170,7 @@ async def create_photo(
         user_id=current_user.id,
         tags_list=tags_list,
     )
+    await _enqueue_thumbnails([created_photo])
 
     photo_response = PhotoResponse(
         photo=PhotoDb(
@@ -94,12 +178,128 @@ async def create_photo(
             photo_url=created_photo.photo_url,
             owner_id=created_photo.owner_id,
             description=created_photo.description,
+            similar_to_id=created_photo.similar_to_id,
         ),
-        detail="Photo successfully uploaded",
+        detail=detail,
     )
     return photo_response
 
 
+@router.post("/upload/bulk", response_model=BulkUploadResponse, status_code=status.HTTP_201_CREATED)
+async def create_photos(
+        request: Request,
+        files: List[UploadFile] = File(...),
+        descriptions: List[str] = Form(None, description="Description of every file, in the order of files"),
+        tags: List[str] = Form(None, description="Space separated tags of every file, in the order of files"),
+        current_user: User = Depends(auth_service.get_current_user),
+        db: Session = Depends(get_db),
+    ):
+    """
+    **Bulk photo upload endpoint**\n
+    Uploads many photos into cloudinary concurrently and creates all records in one transaction.
+    Files that failed to upload are reported and skipped.
+    Exact copies of stored images reuse their files, near duplicates are flagged with `similar_to_id`.
+    WebP thumbnails are rendered by background jobs.
+    Every file counts against the upload rate limit, one request uploads at most as many files as the limit allows.
+
+    Args:
+    - request (Request): request object
+    - files (List[UploadFile]): files to upload
+    - descriptions (List[str], optional): description of every file
+    - tags (List[str], optional): space separated tags of every file
+    - current_user (User, optional): current user
+    - db (Session, optional): database session.
+
+    Raises:
+    - HTTPException: 422 Too many files
+    - HTTPException: 429 Too many requests
+    - HTTPException: 500 Failed to save photos
+
+    Returns:
+    - [BulkUploadResponse]: result of every file in the order of files
+    """
+    # a request can't take more tokens than the bucket holds
+    max_files = rate_limit.get_limiter().max_cost("upload", settings.bulk_upload_max_files)
+    if len(files) > max_files:
+        raise HTTPException(status_code=422, detail=f"Upload at most {max_files} files at once")
+    await rate_limit.check(request, "upload", rate_limit.user_identity(current_user), cost=len(files))
+    descriptions = descriptions or []
+    tags = tags or []
+
+    # at most UPLOAD_CONCURRENCY files are held in memory at once
+    semaphore = asyncio.Semaphore(settings.upload_concurrency)
+
+    async def inspect(file):
+        async with semaphore:
+            return await _inspect_upload(file)
+
+    inspected = await asyncio.gather(*(inspect(file) for file in files))
+    fingerprints = [(sha256, dhash) for _, sha256, dhash, _ in inspected]
+    stored = await repository_photos.get_photos_by_sha256(db, [sha256 for sha256, _ in fingerprints])
+    # every new image is uploaded once, also when it repeats within the request
+    to_upload = {}
+    for i, (sha256, _) in enumerate(fingerprints):
+        if sha256 not in stored:
+            to_upload.setdefault(sha256, i)
+    upload_results = dict(zip(to_upload, await cloudinary_services.upload_photos(
+        [files[i].file for i in to_upload.values()], settings.upload_concurrency
+    )))
+    uploaded_hashes = [sha256 for sha256, result in upload_results.items()
+                       if not isinstance(result, Exception) and "secure_url" in result]
+    similar = await repository_photos.find_similar_photos(
+        db, [dhash for sha256, dhash in fingerprints if sha256 in to_upload and dhash is not None],
+        settings.near_duplicate_distance,
+    )
+
+    items = [None] * len(files)
+    uploaded, to_create, details = [], [], []
+    for i, (file, (photo_exif, sha256, dhash, placeholder)) in enumerate(zip(files, inspected)):
+        if sha256 in stored:
+            photo_url, similar_to_id = stored[sha256].photo_url, stored[sha256].id
+            photo_thumbnails = stored[sha256].thumbnails
+            detail = "Photo successfully uploaded, the same image is already stored"
+        else:
+            result = upload_results[sha256]
+            if isinstance(result, Exception) or "secure_url" not in result:
+                items[i] = {"filename": file.filename, "detail": "Failed to upload photo"}
+                continue
+            photo_url, similar_to_id = result["secure_url"], similar.get(dhash)
+            photo_thumbnails = None
+            detail = "Photo successfully uploaded, similar photo found" if similar_to_id else "Photo successfully uploaded"
+        uploaded.append(i)
+        details.append(detail)
+        to_create.append((
+            PhotoModel(
+                photo_url=photo_url,
+                owner_id=current_user.id,
+                description=descriptions[i] if i < len(descriptions) else "",
+                sha256=sha256,
+                dhash=dhash,
+                similar_to_id=similar_to_id,
+                thumbnails=photo_thumbnails,
+                exif=photo_exif or None,
+                **placeholder,
+            ),
+            (tags[i] if i < len(tags) else "").strip().split(" "),
+        ))
+
+    if to_create:
+        try:
+            created_photos = await repository_photos.create_photos(db, to_create)
+        except SQLAlchemyError:
+            db.rollback()
+            # only files uploaded by this request, reused ones belong to stored photos
+            if uploaded_hashes:
+                await jobs.enqueue(tasks.DELETE_FILES,
+                                   urls=[upload_results[sha256]["secure_url"] for sha256 in uploaded_hashes])
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to save photos")
+        await _enqueue_thumbnails(created_photos)
+        for i, photo, detail in zip(uploaded, created_photos, details):
+            items[i] = {"filename": files[i].filename, "photo": photo, "detail": detail}
+
+    return {"items": items, "uploaded": len(uploaded), "failed": len(files) - len(uploaded)}
+
+
 @router.delete("/{photo_id}")
 async def delete_photo(
         photo_id: int,
@@ -132,12 +332,41 @@ async def delete_photo(
                 status_code=403, detail="Not enought rights to delete this photo"
             )
 
-    await cloudinary_services.delete_photo(photo.photo_url)
+    # exact duplicates share the stored file, it goes away with the last photo
+    shared = await repository_photos.is_photo_url_shared(db, photo.photo_url, photo.id)
+    urls = [photo.photo_url, *(photo.thumbnails or {}).values()]
     await repository_photos.delete_photo(db, photo_id)
+    if not shared:
+        await jobs.enqueue(tasks.DELETE_FILES, urls=urls)
 
     return {"detail": "Photo succesfuly deleted"}
 
 
+@router.get("", response_model=PhotoBatchResponse)
+async def read_photos(
+        ids: str = Query(..., description="Comma separated photo IDs, e.g. 1,2,3"),
+        db: Session = Depends(get_db),
+    ):
+    """
+    **Endpoint for getting many photos by IDs**\n
+    Photos are returned in the requested order, IDs of photos that do not exist are listed in `missing`.
+
+    Args:
+    - ids (str): comma separated photo IDs, up to BATCH_MAX_IDS
+    - db (Session, optional): database session
+
+    Raises:
+    - HTTPException: 422 Invalid list of photo IDs
+
+    Returns:
+    - PhotoBatchResponse: found photos and missing IDs
+    """
+    photo_ids = _parse_ids(ids, settings.batch_max_ids)
+    photos = await repository_photos.get_photos_by_ids(db, photo_ids)
+    found = {photo.id for photo in photos}
+    return {"items": photos, "missing": [photo_id for photo_id in photo_ids if photo_id not in found]}
+
+
 @router.get("/find_photos", response_model=list[PhotoDetailedResponse])
 async def get_photos_by_key_word(
         db: Session = Depends(get_db),
@@ -147,9 +376,11 @@ async def get_photos_by_key_word(
         max_rating: float = Query(None, description="Maximum rating filter"),
         start_date: date = Query(None, description="Start date for filtering (YYYY-MM-DD)"),
         end_date: date = Query(None, description="End date for filtering (YYYY-MM-DD)"),
+        metadata: MetadataFilter = Depends(),
     ):
     """
-    **Endpoint for photo searching**
+    **Endpoint for photo searching**\n
+    Key word, EXIF metadata filters or both are required.
 
     Args:
     - db (Session, optional): database session
@@ -159,53 +390,153 @@ async def get_photos_by_key_word(
     - max_rating (float, optional): Maximum rating filter. Defaults to None
     - start_date (date, optional): Start date for filtering (YYYY-MM-DD). Defaults to None
     - end_date (date, optional): End date for filtering (YYYY-MM-DD). Defaults to None
+    - metadata (MetadataFilter, optional): camera, lens, capture time, GPS box and min size filters
 
     Raises:
-    - HTTPException: 400 No key word provided
-    - HTTPException: 404 No photos found by keyword
+    - HTTPException: 400 No key word or metadata filter provided
+    - HTTPException: 404 No photos found by keyword or metadata
 
     Returns:
     - list[PhotoDetailedResponse]: detailed responce of the photo pbject
     """
-    if not key_word:
-        raise HTTPException(status_code=400, detail="No key word provided")
+    if not key_word and not metadata.model_dump(exclude_none=True):
+        raise HTTPException(status_code=400, detail="No key word or metadata filter provided")
 
-    photos = await repository_photos.find_photos(db, key_word, sort_by, min_raiting, max_rating, start_date, end_date)
+    photos = await repository_photos.find_photos(db, key_word, sort_by, min_raiting, max_rating, start_date, end_date,
+                                                 metadata)
 
     if not photos:
+        if not key_word:
+            raise HTTPException(status_code=404, detail="No photos found by metadata")
         raise HTTPException(status_code=404, detail=f"No photos found by key word '{key_word}'")
     return photos
 
 
+@router.get("/feed", response_model=PhotoFeedResponse)
+async def read_feed(
+        db: Session = Depends(get_db),
+        cursor: str = Query(None, description="Cursor from the previous page"),
+        limit: int = Query(20, ge=1, le=100, description="Page size"),
+    ):
+    """
+    **Endpoint for browsing all photos from newest**\n
+    Keyset paginated: pass `next_cursor` of the response to get the next page.
+
+    Args:
+    - db (Session, optional): database session
+    - cursor (str, optional): cursor from the previous page. Defaults to the first page
+    - limit (int, optional): page size from 1 to 100. Defaults to 20
+
+    Raises:
+    - HTTPException: 400 Invalid cursor
+
+    Returns:
+    - PhotoFeedResponse: page of photos and cursor of the next page, `null` on the last page
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    photos = await repository_photos.get_feed(db, limit + 1, after)
+    next_cursor = None
+    if len(photos) > limit:
+        photos = photos[:limit]
+        next_cursor = encode_cursor(photos[-1].created_at, photos[-1].id)
+    return {"items": photos, "next_cursor": next_cursor}
+
+
+@router.get("/trending", response_model=list[TrendingPhotoResponse])
+async def read_trending(
+        limit: int = Query(10, ge=1, le=100, description="Number of photos"),
+    ):
+    """
+    **Endpoint for trending photos**\n
+    Photos ranked by Bayesian average rating with time decay, served from Redis.
+
+    Args:
+    - limit (int, optional): number of photos from 1 to 100. Defaults to 10
+
+    Raises:
+    - HTTPException: 503 Trending photos are not available
+
+    Returns:
+    - list[TrendingPhotoResponse]: best ranked photos first
+    """
+    try:
+        return trending.top(limit)
+    except RedisError:
+        raise HTTPException(status_code=503, detail="Trending photos are not available")
+
+
+@router.get("/comments/counts", response_model=dict[int, int])
+async def get_comment_counts(
+        ids: str = Query(..., description="Comma separated photo IDs, e.g. 1,2,3"),
+        db: Session = Depends(get_db),
+    ):
+    """
+    **Endpoint for comment counts of several photos**
+
+    Args:
+    - ids (str): comma separated photo IDs, up to BATCH_MAX_IDS
+    - db (Session, optional): database session
+
+    Raises:
+    - HTTPException: 422 Invalid list of photo IDs
+
+    Returns:
+    - dict[int, int]: number of comments by photo ID
+    """
+    return await repository_comments.count_comments(_parse_ids(ids, settings.batch_max_ids), db)
+
+
 @router.get("/{photo_id}", response_model=Union[PhotoDetailedResponse, UrlResponse])
 async def read_photo(
         photo_id: int,
+        request: Request,
+        response: Response,
         db: Session = Depends(get_db),
         response_type: ResponceOptions = Query(default=ResponceOptions.detailed, description="Select a response option")
     ):
     """
     **Endpoint for getting photo by it's ID**\n
     Retrieves photo information by ID with various response formats based on user selection.
+    Responses carry a weak `ETag`, send it back in `If-None-Match` to get 304 Not Modified.
+    QR codes are rate limited per client address.
 
     Args:
     - photo_id (int): ID of the photo
+    - request (Request): request object
+    - response (Response): response object for caching headers
     - db (Session, optional): database session.
     - response_type (ResponceOptions, optional): option for responce type. Defaults to detailed
 
     Raises:
     - HTTPException: 404 Photo not found
+    - HTTPException: 429 Too many requests
 
     Returns:
     - UrlResponse | StreamingResponse: either URL od QR code of the photo
     """
-    photo = await repository_photos.get_photo_by_id(db, photo_id)
+    photo = await repository_photos.get_photo_by_id(db, photo_id,
+                                                     with_tags=response_type == ResponceOptions.detailed)
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
-    if response_type == ResponceOptions.url:
-        return UrlResponse(url=photo.photo_url)
+
+    headers = {
+        "ETag": weak_etag(photo.id, photo.updated_at, photo.rating, response_type.value),
+        "Cache-Control": settings.photo_cache_control,
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
     if response_type == ResponceOptions.qr_code:
+        await rate_limit.check(request, "qr", rate_limit.client_identity(request))
         img_io = generate_qr_code(photo.photo_url)
-        return StreamingResponse(img_io, media_type="image/png")
+        return StreamingResponse(img_io, media_type="image/png", headers=headers)
+    response.headers.update(headers)
+    if response_type == ResponceOptions.url:
+        return UrlResponse(url=photo.photo_url)
     return photo
 
 
@@ -312,7 +643,8 @@ async def update_description(
     )
 
 
-@router.post("/{photo_id}/transform", response_model=PhotoDetailedResponse)
+@router.post("/{photo_id}/transform", response_model=PhotoDetailedResponse,
+             dependencies=[Depends(UserRateLimit("transform"))])
 async def transform_photo(
         photo_id: int,
         width: Optional[int] = Form(None),
@@ -348,6 +680,7 @@ async def transform_photo(
 
     Raises:
     - HTTPException: 403 Unsufficient permissions to transform this photo
+    - HTTPException: 429 Too many requests
     - HTTPException: 400 No transformations provided
     - HTTPException: 404 Transformed photo URL not found
 
@@ -399,39 +732,55 @@ async def transform_photo(
     return StreamingResponse(img_io, media_type="image/png")
 
 
-@router.get("/{photo_id}/comments", response_model=list[CommentDb])
+@router.get("/{photo_id}/comments", response_model=CommentPage)
 async def get_all_comments(
         photo_id: int,
-        current_user: User = Depends(RoleChecker(allowed_roles=["moder"])),
+        cursor: str = Query(None, description="Cursor from the previous page"),
+        limit: int = Query(50, ge=1, le=200, description="Page size"),
+        current_user: User = Depends(auth_service.get_current_user),
         db: Session = Depends(get_db)
     ):
     """
-    **Get all comments for the photo**\n
-    Available for admin and moderator roles only.
-
+    **Get comments for the photo**\n
+    Available for admin and moderator roles and the owner of the photo.
+    Comments are returned from oldest, pass `next_cursor` of the response to get the next page.
 
     Args:
     - photo_id (int): ID of the photo that is commented.
+    - cursor (str, optional): cursor from the previous page. Defaults to the first page
+    - limit (int, optional): page size from 1 to 200. Defaults to 50
     - current_user (User, optional): current user object.
     - db (Session, optional): database session.
 
     Raises:
+    - HTTPException: 400 Invalid cursor
+    - HTTPException: 403 Unsufficient permissions
     - HTTPException: 404 Photo not found
 
     Returns:
-    - [CommentResponse]: comment responce object
+    - [CommentPage]: page of comments, total number of photo's comments and cursor of the next page
     """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
     photo = await repository_photos.get_photo_by_id(photo_id=photo_id, db=db)
 
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
 
-    comments_list = await repository_comments.get_comments(photo_id, db)
-    
-    if not comments_list:
-        raise HTTPException(status_code=404, detail=f"No comments found for photo ID {photo_id}")
+    if current_user.role not in ("admin", "moder") and photo.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Unsufficient permissions")
+
+    comments = await repository_comments.get_comments_page(photo_id, db, limit + 1, after)
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1].created_at, comments[-1].id)
+    total = (await repository_comments.count_comments([photo_id], db))[photo_id]
 
-    return comments_list
+    return {"items": comments, "total": total, "next_cursor": next_cursor}
 
 
 @router.post("/{photo_id}/comment", response_model=CommentResponse, status_code=status.HTTP_201_CREATED)
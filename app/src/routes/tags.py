@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.src.schemas import TagSuggestion
+from app.src.database.db import get_db
+from app.src.repository.tags import normalize_tag
+from app.src.services.tag_index import tag_index
+from app.src.conf.config import settings
+
+router = APIRouter(prefix="/tags", tags=["tags"])
+
+
+@router.get("/autocomplete", response_model=list[TagSuggestion])
+async def autocomplete_tags(
+        q: str = Query(..., min_length=1, max_length=40, description="Beginning of the tag"),
+        limit: int = Query(10, ge=1, le=50, description="Number of suggestions"),
+        db: Session = Depends(get_db),
+    ):
+    """
+    **Endpoint for tag suggestions**\n
+    Tags starting with the given text, most used first.
+
+    Args:
+    - q (str): beginning of the tag, '#' and case are ignored
+    - limit (int, optional): number of suggestions from 1 to 50. Defaults to 10
+    - db (Session, optional): database session
+
+    Returns:
+    - list[TagSuggestion]: tag names with number of photos using them
+    """
+    await tag_index.maybe_refresh(db, settings.tag_index_refresh_seconds)
+    return [{"name": name, "count": count} for name, count in tag_index.suggest(normalize_tag(q), limit)]
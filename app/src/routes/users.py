@@ -1,22 +1,24 @@
 from datetime import datetime
 
-from fastapi import (APIRouter, Depends, UploadFile, File, HTTPException, status, BackgroundTasks, Request, Query)
+from fastapi import (APIRouter, Depends, UploadFile, File, HTTPException, status, Request, Query)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import EmailStr
 import cloudinary
 import cloudinary.uploader
-import redis
 
-from app.src.database.db import get_db
+from app.src.database.db import get_db, get_session_factory
 from app.src.database.models import User
 from app.src.repository import users as repository_users
 from app.src.services.auth import RoleChecker, auth_service
-from app.src.conf.config import settings, cloudinary_config
+from app.src.conf.config import settings
 from app.src.schemas import UserDb, UserPassword, UserNewPassword, RoleOptions
-from app.src.services.email import send_password_email, send_email
+from app.src.services import jobs, tasks
+from app.src.services.metrics import CLOUDINARY_LATENCY
+from app.src.services.cloudinary_services import configure as configure_cloudinary
+from app.src.services.export import accepts_gzip, stream_export
 
 router = APIRouter(prefix="/users", tags=["users"])
-red = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
 
 
 @router.get("/me")
@@ -41,6 +43,61 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
     return user_info
 
 
+def _export_response(user_id: int, request: Request, session_factory) -> StreamingResponse:
+    compress = accepts_gzip(request.headers.get("accept-encoding"))
+    headers = {"Content-Disposition": f'attachment; filename="photoshare-user-{user_id}.ndjson"',
+               "Vary": "Accept-Encoding"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(stream_export(user_id, session_factory, compress),
+                             media_type="application/x-ndjson", headers=headers)
+
+
+@router.get("/me/export", response_class=StreamingResponse)
+async def export_users_me(request: Request,
+                          current_user: User = Depends(auth_service.get_current_user),
+                          session_factory=Depends(get_session_factory)) -> StreamingResponse:
+    """
+    **Export current user's data**\n
+    Profile, photos with tags, comments and rates as NDJSON, one record per line.
+    Gzip compressed when the client accepts it.
+
+    Args:
+    - current_user (User, optional): current user.
+
+    Returns:
+    - StreamingResponse: NDJSON stream
+    """
+    return _export_response(current_user.id, request, session_factory)
+
+
+@router.get("/{user_id}/export", response_class=StreamingResponse)
+async def export_user(user_id: int,
+                      request: Request,
+                      current_user: User = Depends(RoleChecker(['admin'])),
+                      db: Session = Depends(get_db),
+                      session_factory=Depends(get_session_factory)) -> StreamingResponse:
+    """
+    **Export data of any user**\n
+    Available for admin role only.
+
+    Args:
+    - user_id (int): id of the user to export
+    - current_user (User, optional): current user.
+    - db (Session, optional): database session.
+
+    Raises:
+    - HTTPException: 404 User not found
+
+    Returns:
+    - StreamingResponse: NDJSON stream
+    """
+    user = await repository_users.get_user_by_id(user_id, db)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return _export_response(user.id, request, session_factory)
+
+
 @router.get("/")
 async def read_active_users(photo_created_from: datetime | None = None,
                             photo_created_at: datetime | None = None,
@@ -95,8 +152,7 @@ async def read_users(username: str, db: Session = Depends(get_db)) -> dict:
 
 
 @router.patch("/me", response_model=UserDb)
-async def update_user(background_tasks: BackgroundTasks,
-                      request: Request,
+async def update_user(request: Request,
                       token: str = Depends(auth_service.oauth2_scheme),
                       username: str | None = None,
                       email: EmailStr | None = None,
@@ -106,7 +162,6 @@ async def update_user(background_tasks: BackgroundTasks,
     **Change user username or email**
 
     Args:
-    - background_tasks (BackgroundTasks): async ring scheduler.
     - request (Request): request object.
     - token (str): The access token for the current user.
     - username (str, optional): New username for the user. Default is None.
@@ -132,10 +187,10 @@ async def update_user(background_tasks: BackgroundTasks,
         if user_check_email:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already exists")
         user = await repository_users.change_user_email(current_user, email, db)
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
-        red.set(token, 1)
-        red.expire(token, 900)
-    red.delete(f"user:{current_user.email}")
+        await jobs.enqueue(tasks.CONFIRM_EMAIL, email=user.email, username=user.username, host=str(request.base_url))
+        auth_service.r.set(token, 1)
+        auth_service.r.expire(token, 900)
+    auth_service.r.delete(f"user:{current_user.email}")
     return user
 
 
@@ -154,11 +209,13 @@ async def update_avatar_user(file: UploadFile = File(),
     Returns:
     - [UserDb]: The user db object that has the avater changed
     """
-    r = cloudinary.uploader.upload(file.file, public_id=f'PS_app/{current_user.username}', overwrite=True)
+    configure_cloudinary()
+    with CLOUDINARY_LATENCY.labels("upload").time():
+        r = cloudinary.uploader.upload(file.file, public_id=f'PS_app/{current_user.username}', overwrite=True)
     src_url = cloudinary.CloudinaryImage(f'PS_app/{current_user.username}')\
                         .build_url(width=250, height=250, crop='fill', version=r.get('version'))
     user = await repository_users.update_avatar(current_user.email, src_url, db)
-    red.delete(f"user:{current_user.email}")
+    auth_service.r.delete(f"user:{current_user.email}")
     return user
 
 
@@ -183,13 +240,12 @@ async def change_password(body: UserPassword,
     if not auth_service.verify_password(body.old_password, current_user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
     message = await auth_service.update_password(current_user, body.new_password, db)
-    red.delete(f"user:{current_user.email}")
+    auth_service.r.delete(f"user:{current_user.email}")
     return  {"message": message}
 
 
 @router.post("/me/forgot_password")
 async def forgot_password(body: UserNewPassword,
-                          background_tasks: BackgroundTasks,
                           request: Request,
                           db: Session = Depends(get_db)) -> dict:
     """
@@ -197,7 +253,6 @@ async def forgot_password(body: UserNewPassword,
 
     Args:
     - body (UserNewPassword): Data to reset user password (email, new_password).
-    - background_tasks (BackgroundTasks): async ring scheduler
     - request (Request): The request to send email.
     - db (Session, optional): database session.
 
@@ -211,8 +266,9 @@ async def forgot_password(body: UserNewPassword,
         return message
     if not user:
         return message
-    background_tasks.add_task(send_password_email, user.email, body.new_password, user.username, request.base_url)
-    red.delete(f"user:{user.email}")
+    await jobs.enqueue(tasks.PASSWORD_EMAIL, email=user.email, username=user.username, host=str(request.base_url),
+                       reset_id=auth_service.store_password_reset(body.new_password))
+    auth_service.r.delete(f"user:{user.email}")
     return message
 
 
@@ -250,16 +306,18 @@ async def reset_password(token: str, db: Session = Depends(get_db)) -> dict:
 
     Raises:
     - HTTPException: 400 Verification error
+    - HTTPException: 422 Invalid token for password reset
 
     Returns:
     - message: message
     """
     email = await auth_service.get_email_from_token(token)
-    password = await auth_service.get_password_from_token(token)
+    hashed_password = await auth_service.pop_password_reset(token)
     user = await repository_users.get_user_by_email(email, db)
-    if user is None:
+    if user is None or hashed_password is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Verification error")
-    await auth_service.update_password(user, password, db)
+    await repository_users.update_password(user, hashed_password, db)
+    auth_service.r.delete(f"user:{email}")
     return {"message": "Password reset"}
 
 
@@ -295,7 +353,7 @@ async def change_user_role(user_id: int,
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="Usuficient permissions to modify to admin")
     changed_user = await repository_users.change_user_role(user, new_role, db)
-    red.delete(f"user:{user.email}")
+    auth_service.r.delete(f"user:{user.email}")
     return changed_user
 
 
@@ -329,7 +387,7 @@ async def ban_unban_user(user_id: int,
     
     if user is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Verification error")
-    red.delete(f"user:{user.email}")
+    auth_service.r.delete(f"user:{user.email}")
     message = await repository_users.ban_user(user, banned, db)
     return {"message": message}
 
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, EmailStr, ConfigDict, HttpUrl, constr
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from enum import Enum
 
 
@@ -52,10 +52,47 @@ class RequestEmail(BaseModel):
     email: EmailStr
 
 
+class PhotoMetadata(BaseModel):
+    taken_at: Optional[datetime] = None
+    camera_make: Optional[str] = None
+    camera_model: Optional[str] = None
+    lens: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    orientation: Optional[int] = None
+
+
+class PhotoExif(PhotoMetadata):
+    # stored for the location filters of search, never returned: it tells where the owner was
+    gps_latitude: Optional[float] = None
+    gps_longitude: Optional[float] = None
+
+
+class MetadataFilter(BaseModel):
+    camera_make: Optional[str] = Field(None, description="Camera maker, case insensitive")
+    camera_model: Optional[str] = Field(None, description="Camera model, case insensitive")
+    lens: Optional[str] = Field(None, description="Lens model, case insensitive")
+    taken_from: Optional[datetime] = Field(None, description="Captured at or after")
+    taken_to: Optional[datetime] = Field(None, description="Captured at or before")
+    min_latitude: Optional[float] = Field(None, ge=-90, le=90)
+    max_latitude: Optional[float] = Field(None, ge=-90, le=90)
+    min_longitude: Optional[float] = Field(None, ge=-180, le=180)
+    max_longitude: Optional[float] = Field(None, ge=-180, le=180)
+    min_width: Optional[int] = Field(None, ge=1)
+    min_height: Optional[int] = Field(None, ge=1)
+
+
 class PhotoModel(BaseModel):
     photo_url: str
     owner_id: int
     description: str
+    sha256: Optional[str] = None
+    dhash: Optional[int] = None
+    similar_to_id: Optional[int] = None
+    thumbnails: Optional[Dict[str, str]] = None
+    exif: Optional[PhotoExif] = None
+    lqip: Optional[str] = None
+    dominant_color: Optional[str] = None
 
 
 class PhotoDb(BaseModel):
@@ -63,6 +100,7 @@ class PhotoDb(BaseModel):
     photo_url: str
     owner_id: int
     description: str
+    similar_to_id: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -71,10 +109,27 @@ class PhotoResponse(BaseModel):
     detail: str = "Photo successfully uploaded"
 
 
+class BulkUploadItem(BaseModel):
+    filename: Optional[str] = None
+    photo: Optional[PhotoDb] = None
+    detail: str
+
+
+class BulkUploadResponse(BaseModel):
+    items: List[BulkUploadItem]
+    uploaded: int
+    failed: int
+
+
 class TagModel(BaseModel):
     name: constr(strip_whitespace=True, min_length=1, max_length=40)
 
 
+class TagSuggestion(BaseModel):
+    name: str
+    count: int
+
+
 class PhotoDetailedResponse(BaseModel):
     id: int
     photo_url: HttpUrl
@@ -83,14 +138,40 @@ class PhotoDetailedResponse(BaseModel):
     description: Optional[str] = None
     tags: List[TagModel] = []
     rating: float
+    thumbnails: Optional[Dict[str, str]] = None
+    exif: Optional[PhotoMetadata] = None
+    lqip: Optional[str] = Field(None, description="Blurred preview as a WebP data URI")
+    dominant_color: Optional[str] = Field(None, description="Hex colour for a tile shown before the image loads")
     created_at: datetime
     updated_at: datetime
     model_config = ConfigDict(from_attributes=True)
 
 
+class PhotoFeedResponse(BaseModel):
+    items: List[PhotoDetailedResponse]
+    next_cursor: Optional[str] = None
+
+
+class PhotoBatchResponse(BaseModel):
+    items: List[PhotoDetailedResponse]
+    missing: List[int] = []
+
+
+class TrendingPhotoResponse(BaseModel):
+    id: int
+    photo_url: HttpUrl
+    owner_id: int
+    description: Optional[str] = None
+    created_at: datetime
+    votes: int
+    rating: float
+    score: float
+
+
 class SortOptions(str, Enum):
     rating = "rating"
     date = "date"
+    taken = "taken"
 
 
 class ResponceOptions(str, Enum):
@@ -116,6 +197,12 @@ class CommentDb(BaseModel):
     user_id: int
     model_config = ConfigDict(from_attributes=True)
 
+class CommentPage(BaseModel):
+    items: List[CommentDb]
+    total: int
+    next_cursor: Optional[str] = None
+
+
 class CommentResponse(BaseModel):
     comment: CommentDb
     message: str = "Comment updated"
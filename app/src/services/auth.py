@@ -1,3 +1,4 @@
+from functools import cached_property
 from typing import Optional, Annotated
 import pickle
 
@@ -6,14 +7,21 @@ from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+import secrets
 from sqlalchemy.orm import Session
-import redis
 
 from app.src.database.db import get_db
 from app.src.repository import users as repository_users
 from app.src.conf.config import settings
 from app.src.schemas import UserDb
 from app.src.database.models import User
+from app.src.services.logging import bind_request_context
+from app.src.services.metrics import InstrumentedRedis, USER_CACHE_REQUESTS, BCRYPT_LATENCY
+from app.src.services.redis_client import get_redis
+
+
+# requested passwords wait this long (seconds) for the reset link, same as the link token
+PASSWORD_RESET_TTL = 3600
 
 
 class Auth:
@@ -24,7 +32,13 @@ class Auth:
     SECRET_KEY = settings.jwt_secret_key
     ALGORITHM = settings.jwt_algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+
+    @cached_property
+    def r(self) -> InstrumentedRedis:
+        """
+        Redis client of the user cache and token blacklist, created on first use
+        """
+        return get_redis()
 
     def verify_password(self, plain_password, hashed_password):
         """
@@ -37,7 +51,8 @@ class Auth:
         Returns:
             bool: True if the password is correct, False otherwise.
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        with BCRYPT_LATENCY.labels("verify").time():
+            return self.pwd_context.verify(plain_password, hashed_password)
 
     def get_password_hash(self, plain_password):
         """
@@ -49,7 +64,8 @@ class Auth:
         Returns:
             str: Hash for provided plaintext password.
         """
-        return self.pwd_context.hash(plain_password)
+        with BCRYPT_LATENCY.labels("hash").time():
+            return self.pwd_context.hash(plain_password)
 
     async def create_access_token(self, data: dict, expires_delta: int = 15) -> str:
         """
@@ -143,6 +159,7 @@ class Auth:
             raise credentials_exception
         user = self.r.get(f"user:{email}")
         if not user:
+            USER_CACHE_REQUESTS.labels("miss").inc()
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
                 raise credentials_exception
@@ -151,7 +168,9 @@ class Auth:
             self.r.set(f"user:{email}", pickle.dumps(user))
             self.r.expire(f"user:{email}", 900)
         else:
+            USER_CACHE_REQUESTS.labels("hit").inc()
             user = pickle.loads(user)
+        bind_request_context(user_id=user.id)
         return user
 
     async def create_email_token(self, data: dict, expires_delta: Optional[float] = None) -> str:
@@ -194,9 +213,24 @@ class Auth:
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                                 detail="Invalid token for email verification")
 
-    async def get_password_from_token(self, token: str) -> str:
+    def store_password_reset(self, new_password: str) -> str:
         """
-        Get reset password from JWT token
+        Keep a salted hash of the requested password until the reset link is used,
+        the password itself never leaves the request
+
+        Args:
+            new_password (str): plaintext password to set
+
+        Returns:
+            str: random id of the reset, put into the reset link token
+        """
+        reset_id = secrets.token_urlsafe(32)
+        self.r.set(f"password_reset:{reset_id}", self.get_password_hash(new_password), ex=PASSWORD_RESET_TTL)
+        return reset_id
+
+    async def pop_password_reset(self, token: str) -> str | None:
+        """
+        Hashed password of the reset from the link token, a link resets the password once
 
         Args:
             token (str): JWT token
@@ -205,15 +239,17 @@ class Auth:
             HTTPException: 422 Invalid token for password reset
 
         Returns:
-            str: new password
+            str | None: hashed password, None if the reset expired or was used
         """
         try:
             payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            password = payload["pass"]
-            return password
-        except JWTError as e:
+            key = f"password_reset:{payload['reset']}"
+        except (JWTError, KeyError):
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                                 detail="Invalid token for password reset")
+        hashed_password = self.r.get(key)
+        self.r.delete(key)
+        return hashed_password.decode() if hashed_password else None
 
     async def update_password(self, user: User, new_password: str, db: Session) -> str:
         """
@@ -1,8 +1,33 @@
+import asyncio
 import cloudinary.uploader
+from functools import cache
 from typing import Optional
 
 from fastapi import HTTPException, status
-from app.src.conf.config import settings, cloudinary_config
+from app.src.conf.config import settings
+from app.src.services.metrics import CLOUDINARY_LATENCY
+
+
+ALLOWED_FORMATS = ["jpg", "jpeg", "png", "webp", "bmp", "gif", "svg", "tif", "tiff"]
+
+
+@cache
+def configure() -> None:
+    """
+    Set cloudinary credentials from settings, once before the first API call
+    """
+    cloudinary.config(
+        cloud_name=settings.cloudinary_name,
+        api_key=settings.cloudinary_api_key,
+        api_secret=settings.cloudinary_api_secret,
+        secure=True
+    )
+
+
+def _upload(file) -> dict:
+    configure()
+    with CLOUDINARY_LATENCY.labels("upload").time():
+        return cloudinary.uploader.upload(file, allowed_formats=ALLOWED_FORMATS)
 
 
 async def upload_photo(file):
@@ -14,16 +39,39 @@ async def upload_photo(file):
         HTTPException: provided file has pother than allowed_formats format
     """
     try:
-        upload_result = cloudinary.uploader.upload(
-            file, 
-            allowed_formats=["jpg", "jpeg", "png", "webp", "bmp", "gif", "svg", "tif", "tiff"]
-        )
+        upload_result = _upload(file)
         return upload_result
     except cloudinary.exceptions.Error as e:
         print(f"Error uploading to Cloudinary: {e}")
         raise HTTPException(status_code=400, detail="Error uploading image.")
 
 
+async def upload_photos(files: list, concurrency: int) -> list:
+    """upload_photos
+    Uploads photos onto cloudinary server in worker threads, at most `concurrency` at a time
+    Args:
+        files (list[file]): photos to be upload on cloudinary
+        concurrency (int): max number of uploads in progress
+
+    Returns:
+        list[dict | Exception]: upload result or raised error for every file, in the given order
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def upload(file):
+        async with semaphore:
+            return await asyncio.to_thread(_upload, file)
+
+    return await asyncio.gather(*(upload(file) for file in files), return_exceptions=True)
+
+
+def _destroy(cloudinary_url: str) -> dict:
+    public_id = cloudinary_url.split("/")[-1].split(".")[0]
+    configure()
+    with CLOUDINARY_LATENCY.labels("destroy").time():
+        return cloudinary.uploader.destroy(public_id, invalidate=True)
+
+
 async def delete_photo(cloudinary_url: str):
     """delete_photo
     Deletes photo from the cloudinary server 
@@ -33,8 +81,26 @@ async def delete_photo(cloudinary_url: str):
     Returns:
         [dict]: A dictionary containing the result of the deletion operation.
     """
-    public_id = cloudinary_url.split("/")[-1].split(".")[0]
-    return cloudinary.uploader.destroy(public_id, invalidate=True) 
+    return _destroy(cloudinary_url)
+
+
+async def delete_photos(cloudinary_urls: list[str], concurrency: int) -> list:
+    """delete_photos
+    Deletes photos from the cloudinary server in worker threads, at most `concurrency` at a time
+    Args:
+        cloudinary_urls (list[str]): photos' urls on cloudinary
+        concurrency (int): max number of deletions in progress
+
+    Returns:
+        list[dict | Exception]: deletion result or raised error for every url, in the given order
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def destroy(url):
+        async with semaphore:
+            return await asyncio.to_thread(_destroy, url)
+
+    return await asyncio.gather(*(destroy(url) for url in cloudinary_urls), return_exceptions=True)
 
 
 async def transformed_photo_url(
@@ -83,6 +149,7 @@ async def transformed_photo_url(
     new_url = ""
 
     if transformation_string:
+        configure()
         new_url = f"https://res.cloudinary.com/{cloudinary.config().cloud_name}/image/upload/{transformation_string}/{public_id}.jpg"
 
     return new_url
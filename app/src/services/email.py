@@ -1,71 +1,302 @@
+"""
+Sending of templated emails.
+
+Templates are loaded once per process. Messages are queued and sent by a few sender tasks,
+each takes all queued messages (up to MAIL_BATCH_SIZE) and sends them in a row over one
+persistent SMTP connection from the pool, so a signup spike reuses a handful of TLS sessions
+instead of opening one per message. Connections unused for MAIL_IDLE_TIMEOUT are reopened.
+"""
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.utils import formataddr, formatdate, make_msgid
+from functools import cache
 from pathlib import Path
+from typing import AsyncIterator
+import asyncio
+import logging
+import time
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, Template
 from pydantic import EmailStr
 
 from app.src.services.auth import auth_service
+from app.src.services.metrics import MAIL_BATCH_SIZE, MAILS_SENT, SMTP_CONNECTIONS
 from app.src.conf.config import settings
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME=settings.mail_from_name,
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+TEMPLATE_FOLDER = Path(__file__).parent / 'templates'
+
+logger = logging.getLogger(__name__)
+
+
+@cache
+def templates() -> dict[str, Template]:
+    """
+    Compiled email templates by file name, loaded on first use
+    """
+    env = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER))
+    return {name: env.get_template(name) for name in env.list_templates(extensions=["html"])}
 
 
-async def send_email(email: EmailStr, username: str, host: str):
+def render_message(email: EmailStr, subject: str, template_name: str, template_body: dict) -> EmailMessage:
     """
-    Send confirmetion email to the user
+    Html email rendered from a template, From is set by the mailer
 
     Args:
         email (EmailStr): Email address to send message.
-        username (str): Username of the recipient.
-        host (str): Hostname of the recipient.
-    """    
-    try:
-        token_verification = await auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
+        subject (str): Subject of the message.
+        template_name (str): Template file in the templates folder.
+        template_body (dict): Template variables.
+
+    Returns:
+        EmailMessage: message ready to send
+    """
+    message = EmailMessage()
+    message["To"] = email
+    message["Subject"] = subject
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = make_msgid()
+    message.set_content(templates()[template_name].render(**template_body), subtype="html")
+    return message
+
+
+class SMTPPool:
+    """
+    Persistent SMTP connections, at most size of them open at once
+    """
+    def __init__(self, size: int, idle_timeout: float, **options):
+        """
+        Args:
+            size (int): max open connections
+            idle_timeout (float): seconds an unused connection is kept
+            **options: aiosmtplib.SMTP arguments (hostname, port, username, password, use_tls...)
+        """
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.options = options
+        self._idle: list[tuple[aiosmtplib.SMTP, float]] = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def _take(self) -> aiosmtplib.SMTP:
+        while self._idle:
+            smtp, released_at = self._idle.pop()
+            if smtp.is_connected and time.monotonic() - released_at < self.idle_timeout:
+                return smtp
+            smtp.close()
+        smtp = aiosmtplib.SMTP(**self.options)
+        await smtp.connect()
+        SMTP_CONNECTIONS.inc()
+        return smtp
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosmtplib.SMTP]:
+        """
+        Connected and logged in SMTP client. The connection is closed instead of being reused
+        when an error leaves the block (OSError: disconnect, timeout...)
+        """
+        async with self._slots:
+            smtp = await self._take()
+            try:
+                yield smtp
+            except BaseException:
+                smtp.close()
+                raise
+            self._idle.append((smtp, time.monotonic()))
+
+    async def close(self) -> None:
+        """
+        Quit all idle connections
+        """
+        idle, self._idle = self._idle, []
+        for smtp, _ in idle:
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+
+
+class Mailer:
+    """
+    Queue of outgoing messages sent in batches by one sender task per pooled connection
+    """
+    def __init__(self, pool: SMTPPool, batch_size: int, sender: str):
+        """
+        Args:
+            pool (SMTPPool): connections to send over
+            batch_size (int): max messages sent in a row over one connection
+            sender (str): From of messages without one, e.g. "PhotoShare <noreply@example.com>"
+
+        Raises:
+            ValueError: empty sender
+        """
+        if not sender:
+            raise ValueError("Mail sender is required, set MAIL_FROM")
+        self.pool = pool
+        self.batch_size = batch_size
+        self.sender = sender
+        self._queue: asyncio.Queue[tuple[EmailMessage, asyncio.Future]] = asyncio.Queue()
+        self._senders: list[asyncio.Task] = []
+
+    async def send(self, message: EmailMessage) -> None:
+        """
+        Queue the message and wait until the server accepted it, errors of the message are raised.
+        A message whose send was cancelled (job timeout) before the server got it is not sent,
+        so a retried job doesn't deliver it twice
+        """
+        if "From" not in message:
+            message["From"] = self.sender
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((message, future))
+        self._senders = [task for task in self._senders if not task.done()]
+        self._senders += [asyncio.create_task(self._sender()) for _ in range(self.pool.size - len(self._senders))]
+        try:
+            await future
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    async def _sender(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            batch = self._pending(batch)
+            if not batch:
+                continue
+            try:
+                await self._send_batch(batch)
+            except Exception as error:
+                logger.exception("Mail batch failed")
+                for _, future in batch:
+                    self._done(future, error)
+
+    async def _send_batch(self, batch: list[tuple[EmailMessage, asyncio.Future]]) -> None:
+        """
+        Send messages in a row over one connection. A message that fails (refused by the server,
+        invalid address...) fails alone, the rest of a batch whose connection broke is retried
+        once on a new connection, any other error of the connection fails the rest of the batch
+        """
+        MAIL_BATCH_SIZE.observe(len(batch))
+        for attempt in range(2):
+            try:
+                async with self.pool.connection() as smtp:
+                    while batch := self._pending(batch):
+                        message, future = batch[0]
+                        try:
+                            await smtp.send_message(message)
+                        except OSError:
+                            raise
+                        except Exception as error:
+                            self._done(future, error)
+                        else:
+                            self._done(future)
+                        batch = batch[1:]
+                return
+            except OSError as error:
+                logger.warning("SMTP connection failed with %d messages left: %r", len(batch), error)
+                if attempt:
+                    for _, future in batch:
+                        self._done(future, error)
+            except Exception as error:
+                logger.warning("SMTP connection failed with %d messages left: %r", len(batch), error)
+                for _, future in batch:
+                    self._done(future, error)
+                return
+
+    @staticmethod
+    def _pending(batch: list[tuple[EmailMessage, asyncio.Future]]) -> list[tuple[EmailMessage, asyncio.Future]]:
+        """
+        Messages of the batch still waited for, cancelled ones are dropped
+        """
+        pending = [item for item in batch if not item[1].done()]
+        if len(pending) < len(batch):
+            MAILS_SENT.labels("cancelled").inc(len(batch) - len(pending))
+        return pending
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+    @staticmethod
+    def _done(future: asyncio.Future, error: Exception | None = None) -> None:
+        MAILS_SENT.labels("error" if error else "ok").inc()
+        if future.done():
+            # the sender stopped waiting (job timeout)
+            return
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(None)
 
+    async def close(self) -> None:
+        """
+        Stop the senders and quit pooled connections, call after the last send returned
+        """
+        for task in self._senders:
+            task.cancel()
+        await asyncio.gather(*self._senders, return_exceptions=True)
+        self._senders = []
+        await self.pool.close()
 
-async def send_password_email(email: EmailStr, password: str, username: str, host: str):
+
+def create_mailer() -> Mailer:
+    """
+    Mailer sending through the SMTP server from settings
+
+    Raises:
+        ValueError: MAIL_FROM is not set
+    """
+    credentials = {"username": settings.mail_username, "password": settings.mail_password} \
+        if settings.mail_use_credentials else {}
+    pool = SMTPPool(settings.mail_pool_size, settings.mail_idle_timeout,
+                    hostname=settings.mail_server, port=settings.mail_port, timeout=settings.mail_timeout,
+                    use_tls=settings.mail_ssl_tls, start_tls=settings.mail_starttls,
+                    validate_certs=settings.mail_validate_certs, **credentials)
+    sender = formataddr((settings.mail_from_name, settings.mail_from)) if settings.mail_from else ""
+    return Mailer(pool, settings.mail_batch_size, sender)
+
+
+_mailer: Mailer | None = None
+
+
+def get_mailer() -> Mailer:
+    """
+    Mailer of the process, created on first use
+    """
+    global _mailer
+    if _mailer is None:
+        _mailer = create_mailer()
+    return _mailer
+
+
+async def close_mailer() -> None:
     """
-    Send email for password reset
+    Close the mailer of the process if it was used
+    """
+    global _mailer
+    if _mailer is not None:
+        await _mailer.close()
+        _mailer = None
+
+
+async def send_template(email: EmailStr, subject: str, template_name: str, template_body: dict) -> None:
+    """
+    Send html email rendered from a template, connection errors are raised
 
     Args:
         email (EmailStr): Email address to send message.
-        password (str): New password.
-        username (str): Username of the recipient.
-        host (str): Hostname of the recipient.
-    """    
-    try:
-        token_verification = await auth_service.create_email_token({"sub": email, "pass": password}, expires_delta=60)
-        message = MessageSchema(
-            subject="Reset password",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_password_reset_template.html")
-    except ConnectionErrors as err:
-        print(err)
+        subject (str): Subject of the message.
+        template_name (str): Template file in the templates folder.
+        template_body (dict): Template variables.
+    """
+    await get_mailer().send(render_message(email, subject, template_name, template_body))
+
+
+async def password_reset_token(email: EmailStr, reset_id: str) -> str:
+    """
+    Token of the password reset link, valid for an hour
+
+    Args:
+        email (EmailStr): Email of the user.
+        reset_id (str): Id of the requested reset, see Auth.store_password_reset.
+
+    Returns:
+        str: JWT token
+    """
+    return await auth_service.create_email_token({"sub": email, "reset": reset_id}, expires_delta=60)
@@ -0,0 +1,89 @@
+"""
+EXIF metadata of uploaded photos.
+
+Pillow reads only the file header to get EXIF and image size, pixels are never decoded,
+so this is cheap even for large files.
+"""
+from datetime import datetime
+import io
+import logging
+
+from PIL import ExifTags, Image, UnidentifiedImageError
+
+
+logger = logging.getLogger(__name__)
+
+EXIF_DATE_FORMAT = "%Y:%m:%d %H:%M:%S"
+# orientations that rotate the picture by 90 degrees, stored width and height are swapped on display
+ROTATED = {5, 6, 7, 8}
+
+
+def _text(value, max_length: int) -> str | None:
+    if isinstance(value, bytes):
+        value = value.decode(errors="ignore")
+    if not isinstance(value, str):
+        return None
+    value = value.strip("\x00 ").strip()
+    return value[:max_length] or None
+
+
+def _taken_at(value) -> datetime | None:
+    value = _text(value, 19)
+    try:
+        return datetime.strptime(value, EXIF_DATE_FORMAT) if value else None
+    except ValueError:
+        return None
+
+
+def _coordinate(value, ref) -> float | None:
+    """
+    Degrees, minutes, seconds and N/S/E/W reference to signed decimal degrees
+    """
+    try:
+        degrees, minutes, seconds = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    result = degrees + minutes / 60 + seconds / 3600
+    return -result if _text(ref, 1) in ("S", "W") else result
+
+
+def read_exif(data: bytes) -> dict:
+    """
+    Capture time, camera, lens, dimensions, orientation and GPS position of the image
+
+    Args:
+        data (bytes): content of the uploaded file
+
+    Returns:
+        dict: Photo column values, missing values are None; empty when Pillow can't read the file
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            exif = image.getexif()
+            details = exif.get_ifd(ExifTags.IFD.Exif)
+            gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    except (UnidentifiedImageError, OSError, ValueError, SyntaxError, Image.DecompressionBombError) as err:
+        logger.debug("No EXIF: %s", err)
+        return {}
+
+    orientation = exif.get(ExifTags.Base.Orientation)
+    orientation = orientation if orientation in range(1, 9) else None
+    if orientation in ROTATED:
+        width, height = height, width
+    latitude = _coordinate(gps.get(ExifTags.GPS.GPSLatitude), gps.get(ExifTags.GPS.GPSLatitudeRef))
+    longitude = _coordinate(gps.get(ExifTags.GPS.GPSLongitude), gps.get(ExifTags.GPS.GPSLongitudeRef))
+    if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        latitude = longitude = None
+
+    return {
+        "taken_at": _taken_at(details.get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime)),
+        "camera_make": _text(exif.get(ExifTags.Base.Make), 64),
+        "camera_model": _text(exif.get(ExifTags.Base.Model), 64),
+        "lens": _text(details.get(ExifTags.Base.LensModel), 100),
+        "width": width,
+        "height": height,
+        "orientation": orientation,
+        "gps_latitude": latitude,
+        "gps_longitude": longitude,
+    }
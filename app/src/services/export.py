@@ -0,0 +1,135 @@
+"""
+Streamed NDJSON export of everything a user owns.
+
+Rows come from server side cursors in fixed size batches and every chunk is compressed
+as soon as it is produced, so memory stays flat however many photos or comments the user has.
+"""
+from datetime import datetime
+import json
+from typing import Callable, Iterable, Iterator
+import zlib
+
+from sqlalchemy.orm import Session
+
+from app.src.database.models import User
+from app.src.repository import users as repository_users
+
+# bytes of NDJSON collected before a chunk is compressed and sent
+CHUNK_SIZE = 64 * 1024
+# 16 + MAX_WBITS: zlib writes gzip header and trailer
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def export_records(user_id: int, db: Session) -> Iterator[dict]:
+    """
+    User's profile, photos, comments and rates as plain dicts
+
+    Args:
+        user_id (int): exported user id
+        db (Session): database session, must stay open while iterating
+
+    Returns:
+        Iterator[dict]: one record per line of the export, "type" tells the kind
+    """
+    user = db.get(User, user_id)
+    if user is None:
+        return
+    yield {"type": "user", "id": user.id, "username": user.username, "email": user.email,
+           "role": user.role, "avatar": user.avatar, "created_at": user.created_at}
+    for photo in repository_users.iter_users_photos(user_id, db):
+        yield {"type": "photo", "id": photo.id, "photo_url": photo.photo_url,
+               "changed_photo_url": photo.changed_photo_url, "description": photo.description,
+               "rating": photo.rating, "tags": [tag.name for tag in photo.tags],
+               "created_at": photo.created_at, "updated_at": photo.updated_at}
+    for comment in repository_users.iter_users_comments(user_id, db):
+        yield {"type": "comment", "id": comment.id, "photo_id": comment.photo_id, "text": comment.text,
+               "created_at": comment.created_at, "updated_at": comment.updated_at}
+    for rate in repository_users.iter_users_rates(user_id, db):
+        yield {"type": "rate", "id": rate.id, "photo_id": rate.photo_id, "rate": rate.rate,
+               "created_at": rate.created_at}
+
+
+def ndjson(records: Iterable[dict], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Serialize records to newline delimited JSON, grouped in chunks of about chunk_size bytes
+
+    Args:
+        records (Iterable[dict]): records to serialize
+        chunk_size (int, optional): bytes per chunk. Defaults to CHUNK_SIZE.
+
+    Returns:
+        Iterator[bytes]: chunks of whole lines
+    """
+    buffer, size = [], 0
+    for record in records:
+        line = json.dumps(record, default=_json_default, ensure_ascii=False).encode() + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Compress a byte stream into a single gzip member on the fly
+
+    Args:
+        chunks (Iterable[bytes]): uncompressed chunks
+
+    Returns:
+        Iterator[bytes]: compressed chunks, empty ones are skipped
+    """
+    compressor = zlib.compressobj(wbits=GZIP_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    """
+    Check Accept-Encoding header for gzip not disabled with q=0
+
+    Args:
+        accept_encoding (str | None): value of the header
+
+    Returns:
+        bool: gzip may be used
+    """
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = params.strip().lower().removeprefix("q=")
+        try:
+            return not params or float(quality) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def stream_export(user_id: int, session_factory: Callable[[], Session], compress: bool) -> Iterator[bytes]:
+    """
+    Body of the export response, opens its own session for the time of streaming
+
+    Args:
+        user_id (int): exported user id
+        session_factory (Callable[[], Session]): factory of database sessions
+        compress (bool): gzip the stream
+
+    Returns:
+        Iterator[bytes]: response body chunks
+    """
+    with session_factory() as db:
+        chunks = ndjson(export_records(user_id, db))
+        yield from gzip_chunks(chunks) if compress else chunks
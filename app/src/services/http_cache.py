@@ -0,0 +1,34 @@
+from hashlib import blake2b
+
+
+def weak_etag(*parts) -> str:
+    """
+    Weak entity tag from values identifying a representation
+
+    Args:
+        *parts: values that change whenever the representation changes
+
+    Returns:
+        str: ETag header value, e.g. W/"1f2e3d4c5b6a7988"
+    """
+    digest = blake2b(":".join(str(part) for part in parts).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    If-None-Match check with weak comparison (RFC 9110, 13.1.2)
+
+    Args:
+        if_none_match (str | None): If-None-Match request header
+        etag (str): current ETag of the resource
+
+    Returns:
+        bool: True if the client copy is current and 304 can be sent
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
@@ -0,0 +1,107 @@
+"""
+Fingerprints of uploaded images for deduplication.
+
+SHA-256 of the file finds exact copies. A 64-bit difference hash (dHash) finds near copies:
+resized, recompressed or slightly edited versions of the same picture differ in a few bits.
+The dHash is stored as four indexed 16-bit bands. Two hashes within Hamming distance 3
+share at least one whole band, so candidates come from four equality lookups on indexes
+and only they are compared bit by bit.
+"""
+import asyncio
+import hashlib
+import io
+
+from PIL import Image, UnidentifiedImageError
+
+HASH_SIZE = 8
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def sha256_hex(data: bytes) -> str:
+    """
+    Content hash of the file
+
+    Args:
+        data (bytes): file content
+
+    Returns:
+        str: hex digest
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def dhash(data: bytes) -> int | None:
+    """
+    Difference hash: brightness gradients of a 9x8 grayscale thumbnail, one bit per neighbour pair
+
+    Args:
+        data (bytes): image file content
+
+    Returns:
+        int | None: 64-bit hash, None when Pillow can't read the image (e.g. SVG)
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # JPEG is decoded at a reduced scale, much faster for large photos
+            image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+            small = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+            pixels = small.tobytes()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return None
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = value << 1 | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def bands(value: int) -> list[int]:
+    """
+    Split 64-bit hash into 16-bit bands, most significant first
+
+    Args:
+        value (int): dHash
+
+    Returns:
+        list[int]: BANDS values
+    """
+    return [(value >> (BAND_BITS * (BANDS - 1 - i))) & BAND_MASK for i in range(BANDS)]
+
+
+def from_bands(values: list[int]) -> int:
+    """
+    Join bands back into the hash, inverse of bands
+
+    Args:
+        values (list[int]): bands, most significant first
+
+    Returns:
+        int: dHash
+    """
+    value = 0
+    for band in values:
+        value = value << BAND_BITS | band
+    return value
+
+
+def hamming(first: int, second: int) -> int:
+    """
+    Number of different bits
+    """
+    return (first ^ second).bit_count()
+
+
+async def fingerprint(data: bytes) -> tuple[str, int | None]:
+    """
+    SHA-256 and dHash of an uploaded file, computed in a worker thread
+
+    Args:
+        data (bytes): content of the uploaded file
+
+    Returns:
+        tuple[str, int | None]: hex SHA-256 and dHash
+    """
+    return await asyncio.to_thread(lambda: (sha256_hex(data), dhash(data)))
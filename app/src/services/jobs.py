@@ -0,0 +1,380 @@
+"""
+Durable background jobs.
+
+Routes enqueue jobs by name with JSON serializable keyword arguments and return right away,
+handlers run in a separate worker process (python worker.py), so side work survives restarts
+of the web workers and doesn't compete with requests.
+
+The Redis backend keeps jobs in a stream read by a consumer group. A job is acknowledged only after
+its handler succeeded, jobs of a crashed or hung worker are reclaimed by another one after
+JOB_VISIBILITY_TIMEOUT and count as a failed run. Failed runs are retried with exponential backoff
+from a sorted set of delayed jobs, after the last attempt the job goes to the dead letter stream for inspection.
+The memory backend keeps jobs in process, for tests and the load test.
+"""
+from dataclasses import asdict, dataclass, field, replace
+from typing import Awaitable, Callable
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+
+import redis.asyncio as aioredis
+from redis.exceptions import ResponseError
+
+from app.src.conf.config import settings
+from app.src.services.metrics import (JOBS_BACKLOG, JOBS_ENQUEUED, JOBS_IN_PROGRESS, JOBS_PROCESSED, JOB_DURATION,
+                                      JOB_WAIT)
+
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[..., Awaitable[None]]
+
+
+@dataclass
+class JobSpec:
+    handler: Handler
+    max_attempts: int
+    timeout: float
+
+
+_registry: dict[str, JobSpec] = {}
+
+
+def job(name: str, max_attempts: int | None = None, timeout: float = 60.0) -> Callable[[Handler], Handler]:
+    """
+    Register an async function as the handler of jobs with the name.
+    Handlers must be idempotent, a job runs at least once
+
+    Args:
+        name (str): job name used by enqueue
+        max_attempts (int, optional): runs before the job is dead. Defaults to settings.job_max_attempts.
+        timeout (float, optional): seconds one run may take. Defaults to 60.
+
+    Returns:
+        Callable[[Handler], Handler]: decorator returning the handler unchanged
+    """
+    def decorator(handler: Handler) -> Handler:
+        _registry[name] = JobSpec(handler, max_attempts or settings.job_max_attempts, timeout)
+        return handler
+    return decorator
+
+
+@dataclass
+class Job:
+    name: str
+    kwargs: dict
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    attempt: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+    error: str | None = None
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def loads(cls, data: str) -> "Job":
+        return cls(**json.loads(data))
+
+
+def backoff(attempt: int) -> float:
+    """
+    Delay before the next run: doubles with every failed attempt up to the max, with jitter
+    so that jobs failed together don't come back together
+
+    Args:
+        attempt (int): number of failed runs, from 1
+
+    Returns:
+        float: seconds
+    """
+    delay = min(settings.job_retry_max_delay, settings.job_retry_delay * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+# delayed jobs whose time has come are moved into the stream in one step
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, job in ipairs(due) do
+    redis.call('XADD', KEYS[2], '*', 'job', job)
+    redis.call('ZREM', KEYS[1], job)
+end
+return #due
+"""
+
+
+class RedisBackend:
+    """
+    Jobs in a Redis stream with a consumer group, delayed retries in a sorted set
+    """
+    group = "workers"
+
+    def __init__(self, client: aioredis.Redis, stream: str):
+        self.r = client
+        self.stream = stream
+        self.delayed = f"{stream}:delayed"
+        self.dead = f"{stream}:dead"
+        self._promote = client.register_script(PROMOTE_SCRIPT)
+
+    async def setup(self) -> None:
+        try:
+            await self.r.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as err:
+            if "BUSYGROUP" not in str(err):
+                raise
+
+    async def push(self, job: Job) -> None:
+        await self.r.xadd(self.stream, {"job": job.dumps()})
+
+    async def fetch(self, consumer: str, count: int, block: float) -> list[tuple[str, Job]]:
+        reply = await self.r.xreadgroup(self.group, consumer, {self.stream: ">"}, count=count,
+                                        block=int(block * 1000))
+        return [(entry_id, Job.loads(fields["job"])) for _, entries in reply or [] for entry_id, fields in entries]
+
+    async def reclaim(self, consumer: str, idle: float, count: int) -> list[tuple[str, Job]]:
+        reply = await self.r.xautoclaim(self.stream, self.group, consumer, int(idle * 1000), "0-0", count=count)
+        # entries trimmed meanwhile come back without fields
+        return [(entry_id, Job.loads(fields["job"])) for entry_id, fields in reply[1] if fields]
+
+    async def ack(self, entry_id: str) -> None:
+        # acknowledged entries are removed, so the stream only holds unfinished jobs
+        async with self.r.pipeline(transaction=True) as pipe:
+            await pipe.xack(self.stream, self.group, entry_id).xdel(self.stream, entry_id).execute()
+
+    async def retry(self, entry_id: str, job: Job, delay: float) -> None:
+        async with self.r.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.delayed, {job.dumps(): time.time() + delay})
+            await pipe.xack(self.stream, self.group, entry_id).xdel(self.stream, entry_id).execute()
+
+    async def bury(self, entry_id: str, job: Job) -> None:
+        async with self.r.pipeline(transaction=True) as pipe:
+            pipe.xadd(self.dead, {"job": job.dumps()})
+            await pipe.xack(self.stream, self.group, entry_id).xdel(self.stream, entry_id).execute()
+
+    async def promote(self, limit: int = 100) -> int:
+        return await self._promote(keys=[self.delayed, self.stream], args=[time.time(), limit])
+
+    async def backlog(self) -> dict[str, int]:
+        async with self.r.pipeline(transaction=False) as pipe:
+            queued, delayed, dead = await pipe.xlen(self.stream).zcard(self.delayed).xlen(self.dead).execute()
+        return {"queued": queued, "delayed": delayed, "dead": dead}
+
+
+class MemoryBackend:
+    """
+    In-process jobs with the interface of RedisBackend, lost with the process
+    """
+    def __init__(self):
+        self.queued: dict[str, Job] = {}
+        self.pending: dict[str, tuple[Job, float]] = {}
+        self.delayed: list[tuple[float, Job]] = []
+        self.dead: list[Job] = []
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+
+    async def setup(self) -> None:
+        pass
+
+    async def push(self, job: Job) -> None:
+        self._seq += 1
+        self.queued[str(self._seq)] = job
+        self._wakeup.set()
+
+    async def fetch(self, consumer: str, count: int, block: float) -> list[tuple[str, Job]]:
+        if not self.queued:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), block)
+            except asyncio.TimeoutError:
+                return []
+        entries = list(self.queued.items())[:count]
+        for entry_id, job in entries:
+            del self.queued[entry_id]
+            self.pending[entry_id] = (job, time.monotonic())
+        return entries
+
+    async def reclaim(self, consumer: str, idle: float, count: int) -> list[tuple[str, Job]]:
+        now = time.monotonic()
+        entries = [(entry_id, job) for entry_id, (job, since) in self.pending.items() if now - since >= idle][:count]
+        for entry_id, job in entries:
+            self.pending[entry_id] = (job, now)
+        return entries
+
+    async def ack(self, entry_id: str) -> None:
+        self.pending.pop(entry_id, None)
+
+    async def retry(self, entry_id: str, job: Job, delay: float) -> None:
+        self.pending.pop(entry_id, None)
+        self.delayed.append((time.time() + delay, job))
+
+    async def bury(self, entry_id: str, job: Job) -> None:
+        self.pending.pop(entry_id, None)
+        self.dead.append(job)
+
+    async def promote(self, limit: int = 100) -> int:
+        now = time.time()
+        due = [item for item in self.delayed if item[0] <= now][:limit]
+        for item in due:
+            self.delayed.remove(item)
+            await self.push(item[1])
+        return len(due)
+
+    async def backlog(self) -> dict[str, int]:
+        return {"queued": len(self.queued) + len(self.pending), "delayed": len(self.delayed), "dead": len(self.dead)}
+
+
+class JobQueue:
+    """
+    Enqueue side of the backend. Eager queues run every job at once in the caller,
+    like BackgroundTasks did, without retries
+    """
+    def __init__(self, backend: RedisBackend | MemoryBackend, eager: bool = False):
+        self.backend = backend
+        self.eager = eager
+
+    async def enqueue(self, name: str, **kwargs) -> Job:
+        """
+        Add a job
+
+        Args:
+            name (str): registered job name
+            kwargs: JSON serializable arguments of the handler
+
+        Returns:
+            Job: enqueued job
+        """
+        job = Job(name, kwargs)
+        JOBS_ENQUEUED.labels(name).inc()
+        if self.eager:
+            try:
+                await _registry[name].handler(**kwargs)
+            except Exception as err:
+                logger.warning("Job %s %s failed: %r", name, job.id, err)
+        else:
+            await self.backend.push(job)
+        return job
+
+
+class Worker:
+    """
+    Runs jobs of the queue, at most concurrency at a time, until stopped
+    """
+    def __init__(self, backend: RedisBackend | MemoryBackend, concurrency: int | None = None,
+                 name: str | None = None, block: float = 1.0):
+        self.backend = backend
+        self.concurrency = concurrency or settings.job_concurrency
+        self.name = name or f"worker-{uuid.uuid4().hex[:8]}"
+        self.block = block
+        self._running: set[asyncio.Task] = set()
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """
+        Fetch and run jobs until stop is set, then wait for running jobs
+
+        Args:
+            stop (asyncio.Event): shutdown signal
+        """
+        await self.backend.setup()
+        last_reclaim = last_backlog = 0.0
+        while not stop.is_set():
+            await self.backend.promote()
+            free = self.concurrency - len(self._running)
+            if not free:
+                await asyncio.wait(self._running, timeout=self.block, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            if time.monotonic() - last_reclaim >= settings.job_visibility_timeout / 2:
+                last_reclaim = time.monotonic()
+                # a run that never finished counts as failed, the job is stored again with its attempt,
+                # so a job that keeps killing or hanging its worker ends in dead letters
+                for entry_id, job in await self.backend.reclaim(self.name, settings.job_visibility_timeout, free):
+                    await self._fail(entry_id, job, "worker lost")
+            for entry_id, job in await self.backend.fetch(self.name, free, self.block):
+                task = asyncio.create_task(self.process(entry_id, job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            if time.monotonic() - last_backlog >= self.block:
+                last_backlog = time.monotonic()
+                for state, value in (await self.backend.backlog()).items():
+                    JOBS_BACKLOG.labels(state).set(value)
+        if self._running:
+            await asyncio.wait(self._running)
+
+    async def process(self, entry_id: str, job: Job) -> None:
+        """
+        Run one job, acknowledge it, schedule a retry or move it to dead letters
+
+        Args:
+            entry_id (str): backend entry of the job
+            job (Job): job to run
+        """
+        spec = _registry.get(job.name)
+        if spec is None:
+            logger.error("Job %s %s has no handler", job.name, job.id)
+            await self.backend.bury(entry_id, replace(job, error="unknown job"))
+            JOBS_PROCESSED.labels(job.name, "dead").inc()
+            return
+        if job.attempt >= spec.max_attempts:
+            await self.backend.bury(entry_id, job)
+            JOBS_PROCESSED.labels(job.name, "dead").inc()
+            return
+
+        JOB_WAIT.labels(job.name).observe(max(0.0, time.time() - job.enqueued_at))
+        start = time.perf_counter()
+        try:
+            with JOBS_IN_PROGRESS.track_inprogress():
+                await asyncio.wait_for(spec.handler(**job.kwargs), spec.timeout)
+        except Exception as err:
+            await self._fail(entry_id, job, repr(err))
+        else:
+            await self.backend.ack(entry_id)
+            JOBS_PROCESSED.labels(job.name, "ok").inc()
+        finally:
+            JOB_DURATION.labels(job.name).observe(time.perf_counter() - start)
+
+    async def _fail(self, entry_id: str, job: Job, error: str) -> None:
+        """
+        Count a failed run: schedule a retry with backoff or move the job to dead letters after the last attempt
+        """
+        spec = _registry.get(job.name)
+        failed = replace(job, attempt=job.attempt + 1, error=error)
+        if spec is None or failed.attempt >= spec.max_attempts:
+            logger.error("Job %s %s failed for good: %s", job.name, job.id, error)
+            await self.backend.bury(entry_id, failed)
+            JOBS_PROCESSED.labels(job.name, "dead").inc()
+        else:
+            delay = backoff(failed.attempt)
+            logger.warning("Job %s %s failed, retry in %.1fs: %s", job.name, job.id, delay, error)
+            await self.backend.retry(entry_id, failed, delay)
+            JOBS_PROCESSED.labels(job.name, "retry").inc()
+
+
+def create_backend() -> RedisBackend | MemoryBackend:
+    """
+    Backend chosen by settings.job_backend
+    """
+    if settings.job_backend == "memory":
+        return MemoryBackend()
+    client = aioredis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, decode_responses=True)
+    return RedisBackend(client, settings.job_stream)
+
+
+_queue: JobQueue | None = None
+
+
+def get_queue() -> JobQueue:
+    """
+    Queue of the process, created on first use
+    """
+    global _queue
+    if _queue is None:
+        _queue = JobQueue(create_backend())
+    return _queue
+
+
+async def enqueue(name: str, **kwargs) -> Job:
+    """
+    Add a job to the queue of the process, see JobQueue.enqueue
+    """
+    return await get_queue().enqueue(name, **kwargs)
@@ -1,22 +1,248 @@
 from fastapi import Response, Request
 from starlette.background import BackgroundTask
 from starlette.responses import StreamingResponse
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
 from fastapi.routing import APIRoute
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from typing import Callable
 import logging
-import httpx
+import queue
+import json
+import time
+import uuid
+
+from app.src.conf.config import settings
+
+
+# per-request fields (request id, route, user id) attached to every log record
+request_context: ContextVar[dict | None] = ContextVar("request_context", default=None)
+
+access_logger = logging.getLogger("photoshare.access")
+
+_listener: QueueListener | None = None
+_queue_handler: QueueHandler | None = None
+
 
 def log_info(req_body, res_body):
     logging.info(req_body)
     logging.info(res_body)
 
 
+def bind_request_context(**fields) -> None:
+    """
+    Add fields (e.g. user_id) to the context of the current request,
+    so they appear in every log line written while handling it
+
+    Args:
+        fields: field names and values to attach
+    """
+    context = request_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats log records as single-line JSON objects
+    """
+    FIELDS = ("request_id", "method", "route", "status", "latency_ms", "user_id")
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    QueueHandler that only snapshots the record and the request context,
+    all formatting and file I/O happens in the listener thread
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        context = request_context.get()
+        if context:
+            for key, value in context.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class BatchingRotatingFileHandler(RotatingFileHandler):
+    """
+    Size-rotated file handler that writes records in batches
+    instead of one write + flush per record
+    """
+    def __init__(self, filename: str, max_bytes: int, backup_count: int,
+                 batch_size: int = 100, flush_interval: float = 1.0):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count,
+                         encoding="utf-8", delay=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: list[str] = []
+        self._last_flush = time.monotonic()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._buffer.append(self.format(record))
+            if (len(self._buffer) >= self.batch_size
+                    or record.levelno >= logging.ERROR
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return
+            data = "\n".join(self._buffer) + "\n"
+            self._buffer.clear()
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self.stream.tell() and self.stream.tell() + len(data) >= self.maxBytes:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(data)
+            self.stream.flush()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self.flush()
+        super().close()
+
+
+class BatchingQueueListener(QueueListener):
+    """
+    QueueListener that flushes its handlers when the queue stays idle,
+    so batched lines do not wait for the next record
+    """
+    def __init__(self, log_queue, *handlers, flush_interval: float = 1.0, respect_handler_level: bool = True):
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block: bool):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_interval)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+
+def start_logging() -> None:
+    """
+    Configure root logger to enqueue records and start the background listener
+    that writes them as JSON lines into the rotated log file
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    file_handler = BatchingRotatingFileHandler(
+        settings.log_file,
+        max_bytes=settings.log_max_bytes,
+        backup_count=settings.log_backup_count,
+        batch_size=settings.log_batch_size,
+        flush_interval=settings.log_flush_interval,
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = ContextQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.setLevel(settings.log_level.upper())
+    root.addHandler(_queue_handler)
+
+    _listener = BatchingQueueListener(log_queue, file_handler, flush_interval=settings.log_flush_interval)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """
+    Drain the log queue, flush the file and detach the queue handler
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener = None
+    _queue_handler = None
+
+
+class RequestLoggingMiddleware:
+    """
+    ASGI middleware writing one access log line per request
+    with request id, route template, status, latency and user id
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex
+        context = {"request_id": request_id}
+        token = request_context.set(context)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"].append((b"x-request-id", request_id.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            context["route"] = getattr(route, "path", scope["path"])
+            access_logger.info(
+                "%s %s %s", scope["method"], context["route"], status_code,
+                extra={
+                    **context,
+                    "method": scope["method"],
+                    "status": status_code,
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+                },
+            )
+            request_context.reset(token)
+
+
 class LoggingRoute(APIRoute):
     """
     APIRoute class replacement to enable verbose logging
-    """    
+    """
     def get_route_handler(self) -> Callable:
-        
+
         original_route_handler = super().get_route_handler()
 
         async def custom_route_handler(request: Request) -> Response:
@@ -24,27 +250,25 @@ class LoggingRoute(APIRoute):
             logging.info(f"{request.headers=}")
             response = await original_route_handler(request)
             tasks = response.background
-            
+
             if isinstance(response, StreamingResponse):
                 res_body = b''
                 async for item in response.body_iterator:
                     res_body += item
-                  
+
                 task = BackgroundTask(log_info, req_body, res_body)
-                response = Response(content=res_body, status_code=response.status_code, 
+                response = Response(content=res_body, status_code=response.status_code,
                         headers=dict(response.headers), media_type=response.media_type)
             else:
                 task = BackgroundTask(log_info, req_body, response.body)
-            
+
             # check if the original response had background tasks already attached to it
             if tasks:
                 tasks.add_task(task)  # add the new task to the tasks list
                 response.background = tasks
             else:
                 response.background = task
-                
+
             return response
-            
-        return custom_route_handler
 
-logging.basicConfig(filename='info.log', level=logging.DEBUG)
\ No newline at end of file
+        return custom_route_handler
@@ -0,0 +1,336 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Iterator
+import time
+
+import redis
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+# only requests handled by auth, users and photos routers are measured
+INSTRUMENTED_PREFIX = "/api/"
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    """
+    Base class for metrics with optional labels, children are created on first use
+    """
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        self._lock = Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        Child holding the value of one combination of labels
+        """
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._sample_lines(key, child))
+        return lines
+
+    def _sample_lines(self, key: tuple, child) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    @contextmanager
+    def track_inprogress(self) -> Iterator[None]:
+        self.value += 1
+        try:
+            yield
+        finally:
+            self.value -= 1
+
+
+class Gauge(_Metric):
+    """
+    Gauge metric, value is either set directly or read from a callback at scrape time
+    """
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Callable[[], float] | None = None
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._default().dec(amount)
+
+    def track_inprogress(self):
+        return self._default().track_inprogress()
+
+    def collect(self) -> list[str]:
+        if self._function is None:
+            return super().collect()
+        try:
+            value = self._function()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_value(value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds: tuple):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS, registry=None):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _sample_lines(self, key: tuple, child) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds + (float("inf"),), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Collection of metrics rendered in Prometheus text exposition format
+    """
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = Histogram("photoshare_http_request_duration_seconds",
+                            "HTTP request latency by route template", ("method", "route"))
+REQUESTS_TOTAL = Counter("photoshare_http_requests_total",
+                         "HTTP requests by route template and status code", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = Gauge("photoshare_http_requests_in_flight", "HTTP requests currently being processed")
+
+DB_POOL_SIZE = Gauge("photoshare_db_pool_size", "Configured size of the database connection pool")
+DB_POOL_CHECKED_OUT = Gauge("photoshare_db_pool_checked_out", "Database connections currently in use")
+DB_POOL_OVERFLOW = Gauge("photoshare_db_pool_overflow", "Database connections opened above the pool size")
+
+REDIS_LATENCY = Histogram("photoshare_redis_command_duration_seconds",
+                          "Redis command latency", ("command",),
+                          buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+CLOUDINARY_LATENCY = Histogram("photoshare_cloudinary_request_duration_seconds",
+                               "Cloudinary API call latency", ("operation",))
+
+USER_CACHE_REQUESTS = Counter("photoshare_user_cache_requests_total",
+                              "Current user cache lookups by result (hit or miss)", ("result",))
+USER_CACHE_HIT_RATIO = Gauge("photoshare_user_cache_hit_ratio", "Share of current user lookups served from cache")
+
+BCRYPT_LATENCY = Histogram("photoshare_bcrypt_duration_seconds", "Password hash operation latency", ("operation",))
+
+JOBS_ENQUEUED = Counter("photoshare_jobs_enqueued_total", "Background jobs enqueued by name", ("job",))
+JOBS_PROCESSED = Counter("photoshare_jobs_processed_total",
+                         "Background job runs by name and result (ok, retry, dead)", ("job", "result"))
+JOB_DURATION = Histogram("photoshare_job_duration_seconds", "Background job run time", ("job",),
+                         buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
+JOB_WAIT = Histogram("photoshare_job_wait_seconds", "Time from enqueue to the start of a job run", ("job",),
+                     buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0))
+JOBS_IN_PROGRESS = Gauge("photoshare_jobs_in_progress", "Background jobs currently running in this worker")
+JOBS_BACKLOG = Gauge("photoshare_jobs_backlog", "Background jobs by state (queued, delayed, dead)", ("state",))
+
+MAILS_SENT = Counter("photoshare_mails_sent_total", "Emails handed to the SMTP server by result (ok, error, cancelled)", ("result",))
+MAIL_BATCH_SIZE = Histogram("photoshare_mail_batch_size", "Emails sent over one SMTP connection in a row",
+                            buckets=(1, 2, 5, 10, 25, 50, 100))
+RATE_LIMIT_REQUESTS = Counter("photoshare_rate_limit_requests_total",
+                              "Rate limited requests by limit name and result (allowed, limited)", ("limit", "result"))
+SMTP_CONNECTIONS = Counter("photoshare_smtp_connections_opened_total", "SMTP connections opened by the mail pool")
+
+
+def _user_cache_hit_ratio() -> float:
+    hits = USER_CACHE_REQUESTS.labels("hit").value
+    total = hits + USER_CACHE_REQUESTS.labels("miss").value
+    return hits / total if total else 0.0
+
+
+USER_CACHE_HIT_RATIO.set_function(_user_cache_hit_ratio)
+
+
+def track_pool(engine) -> None:
+    """
+    Read database pool stats of the engine at scrape time
+
+    Args:
+        engine (Engine): SQLAlchemy engine
+    """
+    pool = engine.pool
+    for gauge, attr in ((DB_POOL_SIZE, "size"), (DB_POOL_CHECKED_OUT, "checkedout"), (DB_POOL_OVERFLOW, "overflow")):
+        if hasattr(pool, attr):
+            gauge.set_function(getattr(pool, attr))
+
+
+class InstrumentedRedis(redis.Redis):
+    """
+    Redis client recording latency of every command
+    """
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            REDIS_LATENCY.labels(str(args[0]).lower()).observe(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency histograms per route template and in-flight requests
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(INSTRUMENTED_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels()
+        in_flight.value += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.value -= 1
+            route = scope.get("route")
+            if route is not None:
+                REQUEST_LATENCY.labels(scope["method"], route.path).observe(elapsed)
+                REQUESTS_TOTAL.labels(scope["method"], route.path, status_code).inc()
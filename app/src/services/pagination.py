@@ -0,0 +1,39 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """
+    Opaque keyset cursor pointing at the last item of a page
+
+    Args:
+        created_at (datetime): creation time of the last item
+        item_id (int): id of the last item
+
+    Returns:
+        str: url safe cursor
+    """
+    raw = f"{created_at.isoformat()}|{item_id}".encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Decode cursor created by encode_cursor
+
+    Args:
+        cursor (str): cursor from the previous page
+
+    Raises:
+        ValueError: cursor is malformed
+
+    Returns:
+        tuple[datetime, int]: creation time and id of the last item of the previous page
+    """
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, item_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (BinasciiError, UnicodeDecodeError, ValueError) as err:
+        raise ValueError("Invalid cursor") from err
@@ -0,0 +1,307 @@
+"""
+Token bucket rate limits of expensive routes.
+
+Every limit is named and configured in RATE_LIMITS as "<requests>/<period>", e.g. "10/minute":
+a bucket holds up to <requests> tokens and refills at <requests> per <period>, a request takes
+one token (a bulk upload one per file) or gets 429 Too Many Requests. Buckets are kept per limit
+and per user, or per client address on routes without a user.
+
+Buckets live in Redis and are updated by a single Lua script, so all web workers share them.
+When Redis is unavailable (or RATE_LIMIT_BACKEND=memory) buckets are kept in process memory,
+each process then limits on its own.
+
+Responses of limited routes carry RateLimit-Limit, RateLimit-Remaining, RateLimit-Reset
+(seconds until the bucket is full) and RateLimit-Policy headers, 429 responses also Retry-After.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+import logging
+import math
+import re
+import time
+
+import redis.asyncio as aioredis
+from fastapi import Depends, HTTPException, Request, status
+from redis.exceptions import RedisError
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.src.conf.config import settings
+from app.src.database.models import User
+from app.src.services.auth import auth_service
+from app.src.services.metrics import RATE_LIMIT_REQUESTS
+
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ratelimit"
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+# seconds to use process buckets after a Redis error before trying Redis again
+REDIS_RETRY_AFTER = 5.0
+# max buckets kept in process memory, least recently used are dropped
+LOCAL_MAX_BUCKETS = 10_000
+
+# KEYS: bucket
+# ARGV: capacity, tokens refilled per second, tokens to take
+# returns: 1 if taken else 0, tokens left
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local taken = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    taken = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {taken, tostring(tokens)}
+"""
+
+
+@dataclass(frozen=True)
+class Limit:
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        """
+        Limit from "<requests>/<period>", period is a number of seconds or second, minute, hour, day
+
+        Raises:
+            ValueError: invalid limit
+        """
+        match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+(?:\.\d+)?|second|minute|hour|day)\s*", value)
+        if not match or int(match[1]) < 1:
+            raise ValueError(f"Invalid rate limit {value!r}, expected e.g. '10/minute'")
+        period = PERIODS.get(match[2]) or float(match[2])
+        if period <= 0:
+            raise ValueError(f"Invalid rate limit {value!r}, period must be positive")
+        return cls(int(match[1]), period)
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: Limit
+    tokens: float
+    cost: int
+
+    def headers(self) -> dict[str, str]:
+        """
+        RateLimit-* headers, with Retry-After when the request was refused
+        """
+        headers = {
+            "RateLimit-Limit": str(self.limit.capacity),
+            "RateLimit-Remaining": str(math.floor(self.tokens)),
+            "RateLimit-Reset": str(math.ceil((self.limit.capacity - self.tokens) / self.limit.rate)),
+            "RateLimit-Policy": f"{self.limit.capacity};w={self.limit.period:g}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil((self.cost - self.tokens) / self.limit.rate))
+        return headers
+
+
+class LocalBuckets:
+    """
+    Token buckets in process memory, same algorithm as TAKE_SCRIPT
+    """
+    def __init__(self, max_buckets: int = LOCAL_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str, limit: Limit, cost: int) -> tuple[bool, float]:
+        now = time.monotonic()
+        tokens, ts = self._buckets.pop(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + max(0.0, now - ts) * limit.rate)
+        taken = tokens >= cost
+        if taken:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return taken, tokens
+
+
+class RateLimiter:
+    """
+    Takes tokens from Redis buckets, from process buckets while Redis is unavailable
+    """
+    def __init__(self, client: aioredis.Redis | None, limits: dict[str, str]):
+        """
+        Args:
+            client (aioredis.Redis | None): Redis client, None keeps buckets in memory only
+            limits (dict[str, str]): limits by name, see Limit.parse
+        """
+        self.client = client
+        self.limits = {name: Limit.parse(value) for name, value in limits.items()}
+        self.local = LocalBuckets()
+        self._take = client.register_script(TAKE_SCRIPT) if client is not None else None
+        self._redis_down_until = 0.0
+
+    async def _take_redis(self, key: str, limit: Limit, cost: int) -> tuple[bool, float] | None:
+        if self._take is None or time.monotonic() < self._redis_down_until:
+            return None
+        try:
+            taken, tokens = await self._take(keys=[key], args=[limit.capacity, limit.rate, cost])
+        except (RedisError, OSError) as error:
+            logger.warning("Rate limits fall back to process memory for %ss: %r", REDIS_RETRY_AFTER, error)
+            self._redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+            return None
+        return bool(taken), float(tokens)
+
+    def max_cost(self, name: str, default: int) -> int:
+        """
+        Most tokens one request may take, e.g. files of a bulk upload
+
+        Args:
+            name (str): limit name
+            default (int): maximum of the request itself
+
+        Returns:
+            int: default, lowered to the bucket capacity of a configured limit
+        """
+        limit = self.limits.get(name)
+        return min(default, limit.capacity) if limit else default
+
+    async def hit(self, name: str, identity: str, cost: int = 1) -> Decision | None:
+        """
+        Take tokens of a request
+
+        Args:
+            name (str): limit name
+            identity (str): whose bucket, e.g. "user:1" or "ip:127.0.0.1"
+            cost (int, optional): tokens to take, at most max_cost of the limit
+
+        Raises:
+            ValueError: cost above the bucket capacity, it could never be taken
+
+        Returns:
+            Decision | None: None if the limit is not configured
+        """
+        limit = self.limits.get(name)
+        if limit is None:
+            return None
+        if cost > limit.capacity:
+            raise ValueError(f"Cost {cost} exceeds capacity {limit.capacity} of rate limit {name!r}")
+        key = f"{KEY_PREFIX}:{name}:{identity}"
+        result = await self._take_redis(key, limit, cost)
+        if result is None:
+            result = self.local.take(key, limit, cost)
+        taken, tokens = result
+        RATE_LIMIT_REQUESTS.labels(name, "allowed" if taken else "limited").inc()
+        return Decision(taken, limit, tokens, cost)
+
+
+def create_limiter() -> RateLimiter:
+    """
+    Rate limiter with limits and backend from settings
+    """
+    client = None
+    if settings.rate_limit_backend == "redis":
+        client = aioredis.Redis(host=settings.redis_host, port=settings.redis_port, db=0,
+                                socket_connect_timeout=1, socket_timeout=1)
+    return RateLimiter(client, settings.rate_limits)
+
+
+_limiter: RateLimiter | None = None
+
+
+def get_limiter() -> RateLimiter:
+    """
+    Rate limiter of the process, created on first use
+    """
+    global _limiter
+    if _limiter is None:
+        _limiter = create_limiter()
+    return _limiter
+
+
+def client_identity(request: Request) -> str:
+    """
+    Bucket identity of a client without a user: its address
+    """
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def user_identity(user: User) -> str:
+    """
+    Bucket identity of a user
+    """
+    return f"user:{user.id}"
+
+
+async def check(request: Request, name: str, identity: str, cost: int = 1) -> None:
+    """
+    Take tokens of a request, headers are added to the response by RateLimitHeadersMiddleware
+
+    Args:
+        request (Request): current request
+        name (str): limit name
+        identity (str): whose bucket
+        cost (int, optional): tokens to take
+
+    Raises:
+        HTTPException: 429 Too many requests
+    """
+    decision = await get_limiter().hit(name, identity, cost)
+    if decision is None:
+        return
+    request.state.rate_limit_headers = decision.headers()
+    if not decision.allowed:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many requests",
+                            headers=request.state.rate_limit_headers)
+
+
+class RateLimit:
+    """
+    Dependency limiting requests of a route per client address
+    """
+    def __init__(self, name: str):
+        self.name = name
+
+    async def __call__(self, request: Request) -> None:
+        await check(request, self.name, client_identity(request))
+
+
+class UserRateLimit(RateLimit):
+    """
+    Dependency limiting requests of a route per current user
+    """
+    async def __call__(self, request: Request, user: User = Depends(auth_service.get_current_user)) -> None:
+        await check(request, self.name, user_identity(user))
+
+
+class RateLimitHeadersMiddleware:
+    """
+    ASGI middleware adding RateLimit-* headers of a limited route to its response, whatever response class it returns
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        state = scope.setdefault("state", {})
+
+        async def send_wrapper(message: Message) -> None:
+            headers = state.get("rate_limit_headers")
+            if message["type"] == "http.response.start" and headers:
+                present = {name.lower() for name, _ in message.get("headers", [])}
+                message["headers"] = list(message.get("headers", [])) + [
+                    (name.lower().encode(), value.encode()) for name, value in headers.items()
+                    if name.lower().encode() not in present]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,16 @@
+"""
+Sync Redis client of the process: user cache, token blacklist and trending leaderboard.
+Created on first use, importing the app doesn't need Redis settings or a running server.
+"""
+from functools import cache
+
+from app.src.conf.config import settings
+from app.src.services.metrics import InstrumentedRedis
+
+
+@cache
+def get_redis() -> InstrumentedRedis:
+    """
+    Redis client shared by the process, connections are opened by the first command
+    """
+    return InstrumentedRedis(host=settings.redis_host, port=settings.redis_port, db=0)
@@ -0,0 +1,23 @@
+"""
+Worker class of the production server, gunicorn forks these from the master process:
+
+    gunicorn main:app
+
+gunicorn.conf.py sets worker count, keep-alive, backlog and restarts after SERVER_MAX_REQUESTS.
+"""
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+from app.src.conf.config import settings
+
+
+class UvicornWorker(BaseUvicornWorker):
+    """
+    Uvicorn worker with event loop and HTTP parser from settings (uvloop and httptools by default).
+    Gunicorn passes keep-alive, backlog and max requests (with jitter) on its own
+    """
+    CONFIG_KWARGS = {
+        "loop": settings.server_loop,
+        "http": settings.server_http,
+        "lifespan": "on",
+        "server_header": False,
+    }
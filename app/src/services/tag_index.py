@@ -0,0 +1,105 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from heapq import nlargest
+from threading import Lock
+import time
+
+from sqlalchemy.orm import Session
+
+from app.src.repository import tags as repository_tags
+
+
+# usage rows are stamped by application servers, re-read a window to tolerate clock skew between them
+REFRESH_OVERLAP = timedelta(seconds=30)
+# suggestions kept per (prefix, limit), least recently used are dropped; the endpoint is public,
+# so random prefixes must not grow the cache without bound
+CACHE_SIZE = 1024
+
+
+class TagIndex:
+    """
+    In-memory prefix index of tag names ranked by usage count.
+    Names are kept sorted, so a prefix is a bisect range; changes are pulled from
+    tag_usage incrementally by updated_at. Suggestions are cached until usage changes.
+    """
+    def __init__(self, cache_size: int = CACHE_SIZE):
+        self._names: list[str] = []
+        self._counts: dict[str, int] = {}
+        self._tags: dict[int, tuple[str, int]] = {}
+        self._since: datetime | None = None
+        self._refreshed_at: float | None = None
+        self._cache_size = cache_size
+        self._cache: OrderedDict[tuple[str, int], list[tuple[str, int]]] = OrderedDict()
+        self._lock = Lock()
+
+    def apply(self, rows) -> None:
+        """
+        Apply tag usage rows, rows seen before are applied idempotently
+
+        Args:
+            rows (Iterable[tuple]): (tag_id, name, usage_count, updated_at) rows
+        """
+        with self._lock:
+            changed = False
+            for tag_id, name, count, updated_at in rows:
+                if self._since is None or updated_at > self._since:
+                    self._since = updated_at
+                previous = self._tags.get(tag_id)
+                if previous == (name, count):
+                    continue
+                changed = True
+                if previous:
+                    self._counts[previous[0]] -= previous[1]
+                if name not in self._counts:
+                    insort(self._names, name)
+                    self._counts[name] = 0
+                self._counts[name] += count
+                self._tags[tag_id] = (name, count)
+            if changed:
+                self._cache = OrderedDict()
+
+    async def refresh(self, db: Session) -> None:
+        """
+        Pull usage changes since the last refresh
+        """
+        since = self._since - REFRESH_OVERLAP if self._since else None
+        self.apply(await repository_tags.get_usage_changes(db, since))
+        self._refreshed_at = time.monotonic()
+
+    async def maybe_refresh(self, db: Session, max_age: float) -> None:
+        """
+        Refresh if the index is older than max_age seconds
+        """
+        if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= max_age:
+            await self.refresh(db)
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[tuple[str, int]]:
+        """
+        Most used tags starting with prefix
+
+        Args:
+            prefix (str): normalized name prefix
+            limit (int, optional): max number of suggestions. Defaults to 10.
+
+        Returns:
+            list[tuple[str, int]]: (name, usage count), most used first
+        """
+        key = (prefix, limit)
+        cache = self._cache
+        cached = cache.get(key)
+        if cached is not None:
+            cache.move_to_end(key)
+            return cached
+        names, counts = self._names, self._counts
+        start = bisect_left(names, prefix)
+        stop = bisect_left(names, prefix + "\U0010ffff", lo=start)
+        used = (names[i] for i in range(start, stop) if counts[names[i]] > 0)
+        result = [(name, counts[name]) for name in nlargest(limit, used, key=counts.__getitem__)]
+        cache[key] = result
+        if len(cache) > self._cache_size:
+            cache.popitem(last=False)
+        return result
+
+
+tag_index = TagIndex()
@@ -0,0 +1,116 @@
+"""
+Handlers of background jobs, registered on import.
+
+Routes enqueue jobs by the names below, worker.py runs them. Every handler is idempotent:
+a job may run again after a failure or a lost worker.
+"""
+import asyncio
+import io
+import urllib.request
+
+from pydantic import EmailStr
+
+from app.src.conf.config import settings
+from app.src.database.db import get_session_factory
+from app.src.database.models import Photo
+from app.src.services import cloudinary_services, thumbnails
+from app.src.services import email as email_service
+from app.src.services.auth import auth_service
+from app.src.services.jobs import enqueue, job
+
+CONFIRM_EMAIL = "email.confirm"
+PASSWORD_EMAIL = "email.password_reset"
+DELETE_FILES = "cloudinary.delete"
+RENDER_THUMBNAILS = "photo.thumbnails"
+
+DOWNLOAD_TIMEOUT = 30
+
+
+@job(CONFIRM_EMAIL)
+async def send_confirmation_email(email: EmailStr, username: str, host: str) -> None:
+    """
+    Send email confirmation link
+
+    Args:
+        email (EmailStr): Email address to send message.
+        username (str): Username of the recipient.
+        host (str): Base url of the app.
+    """
+    token = await auth_service.create_email_token({"sub": email})
+    await email_service.send_template(email, "Confirm your email ", "email_template.html",
+                                      {"host": host, "username": username, "token": token})
+
+
+@job(PASSWORD_EMAIL)
+async def send_password_reset_email(email: EmailStr, username: str, host: str, reset_id: str) -> None:
+    """
+    Send password reset link. The requested password stays hashed in Redis,
+    the job carries only the random id of the reset
+
+    Args:
+        email (EmailStr): Email address to send message.
+        username (str): Username of the recipient.
+        host (str): Base url of the app.
+        reset_id (str): Id of the requested reset, see Auth.store_password_reset.
+    """
+    token = await email_service.password_reset_token(email, reset_id)
+    await email_service.send_template(email, "Reset password", "email_password_reset_template.html",
+                                      {"host": host, "username": username, "token": token})
+
+
+@job(DELETE_FILES)
+async def delete_files(urls: list[str]) -> None:
+    """
+    Delete stored files from cloudinary, deleting a missing file is not an error
+
+    Args:
+        urls (list[str]): urls of the files
+    """
+    results = await cloudinary_services.delete_photos(urls, settings.upload_concurrency)
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(urls)} files were not deleted: {errors[0]!r}")
+
+
+def _download(url: str) -> bytes:
+    with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+        return response.read()
+
+
+@job(RENDER_THUMBNAILS, timeout=120)
+async def render_thumbnails(photo_id: int) -> None:
+    """
+    Render and upload thumbnails of a stored photo. Exact duplicates share the stored file,
+    so they share thumbnails too: they are rendered once and set on every photo of the file
+
+    Args:
+        photo_id (int): photo without thumbnails
+    """
+    session_factory = get_session_factory()
+    with session_factory() as db:
+        photo = db.get(Photo, photo_id)
+        if photo is None or photo.thumbnails:
+            return
+        photo_url = photo.photo_url
+        urls = next((same.thumbnails for same in db.query(Photo).filter(Photo.photo_url == photo_url)
+                     if same.thumbnails), None)
+
+    rendered = None
+    if urls is None:
+        data = await asyncio.to_thread(_download, photo_url)
+        [rendered] = await thumbnails.create_thumbnails([io.BytesIO(data)])
+        if rendered is None:
+            raise RuntimeError(f"Thumbnails of photo {photo_id} were not created")
+        urls = rendered
+
+    with session_factory() as db:
+        photos = db.query(Photo).filter(Photo.photo_url == photo_url).all()
+        current = next((same.thumbnails for same in photos if same.thumbnails), None)
+        if rendered and (not photos or current):
+            # photos were deleted or got thumbnails from another job meanwhile
+            await enqueue(DELETE_FILES, urls=list(rendered.values()))
+            urls = current
+        for same in photos:
+            if not same.thumbnails:
+                same.thumbnails = urls
+        db.commit()
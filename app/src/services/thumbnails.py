@@ -0,0 +1,119 @@
+"""
+Upload-time thumbnails in fixed sizes.
+
+Pillow work is CPU bound, so images are rendered in a process pool and the event loop
+only waits for the result. Renditions are WebP, fit into a square of every size
+(aspect ratio kept, never upscaled) and are uploaded through cloudinary_services,
+so grid views download a few KB instead of the original.
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import io
+import logging
+import multiprocessing
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.src.conf.config import settings
+from app.src.services import cloudinary_services
+
+
+logger = logging.getLogger(__name__)
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def render_thumbnails(data: bytes, sizes: list[int], quality: int) -> dict[int, bytes]:
+    """
+    Render WebP renditions, runs in a worker process
+
+    Args:
+        data (bytes): original image file
+        sizes (list[int]): max width and height of every rendition
+        quality (int): WebP quality
+
+    Returns:
+        dict[int, bytes]: WebP file for every size, empty when Pillow can't read the image
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # JPEG is decoded at the smallest scale that still covers the largest rendition
+            image.draft("RGB", (max(sizes), max(sizes)))
+            image = ImageOps.exif_transpose(image)
+            image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return {}
+    renditions = {}
+    # every size is scaled down from the previous, larger one
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, "WEBP", quality=quality, method=4)
+        renditions[size] = buffer.getvalue()
+    return renditions
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawned workers don't inherit locks held by threads of the server process
+        _executor = ProcessPoolExecutor(max_workers=settings.thumbnail_workers,
+                                        mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def shutdown() -> None:
+    """
+    Stop worker processes, called on application shutdown
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def _render(file) -> dict[int, bytes]:
+    file.seek(0)
+    data = file.read()
+    file.seek(0)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_pool(), render_thumbnails, data,
+                                          settings.thumbnail_sizes, settings.thumbnail_quality)
+    except Exception as err:
+        logger.warning("Thumbnail rendering failed: %s", err)
+        return {}
+
+
+async def create_thumbnails(files: list) -> list[dict[str, str] | None]:
+    """
+    Render thumbnails of uploaded files and upload them, at most UPLOAD_CONCURRENCY uploads at a time
+
+    Args:
+        files (list[file]): uploaded file objects, rewound afterwards
+
+    Returns:
+        list[dict[str, str] | None]: url of every size (as string keys) for every file,
+            None when the file is not a raster image or some rendition failed to upload
+    """
+    if not settings.thumbnail_sizes or not files:
+        return [None] * len(files)
+    renditions = await asyncio.gather(*(_render(file) for file in files))
+    flat = [(i, size, data) for i, sizes in enumerate(renditions) for size, data in sizes.items()]
+    results = await cloudinary_services.upload_photos([io.BytesIO(data) for _, _, data in flat],
+                                                      settings.upload_concurrency)
+
+    thumbnails = [{} if sizes else None for sizes in renditions]
+    failed = set()
+    for (i, size, _), result in zip(flat, results):
+        if isinstance(result, Exception) or "secure_url" not in result:
+            logger.warning("Thumbnail upload failed: %s", result)
+            failed.add(i)
+            continue
+        thumbnails[i][str(size)] = result["secure_url"]
+    # a photo gets all sizes or none, uploaded leftovers of failed ones are removed
+    for i in failed:
+        for url in thumbnails[i].values():
+            await cloudinary_services.delete_photo(url)
+        thumbnails[i] = None
+    return thumbnails
@@ -0,0 +1,273 @@
+"""
+Trending photos leaderboard kept in Redis.
+
+Every photo with at least one rate has a score in a sorted set:
+
+    score = ln(bayesian_average) + created_at / decay
+
+where the Bayesian average pulls photos with few votes towards the mean of all rates,
+so a single 5-star vote does not outrank many good ones, and newer photos win over older
+ones with the same average. Rate counts, sums and a JSON snapshot of the photo are kept
+next to the sorted set, so reading top N never touches the database.
+Scores of other photos are not recomputed when the global mean moves, they catch up on their next rate.
+
+Rates are added and removed as they happen. rebuild() recomputes the whole leaderboard from the
+rates table, it runs after bulk imports and from
+
+    python -m app.src.cli.rebuild_trending
+
+once after deploying the leaderboard and after Redis data was lost, so rates given before it
+existed or missed while Redis was unavailable are counted.
+"""
+from datetime import datetime
+from functools import cache
+from itertools import islice
+import json
+import logging
+import math
+
+from pydantic import ValidationError
+from redis.commands.core import Script
+from redis.exceptions import RedisError
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.src.conf.config import settings
+from app.src.database.models import Photo, Rate
+from app.src.schemas import TrendingPhotoResponse
+from app.src.services.redis_client import get_redis
+
+
+logger = logging.getLogger(__name__)
+
+SCORES_KEY = "trending:scores"
+VOTES_KEY = "trending:votes"
+PHOTOS_KEY = "trending:photos"
+# rebuild() fills these and renames them over the live keys at once
+REBUILD_SUFFIX = ":rebuild"
+REBUILD_CHUNK = 10_000
+
+# KEYS: scores, votes, photos
+# ARGV: photo id, rate count delta, rate sum delta, created timestamp, prior votes, decay seconds,
+#       photo JSON (empty keeps the stored one)
+UPDATE_SCRIPT = """
+local id = ARGV[1]
+local total_n = redis.call('HINCRBY', KEYS[2], 'all:n', ARGV[2])
+local total_sum = redis.call('HINCRBY', KEYS[2], 'all:sum', ARGV[3])
+local n = redis.call('HINCRBY', KEYS[2], id .. ':n', ARGV[2])
+local sum = redis.call('HINCRBY', KEYS[2], id .. ':sum', ARGV[3])
+if n <= 0 or sum <= 0 then
+    redis.call('HDEL', KEYS[2], id .. ':n', id .. ':sum')
+    redis.call('HDEL', KEYS[3], id)
+    redis.call('ZREM', KEYS[1], id)
+    return false
+end
+local prior = tonumber(ARGV[5])
+local mean = 0
+if total_n > 0 and total_sum > 0 then
+    mean = total_sum / total_n
+end
+local average = (prior * mean + sum) / (prior + n)
+local score = math.log(average) + tonumber(ARGV[4]) / tonumber(ARGV[6])
+redis.call('ZADD', KEYS[1], score, id)
+if ARGV[7] ~= '' then
+    redis.call('HSET', KEYS[3], id, ARGV[7])
+end
+return tostring(score)
+"""
+
+# KEYS: scores, votes, photos
+# ARGV: photo id
+REMOVE_SCRIPT = """
+local id = ARGV[1]
+local votes = redis.call('HMGET', KEYS[2], id .. ':n', id .. ':sum')
+if votes[1] then
+    redis.call('HINCRBY', KEYS[2], 'all:n', -tonumber(votes[1]))
+    redis.call('HINCRBY', KEYS[2], 'all:sum', -tonumber(votes[2]))
+    redis.call('HDEL', KEYS[2], id .. ':n', id .. ':sum')
+end
+redis.call('HDEL', KEYS[3], id)
+return redis.call('ZREM', KEYS[1], id)
+"""
+
+
+@cache
+def _script(client, source: str) -> Script:
+    return client.register_script(source)
+
+
+def _update(keys: list, args: list):
+    return _script(get_redis(), UPDATE_SCRIPT)(keys=keys, args=args)
+
+
+def _remove(keys: list, args: list):
+    return _script(get_redis(), REMOVE_SCRIPT)(keys=keys, args=args)
+
+
+def _snapshot(photo) -> str:
+    created_at = photo.created_at or datetime.now()
+    return json.dumps({
+        "id": photo.id,
+        "photo_url": photo.photo_url,
+        "owner_id": photo.owner_id,
+        "description": photo.description,
+        "created_at": created_at.isoformat(),
+    })
+
+
+def _update_score(photo, count: int, total: int, snapshot: str = "") -> None:
+    created_at = photo.created_at or datetime.now()
+    _update(keys=[SCORES_KEY, VOTES_KEY, PHOTOS_KEY],
+            args=[photo.id, count, total, created_at.timestamp(),
+                  settings.trending_prior_votes, settings.trending_decay_seconds, snapshot])
+
+
+def record_rate(photo, rate: int) -> None:
+    """
+    Add rate of the photo to the leaderboard
+
+    Args:
+        photo (Photo): rated photo
+        rate (int): rate from 1 to 5
+    """
+    _update_score(photo, 1, rate, _snapshot(photo))
+
+
+def remove_rate(photo, rate: int) -> None:
+    """
+    Remove deleted rate of the photo from the leaderboard
+
+    Args:
+        photo (Photo): photo the rate was given to
+        rate (int): deleted rate
+    """
+    _update_score(photo, -1, -rate)
+
+
+def remove_photo(photo_id: int) -> None:
+    """
+    Remove deleted photo and its rates from the leaderboard
+
+    Args:
+        photo_id (int): id of the deleted photo
+    """
+    _remove(keys=[SCORES_KEY, VOTES_KEY, PHOTOS_KEY], args=[photo_id])
+
+
+def safely(update, *args) -> None:
+    """
+    Run leaderboard update without failing the caller, database stays the source of truth
+
+    Args:
+        update (Callable): one of record_rate, remove_rate, remove_photo
+    """
+    try:
+        update(*args)
+    except RedisError as err:
+        logger.warning("Trending update %s failed: %s", update.__name__, err)
+
+
+def top(limit: int = 10) -> list[dict]:
+    """
+    Best scored photos, read from Redis only. Snapshots that don't make a valid
+    TrendingPhotoResponse are skipped, a broken entry doesn't fail the whole page
+
+    Args:
+        limit (int, optional): number of photos. Defaults to 10.
+
+    Returns:
+        list[dict]: photo snapshots with votes, rating (raw average) and score, best first
+    """
+    r = get_redis()
+    ranked = r.zrevrange(SCORES_KEY, 0, limit - 1, withscores=True)
+    if not ranked:
+        return []
+    ids = [photo_id.decode() for photo_id, _ in ranked]
+    pipe = r.pipeline(transaction=False)
+    pipe.hmget(PHOTOS_KEY, ids)
+    pipe.hmget(VOTES_KEY, [f"{photo_id}:{field}" for photo_id in ids for field in ("n", "sum")])
+    snapshots, votes = pipe.execute()
+
+    result = []
+    for i, (snapshot, (_, score)) in enumerate(zip(snapshots, ranked)):
+        if snapshot is None:
+            continue
+        count, total = int(votes[2 * i] or 0), int(votes[2 * i + 1] or 0)
+        item = json.loads(snapshot)
+        item.update(votes=count, rating=total / count if count else 0.0, score=score)
+        try:
+            TrendingPhotoResponse.model_validate(item)
+        except ValidationError as err:
+            logger.warning("Trending photo %s skipped, invalid snapshot: %s", ids[i], err)
+            continue
+        result.append(item)
+    return result
+
+
+def _score(count: int, total: int, all_count: int, all_total: int, created_at: datetime | None) -> float:
+    """
+    Score of a photo, same formula as UPDATE_SCRIPT
+    """
+    mean = all_total / all_count if all_count > 0 and all_total > 0 else 0
+    average = (settings.trending_prior_votes * mean + total) / (settings.trending_prior_votes + count)
+    return math.log(average) + (created_at or datetime.now()).timestamp() / settings.trending_decay_seconds
+
+
+def rebuild(db: Connection | Session) -> int:
+    """
+    Recompute scores, votes and snapshots of all rated photos from the rates table
+    and replace the leaderboard with them at once. The board is built in staging keys
+    that are renamed over the live ones; rates given while it was built are replayed
+    onto it afterwards, rates deleted meanwhile stay counted until the next rebuild
+
+    Args:
+        db (Connection | Session): database connection
+
+    Returns:
+        int: number of photos on the leaderboard
+    """
+    columns = (Photo.id, Photo.photo_url, Photo.owner_id, Photo.description, Photo.created_at)
+    last_rate_id = db.execute(select(func.coalesce(func.max(Rate.id), 0))).scalar()
+    rows = db.execute(
+        select(*columns, func.count(Rate.id).label("count"), func.sum(Rate.rate).label("total"))
+        .join(Rate, Rate.photo_id == Photo.id)
+        .where(Rate.id <= last_rate_id)
+        .group_by(Photo.id)
+    ).all()
+    rows = [row for row in rows if row.count > 0 and row.total > 0]
+    all_count = sum(row.count for row in rows)
+    all_total = sum(row.total for row in rows)
+
+    r = get_redis()
+    live = [SCORES_KEY, VOTES_KEY, PHOTOS_KEY]
+    scores, votes, photos = staged = [key + REBUILD_SUFFIX for key in live]
+    r.delete(*staged)
+    pipe = r.pipeline(transaction=False)
+    pipe.hset(votes, mapping={"all:n": all_count, "all:sum": all_total})
+    chunks = iter(rows)
+    while chunk := list(islice(chunks, REBUILD_CHUNK)):
+        pipe.zadd(scores, {row.id: _score(row.count, row.total, all_count, all_total, row.created_at)
+                           for row in chunk})
+        pipe.hset(votes, mapping={f"{row.id}:{field}": value for row in chunk
+                                  for field, value in (("n", row.count), ("sum", row.total))})
+        pipe.hset(photos, mapping={row.id: _snapshot(row) for row in chunk})
+        pipe.execute()
+    pipe.execute()
+
+    swap = r.pipeline()
+    swap.delete(*live)
+    swap.rename(votes, VOTES_KEY)
+    if rows:
+        swap.rename(scores, SCORES_KEY)
+        swap.rename(photos, PHOTOS_KEY)
+    swap.execute()
+
+    # the live keys got these rates before they were replaced
+    given_meanwhile = db.execute(
+        select(*columns, Rate.rate).join(Rate, Rate.photo_id == Photo.id)
+        .where(Rate.id > last_rate_id).order_by(Rate.id)
+    ).all()
+    for row in given_meanwhile:
+        record_rate(row, row.rate)
+    return len(rows)
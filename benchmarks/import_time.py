@@ -0,0 +1,106 @@
+"""
+Import time of the app entry points, each measured in a fresh interpreter.
+
+Cold start of web and job workers and test collection are mostly spent importing modules,
+this reports wall time of the import and the slowest modules from `python -X importtime`.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --module main --module worker --runs 10 --top 30
+    python -m benchmarks.import_time --output imports.json
+"""
+from statistics import median
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ("main", "worker")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import(module: str, importtime: bool = False) -> tuple[float, str]:
+    """
+    Import the module in a new interpreter from the repository root
+
+    Returns:
+        tuple[float, str]: wall time in seconds, stderr of the interpreter
+    """
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", f"import {module}"]
+    start = time.perf_counter()
+    completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if completed.returncode:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr}")
+    return elapsed, completed.stderr
+
+
+def parse_importtime(stderr: str) -> list[dict]:
+    """
+    Modules from `-X importtime` output
+
+    Args:
+        stderr (str): interpreter output
+
+    Returns:
+        list[dict]: name, self_ms and cumulative_ms of every imported module
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules.append({"name": name.strip(), "self_ms": int(self_us) / 1000,
+                        "cumulative_ms": int(cumulative_us) / 1000})
+    return modules
+
+
+def profile(module: str, runs: int, top: int) -> dict:
+    """
+    Median import wall time of the module and its slowest imports
+
+    Args:
+        module (str): module to import, e.g. "main"
+        runs (int): fresh interpreters to time
+        top (int): number of slowest modules to report
+
+    Returns:
+        dict: median, min and max wall time in ms, module count, slowest modules by self and cumulative time
+    """
+    # the first import may compile bytecode, it is not timed
+    _import(module)
+    timings = [_import(module)[0] for _ in range(runs)]
+    modules = parse_importtime(_import(module, importtime=True)[1])
+    app_modules = [item for item in modules if item["name"].startswith("app.")]
+    return {
+        "median_ms": round(median(timings) * 1000, 1),
+        "min_ms": round(min(timings) * 1000, 1),
+        "max_ms": round(max(timings) * 1000, 1),
+        "modules": len(modules),
+        "slowest_self": sorted(modules, key=lambda item: item["self_ms"], reverse=True)[:top],
+        "slowest_cumulative": sorted(modules, key=lambda item: item["cumulative_ms"], reverse=True)[:top],
+        "app_self_ms": round(sum(item["self_ms"] for item in app_modules), 1),
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="PhotoShare import time profile")
+    parser.add_argument("--module", action="append", help=f"module to import, default: {', '.join(DEFAULT_MODULES)}")
+    parser.add_argument("--runs", type=int, default=5, help="timed imports per module")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to report")
+    parser.add_argument("--output", default="", help="write JSON results to file instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = {module: profile(module, args.runs, args.top) for module in args.module or DEFAULT_MODULES}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
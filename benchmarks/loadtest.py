@@ -0,0 +1,367 @@
+"""
+End to end load test of the application with local stand-ins for Cloudinary, mail and Redis.
+
+Virtual users run weighted scenarios in a closed loop against the app in-process,
+Cloudinary and SMTP latency is injected by the stand-ins.
+
+Usage:
+    python -m benchmarks.loadtest --db-url sqlite:///./load.sqlite3 --users 50 --duration 30
+    python -m benchmarks.loadtest --cloudinary-latency 150 --cloudinary-jitter 50 --mail-latency 400 --mix search=5,qr=2,upload=1
+"""
+from collections import Counter
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable
+from unittest.mock import patch
+import argparse
+import asyncio
+import io
+import json
+import random
+import sys
+import time
+
+import httpx
+from PIL import Image
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app.src.database import db as app_db
+from app.src.database.db import get_db
+from app.src.database.models import User, Photo
+from app.src.services import jobs, rate_limit, tasks, trending
+from app.src.services.auth import auth_service
+from benchmarks.run import _is_seeded
+from benchmarks.standins import Latency, LocalCloudinary, LocalRedis, LocalSMTP
+from benchmarks.stats import summarize
+from tests import make_fake_db
+
+
+@dataclass
+class VirtualUser:
+    email: str
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class LoadContext:
+    client: httpx.AsyncClient
+    rng: random.Random
+    mail: LocalSMTP
+    photo_ids: list[int]
+    image: bytes
+    sequence: int = 0
+
+    def unique(self) -> int:
+        self.sequence += 1
+        return self.sequence
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable[[LoadContext, VirtualUser], Awaitable[httpx.Response]]
+    weight: int
+    expected: frozenset[int]
+
+
+SCENARIOS: dict[str, Scenario] = {}
+
+
+def scenario(name: str, weight: int = 1, expected: tuple[int, ...] = (200,)):
+    """
+    Register scenario, decorated coroutine performs one user action and returns its last response
+    """
+    def decorator(run):
+        SCENARIOS[name] = Scenario(name, run, weight, frozenset(expected))
+        return run
+    return decorator
+
+
+@scenario("signup", weight=1)
+async def signup(ctx: LoadContext, user: VirtualUser) -> httpx.Response:
+    username = f"load_{ctx.unique()}_{ctx.rng.randrange(10 ** 9)}"
+    email = f"{username}@example.com"
+    response = await ctx.client.post("/api/auth/signup",
+                                     json={"username": username, "email": email, "password": "load_password"})
+    if response.status_code != 201:
+        return response
+    # the eager job queue has already sent the confirmation email when the ASGI call returns
+    token = ctx.mail.token_for(email)
+    return await ctx.client.get(f"/api/auth/confirmed_email/{token}")
+
+
+@scenario("login", weight=2)
+async def login(ctx: LoadContext, user: VirtualUser) -> httpx.Response:
+    return await ctx.client.post("/api/auth/login",
+                                 data={"username": user.email, "password": make_fake_db.FAKE_PASSWORD})
+
+
+@scenario("upload", weight=2, expected=(201,))
+async def upload(ctx: LoadContext, user: VirtualUser) -> httpx.Response:
+    tags = " ".join(ctx.rng.sample(make_fake_db.WORDS, 3))
+    response = await ctx.client.post("/api/photos/upload", headers=user.headers,
+                                     files={"file": ("load.png", ctx.image, "image/png")},
+                                     data={"description": f"load test {ctx.unique()}", "tags": tags})
+    if response.status_code == 201:
+        ctx.photo_ids.append(response.json()["photo"]["id"])
+    return response
+
+
+@scenario("search", weight=6)
+async def search(ctx: LoadContext, user: VirtualUser) -> httpx.Response:
+    params = {"key_word": ctx.rng.choice(make_fake_db.WORDS)}
+    sort_by = ctx.rng.choice([None, "rating", "date"])
+    if sort_by:
+        params["sort_by"] = sort_by
+    return await ctx.client.get("/api/photos/find_photos", headers=user.headers, params=params)
+
+
+# own photos and repeated rates are rejected with 409, both are regular outcomes
+@scenario("rate", weight=4, expected=(200, 409))
+async def rate(ctx: LoadContext, user: VirtualUser) -> httpx.Response:
+    return await ctx.client.post(f"/api/photos/{ctx.rng.choice(ctx.photo_ids)}/rate", headers=user.headers,
+                                 params={"rate": ctx.rng.randint(1, 5)})
+
+
+@scenario("comment", weight=3, expected=(201,))
+async def comment(ctx: LoadContext, user: VirtualUser) -> httpx.Response:
+    text = " ".join(ctx.rng.choices(make_fake_db.WORDS, k=8))
+    return await ctx.client.post(f"/api/photos/{ctx.rng.choice(ctx.photo_ids)}/comment", headers=user.headers,
+                                 params={"comment_text": text})
+
+
+@scenario("qr", weight=2)
+async def qr(ctx: LoadContext, user: VirtualUser) -> httpx.Response:
+    return await ctx.client.get(f"/api/photos/{ctx.rng.choice(ctx.photo_ids)}", headers=user.headers,
+                                params={"response_type": "QR code"})
+
+
+class ScenarioResult:
+    """
+    Durations and status codes of one scenario
+    """
+    def __init__(self):
+        self.durations: list[float] = []
+        self.statuses: Counter = Counter()
+        self.errors = 0
+
+    def record(self, elapsed: float, status: int, expected: frozenset[int]) -> None:
+        self.durations.append(elapsed)
+        self.statuses[status] += 1
+        if status not in expected:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> dict:
+        result = summarize(self.durations, elapsed)
+        result["errors"] = self.errors
+        result["statuses"] = {str(code): count for code, count in sorted(self.statuses.items())}
+        return result
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    """
+    Parse scenario weights "search=5,rate=3", omitted scenarios are not run.
+    Empty string means default weights of all scenarios
+
+    Args:
+        mix (str): comma separated name=weight pairs
+
+    Returns:
+        dict[str, int]: weight by scenario name
+    """
+    if not mix:
+        return {name: sc.weight for name, sc in SCENARIOS.items()}
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}', choose from: {', '.join(SCENARIOS)}")
+        weights[name] = int(weight) if weight else SCENARIOS[name].weight
+    return weights
+
+
+def _sample_image() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 120, 40)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class RequestJobQueue(jobs.JobQueue):
+    """
+    Runs email jobs inside the request, the signup scenario reads the email right after it.
+    Other jobs (thumbnails, file deletion) run in worker processes in production and are only queued,
+    rendering thumbnails in the request would measure the thumbnail process pool instead of the app
+    """
+    eager_jobs = (tasks.CONFIRM_EMAIL, tasks.PASSWORD_EMAIL)
+
+    def __init__(self):
+        super().__init__(jobs.MemoryBackend())
+        self._eager = jobs.JobQueue(self.backend, eager=True)
+
+    async def enqueue(self, name: str, **kwargs) -> jobs.Job:
+        if name in self.eager_jobs:
+            return await self._eager.enqueue(name, **kwargs)
+        return await super().enqueue(name, **kwargs)
+
+
+@asynccontextmanager
+async def standins(cloudinary_latency: Latency, mail_latency: Latency,
+                   session_factory: sessionmaker) -> AsyncIterator[tuple[LocalCloudinary, LocalSMTP]]:
+    """
+    Replace Cloudinary, mail and Redis clients used by the app with local stand-ins,
+    mail goes through the app mailer to a local SMTP server
+    """
+    redis = LocalRedis()
+    async with AsyncExitStack() as stack:
+        stack.enter_context(patch.object(auth_service, "r", redis))
+        stack.enter_context(patch.object(trending, "get_redis", lambda: redis))
+        # all virtual users share one client address, rate limits would measure the limiter only
+        stack.enter_context(patch.object(rate_limit, "_limiter", rate_limit.RateLimiter(None, {})))
+        stack.enter_context(patch.object(jobs, "_queue", RequestJobQueue()))
+        cloudinary = stack.enter_context(LocalCloudinary(cloudinary_latency).installed())
+        mail = await stack.enter_async_context(LocalSMTP(mail_latency))
+        await stack.enter_async_context(mail.installed())
+        # jobs open their own sessions, outside of request dependencies
+        stack.enter_context(patch.object(app_db, "SessionLocal", session_factory))
+        yield cloudinary, mail
+
+
+async def _virtual_user(ctx: LoadContext, user: VirtualUser, weights: dict[str, int], deadline: float,
+                        think_time: float, results: dict[str, ScenarioResult]) -> None:
+    names, cum_weights = list(weights), []
+    total = 0
+    for weight in weights.values():
+        total += weight
+        cum_weights.append(total)
+    while time.perf_counter() < deadline:
+        sc = SCENARIOS[ctx.rng.choices(names, cum_weights=cum_weights)[0]]
+        start = time.perf_counter()
+        try:
+            status = (await sc.run(ctx, user)).status_code
+        except httpx.HTTPError:
+            status = 0
+        results[sc.name].record(time.perf_counter() - start, status, sc.expected)
+        if think_time:
+            await asyncio.sleep(ctx.rng.expovariate(1 / think_time))
+
+
+async def run_load(app, session_factory, num_users: int, duration: float, weights: dict[str, int],
+                   cloudinary_latency: Latency, mail_latency: Latency, think_time: float = 0.0,
+                   seed: int = 42) -> dict:
+    """
+    Drive the app with num_users concurrent virtual users for duration seconds
+
+    Args:
+        app (FastAPI): application under test
+        session_factory (sessionmaker): sessions of an already seeded database
+        num_users (int): concurrent virtual users, each logged in as a seeded user
+        duration (float): seconds to run
+        weights (dict[str, int]): scenario weights
+        cloudinary_latency (Latency): injected Cloudinary latency
+        mail_latency (Latency): injected mail latency
+        think_time (float, optional): mean pause between actions of a virtual user in seconds
+        seed (int, optional): seed of the random choices
+
+    Returns:
+        dict: per scenario latency percentiles, throughput and status codes
+    """
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    with session_factory() as db:
+        emails = db.scalars(select(User.email).where(User.role == "user").order_by(User.id).limit(num_users)).all()
+        photo_ids = list(db.scalars(select(Photo.id).order_by(Photo.id.desc()).limit(10_000)))
+    if not emails or not photo_ids:
+        raise ValueError("Database has no users or photos, seed it first")
+
+    rng = random.Random(seed)
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        async with standins(cloudinary_latency, mail_latency, session_factory) as (_, mail):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+                ctx = LoadContext(client=client, rng=rng, mail=mail, photo_ids=photo_ids, image=_sample_image())
+                users = [VirtualUser(emails[i % len(emails)]) for i in range(num_users)]
+                for user in users:
+                    response = await login(ctx, user)
+                    response.raise_for_status()
+                    user.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+                results = {name: ScenarioResult() for name in weights}
+                start = time.perf_counter()
+                await asyncio.gather(*(_virtual_user(ctx, user, weights, start + duration, think_time, results)
+                                       for user in users))
+                elapsed = time.perf_counter() - start
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+    report = {name: result.summary(elapsed) for name, result in results.items()}
+    report["total"] = {
+        "count": sum(r["count"] for r in report.values()),
+        "errors": sum(r["errors"] for r in report.values()),
+        "elapsed_sec": round(elapsed, 3),
+    }
+    report["total"]["ops_per_sec"] = round(report["total"]["count"] / elapsed, 2) if elapsed else 0.0
+    return report
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="PhotoShare load test with local stand-ins")
+    parser.add_argument("--db-url", default="sqlite:///./load.sqlite3")
+    parser.add_argument("--seed-users", type=int, default=1_000, help="users to seed into an empty database")
+    parser.add_argument("--seed-photos", type=int, default=20_000, help="photos to seed into an empty database")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between actions, ms")
+    parser.add_argument("--mix", default="", help=f"name=weight pairs of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--cloudinary-latency", type=float, default=100.0, help="ms")
+    parser.add_argument("--cloudinary-jitter", type=float, default=30.0, help="ms")
+    parser.add_argument("--mail-latency", type=float, default=200.0, help="ms")
+    parser.add_argument("--mail-jitter", type=float, default=50.0, help="ms")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="", help="write JSON results to file instead of stdout")
+    args = parser.parse_args(argv)
+
+    # imported here so the stand-ins are the only difference from a production process
+    from main import app
+
+    connect_args = {"check_same_thread": False} if args.db_url.startswith("sqlite") else {}
+    engine = create_engine(args.db_url, connect_args=connect_args)
+    if not _is_seeded(engine):
+        print(f"seeding {args.seed_users} users, {args.seed_photos} photos ...", file=sys.stderr)
+        make_fake_db.generate(engine, args.seed_users, args.seed_photos, num_comments=args.seed_photos,
+                              num_rates=args.seed_photos * 3, seed=args.seed)
+
+    rng = random.Random(args.seed)
+    report = asyncio.run(run_load(
+        app, sessionmaker(bind=engine, autoflush=False), args.users, args.duration, parse_mix(args.mix),
+        Latency(args.cloudinary_latency, args.cloudinary_jitter, rng),
+        Latency(args.mail_latency, args.mail_jitter, rng),
+        think_time=args.think_time / 1000, seed=args.seed,
+    ))
+
+    for name, result in report.items():
+        if name == "total":
+            continue
+        print(f"{name:10} n={result['count']:>6} err={result['errors']:>4} p50={result['p50_ms']:>9}ms "
+              f"p95={result['p95_ms']:>9}ms p99={result['p99_ms']:>9}ms ops/s={result['ops_per_sec']:>8}",
+              file=sys.stderr)
+    print(f"{'total':10} n={report['total']['count']:>6} err={report['total']['errors']:>4} "
+          f"ops/s={report['total']['ops_per_sec']}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
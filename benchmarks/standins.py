@@ -0,0 +1,364 @@
+from contextlib import asynccontextmanager, contextmanager
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from typing import AsyncIterator, Iterator
+from unittest.mock import patch
+import asyncio
+import math
+import random
+import re
+import time
+import uuid
+
+from redis.exceptions import ResponseError
+
+from app.src.services.email import Mailer, SMTPPool
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the sync redis client used by the app: strings with expiry
+    (auth cache), hashes, sorted sets, pipelines and the trending leaderboard scripts
+    """
+    def __init__(self):
+        self._data: dict[str, tuple[bytes, float | None]] = {}
+        self._hashes: dict[str, dict[bytes, bytes]] = {}
+        self._zsets: dict[str, dict[bytes, float]] = {}
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    def _alive(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key):
+        return self._alive(str(key))
+
+    def set(self, key, value, ex: int | None = None):
+        self._data[str(key)] = (self._bytes(value), time.monotonic() + ex if ex else None)
+        return True
+
+    def expire(self, key, seconds: int):
+        value = self._alive(str(key))
+        if value is None:
+            return False
+        self._data[str(key)] = (value, time.monotonic() + seconds)
+        return True
+
+    def delete(self, *keys):
+        return sum(any(store.pop(str(key), None) is not None for store in (self._data, self._hashes, self._zsets))
+                   for key in keys)
+
+    def rename(self, src, dst):
+        src, dst = str(src), str(dst)
+        stores = [store for store in (self._data, self._hashes, self._zsets) if src in store]
+        if not stores:
+            raise KeyError(f"no such key: {src}")
+        self.delete(dst)
+        stores[0][dst] = stores[0].pop(src)
+        return True
+
+    def flushdb(self):
+        for store in (self._data, self._hashes, self._zsets):
+            store.clear()
+
+    def hset(self, key, field=None, value=None, mapping: dict | None = None):
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        stored = self._hashes.setdefault(str(key), {})
+        added = sum(self._bytes(name) not in stored for name in items)
+        stored.update({self._bytes(name): self._bytes(item) for name, item in items.items()})
+        return added
+
+    def hincrby(self, key, field, amount: int = 1):
+        try:
+            amount = int(amount)
+        except ValueError:
+            raise ResponseError("value is not an integer or out of range")
+        stored = self._hashes.setdefault(str(key), {})
+        value = int(stored.get(self._bytes(field), 0)) + amount
+        stored[self._bytes(field)] = self._bytes(value)
+        return value
+
+    def hmget(self, key, keys, *args):
+        stored = self._hashes.get(str(key), {})
+        fields = [keys] if isinstance(keys, (str, bytes, int)) else list(keys)
+        return [stored.get(self._bytes(field)) for field in [*fields, *args]]
+
+    def hgetall(self, key):
+        return dict(self._hashes.get(str(key), {}))
+
+    def hdel(self, key, *fields):
+        stored = self._hashes.get(str(key), {})
+        removed = sum(stored.pop(self._bytes(field), None) is not None for field in fields)
+        if not stored:
+            self._hashes.pop(str(key), None)
+        return removed
+
+    def zadd(self, key, mapping: dict):
+        stored = self._zsets.setdefault(str(key), {})
+        added = sum(self._bytes(member) not in stored for member in mapping)
+        stored.update({self._bytes(member): float(score) for member, score in mapping.items()})
+        return added
+
+    def zrem(self, key, *members):
+        stored = self._zsets.get(str(key), {})
+        removed = sum(stored.pop(self._bytes(member), None) is not None for member in members)
+        if not stored:
+            self._zsets.pop(str(key), None)
+        return removed
+
+    def zscore(self, key, member):
+        return self._zsets.get(str(key), {}).get(self._bytes(member))
+
+    def zcard(self, key):
+        return len(self._zsets.get(str(key), {}))
+
+    def zrevrange(self, key, start: int, end: int, withscores: bool = False):
+        ranked = sorted(self._zsets.get(str(key), {}).items(), key=lambda item: (item[1], item[0]), reverse=True)
+        ranked = ranked[start:] if end == -1 else ranked[start:end + 1]
+        return ranked if withscores else [member for member, _ in ranked]
+
+    def pipeline(self, transaction: bool = True) -> "_LocalPipeline":
+        # commands run one after another anyway, so every pipeline is atomic
+        return _LocalPipeline(self)
+
+    def register_script(self, source: str):
+        """
+        Python version of a Lua script of the app, called like redis Script objects
+        """
+        from app.src.services import trending
+        scripts = {trending.UPDATE_SCRIPT: self._trending_update, trending.REMOVE_SCRIPT: self._trending_remove}
+        script = scripts[source]
+        return lambda keys=(), args=(): script(list(keys), [str(arg) for arg in args])
+
+    def _trending_update(self, keys: list, args: list):
+        scores, votes, photos = keys
+        photo_id, count, total, created, prior, decay, snapshot = args
+        total_n = self.hincrby(votes, "all:n", count)
+        total_sum = self.hincrby(votes, "all:sum", total)
+        n = self.hincrby(votes, f"{photo_id}:n", count)
+        rate_sum = self.hincrby(votes, f"{photo_id}:sum", total)
+        if n <= 0 or rate_sum <= 0:
+            self.hdel(votes, f"{photo_id}:n", f"{photo_id}:sum")
+            self.hdel(photos, photo_id)
+            self.zrem(scores, photo_id)
+            return None
+        mean = total_sum / total_n if total_n > 0 and total_sum > 0 else 0
+        average = (float(prior) * mean + rate_sum) / (float(prior) + n)
+        score = math.log(average) + float(created) / float(decay)
+        self.zadd(scores, {photo_id: score})
+        if snapshot:
+            self.hset(photos, photo_id, snapshot)
+        return self._bytes(score)
+
+    def _trending_remove(self, keys: list, args: list):
+        scores, votes, photos = keys
+        photo_id = args[0]
+        count, total = self.hmget(votes, [f"{photo_id}:n", f"{photo_id}:sum"])
+        if count is not None:
+            self.hincrby(votes, "all:n", -int(count))
+            self.hincrby(votes, "all:sum", -int(total))
+            self.hdel(votes, f"{photo_id}:n", f"{photo_id}:sum")
+        self.hdel(photos, photo_id)
+        return self.zrem(scores, photo_id)
+
+
+class _LocalPipeline:
+    """
+    Commands of a LocalRedis queued until execute()
+    """
+    def __init__(self, redis: LocalRedis):
+        self._redis = redis
+        self._commands: list = []
+
+    def __getattr__(self, name: str):
+        method = getattr(self._redis, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> list:
+        commands, self._commands = self._commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+
+class Latency:
+    """
+    Injected latency: fixed delay plus uniform jitter, in milliseconds
+    """
+    def __init__(self, delay_ms: float = 0.0, jitter_ms: float = 0.0, rng: random.Random | None = None):
+        self.delay_ms = delay_ms
+        self.jitter_ms = jitter_ms
+        self.rng = rng or random.Random(0)
+
+    def seconds(self) -> float:
+        return max(0.0, self.delay_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def sleep(self) -> None:
+        delay = self.seconds()
+        if delay:
+            time.sleep(delay)
+
+    async def asleep(self) -> None:
+        delay = self.seconds()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class LocalCloudinary:
+    """
+    Stand-in for cloudinary.uploader upload/destroy and for downloads of stored files,
+    blocking like the real SDK calls
+    """
+    def __init__(self, latency: Latency | None = None):
+        self.latency = latency or Latency()
+        self.uploads = 0
+        self.destroyed = 0
+        self.files: dict[str, bytes] = {}
+
+    def upload(self, file, **options):
+        self.latency.sleep()
+        self.uploads += 1
+        public_id = options.get("public_id") or uuid.uuid4().hex
+        self.files[public_id] = file.read() if hasattr(file, "read") else b""
+        return {"public_id": public_id, "version": 1,
+                "secure_url": f"https://res.cloudinary.com/local/image/upload/v1/{public_id}.jpg"}
+
+    def destroy(self, public_id, **options):
+        self.latency.sleep()
+        self.destroyed += 1
+        self.files.pop(public_id, None)
+        return {"result": "ok"}
+
+    def download(self, url: str) -> bytes:
+        self.latency.sleep()
+        return self.files[url.split("/")[-1].split(".")[0]]
+
+    @contextmanager
+    def installed(self) -> Iterator["LocalCloudinary"]:
+        with patch("cloudinary.uploader.upload", self.upload), patch("cloudinary.uploader.destroy", self.destroy), \
+             patch("app.src.services.tasks._download", self.download):
+            yield self
+
+
+class LocalSMTP:
+    """
+    In-process SMTP server accepting every message, without TLS and with any credentials.
+    Keeps received messages in memory, recipients in reject are refused
+
+        async with LocalSMTP() as smtp, smtp.installed():
+            ...
+    """
+    def __init__(self, latency: Latency | None = None, reject: set[str] | None = None):
+        self.latency = latency or Latency()
+        self.reject = reject or set()
+        self.outbox: list[EmailMessage] = []
+        self.sender = "PhotoShare <photoshare@localhost>"
+        self.connections = 0
+        self.host = "127.0.0.1"
+        self.port = 0
+        self._server: asyncio.Server | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    async def __aenter__(self) -> "LocalSMTP":
+        self._server = await asyncio.start_server(self._handle, self.host, 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.drop_connections()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop_connections(self) -> None:
+        """
+        Close open connections from the server side, like an idle timeout of a real server
+        """
+        for writer in self._writers:
+            writer.close()
+
+    def mailer(self, pool_size: int = 4, batch_size: int = 50, idle_timeout: float = 60.0) -> Mailer:
+        """
+        Mailer of the app sending to this server
+        """
+        pool = SMTPPool(pool_size, idle_timeout, hostname=self.host, port=self.port,
+                        use_tls=False, start_tls=False, username="local", password="local")
+        return Mailer(pool, batch_size, self.sender)
+
+    @asynccontextmanager
+    async def installed(self) -> AsyncIterator["LocalSMTP"]:
+        mailer = self.mailer()
+        with patch("app.src.services.email._mailer", mailer):
+            try:
+                yield self
+            finally:
+                await mailer.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._writers.add(writer)
+        reply = writer.write
+        recipients: list[str] = []
+        try:
+            reply(b"220 localhost ESMTP\r\n")
+            while line := await reader.readline():
+                command = line[:4].upper()
+                if command == b"EHLO":
+                    reply(b"250-localhost\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+                elif command == b"AUTH":
+                    reply(b"235 Authentication successful\r\n")
+                elif command == b"MAIL":
+                    recipients = []
+                    reply(b"250 OK\r\n")
+                elif command == b"RCPT":
+                    address = line.decode().split(":", 1)[1].strip().strip("<>")
+                    if address in self.reject:
+                        reply(b"550 Mailbox unavailable\r\n")
+                    else:
+                        recipients.append(address)
+                        reply(b"250 OK\r\n")
+                elif command == b"DATA":
+                    reply(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    data = await reader.readuntil(b"\r\n.\r\n")
+                    data = data[:-3].replace(b"\r\n..", b"\r\n.")
+                    await self.latency.asleep()
+                    self.outbox.append(BytesParser(policy=policy.default).parsebytes(data))
+                    reply(b"250 OK\r\n")
+                elif command == b"QUIT":
+                    reply(b"221 Bye\r\n")
+                    break
+                elif command in (b"HELO", b"RSET", b"NOOP"):
+                    reply(b"250 OK\r\n")
+                else:
+                    reply(b"502 Command not implemented\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def token_for(self, email: str) -> str | None:
+        """
+        Token of the link in the latest message sent to the email
+        """
+        for message in reversed(self.outbox):
+            if message["To"] == email:
+                match = re.search(r'href="[^"]*/([^/"]+)"', message.get_content())
+                return match and match.group(1)
+        return None
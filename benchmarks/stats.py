@@ -0,0 +1,44 @@
+from statistics import mean
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """
+    Percentile of already sorted values with linear interpolation
+
+    Args:
+        sorted_values (list[float]): sorted samples
+        fraction (float): percentile as a fraction, e.g. 0.95
+
+    Returns:
+        float: percentile value, 0.0 for empty input
+    """
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(durations: list[float], elapsed: float | None = None) -> dict:
+    """
+    Latency summary in milliseconds and throughput
+
+    Args:
+        durations (list[float]): per operation durations in seconds
+        elapsed (float, optional): wall time of the run, defaults to sum of durations
+
+    Returns:
+        dict: count, p50/p95/p99/mean/max in ms and ops per second
+    """
+    values = sorted(durations)
+    elapsed = sum(values) if elapsed is None else elapsed
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "mean_ms": round(mean(values) * 1000, 3) if values else 0.0,
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        "ops_per_sec": round(len(values) / elapsed, 2) if elapsed else 0.0,
+    }
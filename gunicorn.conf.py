@@ -0,0 +1,33 @@
+"""
+Gunicorn settings of the production server, read from the working directory by
+
+    gunicorn main:app
+
+Values come from SERVER_* settings, see .env.example.
+The app is imported once in the master and workers are forked from it (preload_app),
+so they share the memory of loaded code and start faster.
+"""
+import multiprocessing
+import os
+
+from app.src.conf.config import settings
+
+bind = settings.server_bind
+workers = settings.server_workers or multiprocessing.cpu_count()
+worker_class = "app.src.services.server.UvicornWorker"
+backlog = settings.server_backlog
+keepalive = settings.server_keepalive
+max_requests = settings.server_max_requests
+max_requests_jitter = settings.server_max_requests_jitter
+timeout = settings.server_timeout
+graceful_timeout = settings.server_graceful_timeout
+preload_app = True
+# worker heartbeat files on tmpfs, a slow disk can't make the master kill a healthy worker
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def post_fork(server, worker):
+    # connections opened by the master while loading the app must not be shared between workers,
+    # Redis clients reconnect after fork on their own
+    from app.src.database.db import engine
+    engine.dispose(close=False)
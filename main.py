@@ -1,24 +1,26 @@
-import uvicorn
-import redis.asyncio as redis
-
 from fastapi import FastAPI
-from fastapi_limiter import FastAPILimiter
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from app.src.routes import auth, users, photos
-from app.src.conf.config import settings
+from app.src.routes import auth, users, photos, tags, metrics
+from app.src.services.logging import RequestLoggingMiddleware, start_logging, stop_logging
+from app.src.services.metrics import MetricsMiddleware
+from app.src.services.rate_limit import RateLimitHeadersMiddleware
+from app.src.services import thumbnails
+from app.src.database.profiling import QueryStatsMiddleware
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     '''
-    Rate limit for FastAPI. New scheme instead of deprecated "on_event" 
+    Startup and shutdown of logging pipeline and thumbnail workers.
+    New scheme instead of deprecated "on_event" 
     Args:
         app (FastAPI): FastAPI application name
     '''
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(r)
+    start_logging()
     yield
+    thumbnails.shutdown()
+    stop_logging()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -26,6 +28,8 @@ app = FastAPI(lifespan=lifespan)
 app.include_router(auth.router, prefix="/api")
 app.include_router(users.router, prefix='/api')
 app.include_router(photos.router, prefix="/api")
+app.include_router(tags.router, prefix="/api")
+app.include_router(metrics.router)
 
 cors_origins = [ 
     "*"
@@ -39,6 +43,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(RateLimitHeadersMiddleware)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestLoggingMiddleware)
+
 @app.get("/")
 def read_root() -> dict:
     '''
@@ -48,4 +57,6 @@ def read_root() -> dict:
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
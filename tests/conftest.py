@@ -3,17 +3,21 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import MagicMock
 
 from main import app
-from app.src.database.db import get_db
+from app.src.database.db import get_db, get_session_factory
+from app.src.database import profiling
+from app.src.conf.config import settings
 from app.src.database.models import Base, User, Photo
 # from src.models.schemas import UserModel
 from app.src.services.auth import auth_service
+from app.src.services import jobs, rate_limit, trending
 from random import randint
 
 # from tests.make_fake_db import make_fake_users, make_fake_photos
 import tests.make_fake_db as fake_db
+from benchmarks.standins import LocalRedis
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./tests/db.sqlite3"
@@ -24,6 +28,16 @@ engine = create_engine(SQLALCHEMY_DATABASE_URL,
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# count queries per request and fail on N+1 patterns (see pytest_configure)
+profiling.install(engine)
+settings.debug = True
+
+def pytest_configure(config):
+    # registered here rather than in pyproject.toml: pytest resolves the warning class while
+    # parsing its config, which would import the app before settings are available
+    config.addinivalue_line("filterwarnings", "error::app.src.database.profiling.NPlusOneWarning")
+
+
 FAKE_PARAMS = {
     "user": 5,
     "admin": 5,
@@ -34,10 +48,27 @@ FAKE_PARAMS = {
 
 
 @pytest.fixture(scope="function", autouse=True)
-def patch_fastapi_limiter(monkeypatch):
-    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.redis", AsyncMock())
-    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.identifier", AsyncMock())
-    monkeypatch.setattr("fastapi_limiter.FastAPILimiter.http_callback", AsyncMock()) 
+def rate_limiter(monkeypatch) -> rate_limit.RateLimiter:
+    # fresh in-memory buckets for every test
+    limiter = rate_limit.RateLimiter(None, settings.rate_limits)
+    monkeypatch.setattr(rate_limit, "_limiter", limiter)
+    return limiter
+
+
+@pytest.fixture(scope="function", autouse=True)
+def job_queue(monkeypatch) -> jobs.JobQueue:
+    # jobs stay in memory, tests check what was enqueued instead of sending emails or deleting files
+    queue = jobs.JobQueue(jobs.MemoryBackend())
+    monkeypatch.setattr(jobs, "_queue", queue)
+    return queue
+
+
+@pytest.fixture(scope="function", autouse=True)
+def trending_redis(monkeypatch) -> LocalRedis:
+    # leaderboard in memory, rates given by tests never reach the configured Redis
+    redis = LocalRedis()
+    monkeypatch.setattr(trending, "get_redis", lambda: redis)
+    return redis
 
 
 @pytest.fixture(scope="module")
@@ -64,6 +95,7 @@ def client(session) -> TestClient:
             session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
 
     with TestClient(app) as client:
         yield client
@@ -102,7 +134,7 @@ def token(client, session):
         random_user = _get_random_user(session)
     response = client.post(
         "/api/auth/login",
-        data={"username": random_user.email, "password": f"{random_user.username}_{random_user.email}"},
+        data={"username": random_user.email, "password": fake_db.FAKE_PASSWORD},
     )
     token = response.json()
     return token
@@ -114,7 +146,7 @@ def admin_token(client, session):
         random_user = _get_random_user(session, role = "admin")
     response = client.post(
         "/api/auth/login",
-        data={"username": random_user.email, "password": f"{random_user.username}_{random_user.email}"},
+        data={"username": random_user.email, "password": fake_db.FAKE_PASSWORD},
     )
     token = response.json()
     return token
@@ -126,7 +158,7 @@ def moder_token(client, session):
         random_user = _get_random_user(session, role = "moder")
     response = client.post(
         "/api/auth/login",
-        data={"username": random_user.email, "password": f"{random_user.username}_{random_user.email}"},
+        data={"username": random_user.email, "password": fake_db.FAKE_PASSWORD},
     )
     token = response.json()
     return token
@@ -1,87 +1,264 @@
-from faker import Faker
+"""
+Deterministic fake data generator.
+
+Used by tests (make_fake_users, make_fake_photos) and as a CLI for large datasets:
+    python -m tests.make_fake_db --db-url sqlite:///./fake.sqlite3 --users 10000 --photos 1000000 --rates 5000000
+"""
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import accumulate
+import argparse
+import random
+import sys
+import time
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from faker import Faker
 from passlib.context import CryptContext
-from random import randint
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.engine import Connection, Engine
 
-from app.src.database.models import Base, User, Photo
-# from tests.conftest import FAKE_PARAMS
+from app.src.database.bulk import bulk_insert, reset_sequences
+from app.src.database.models import Base, User, Photo, Tag, Comment, Rate, association_table
+from app.src.repository.tags import rebuild_usage
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./tests/db.sqlite3"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL,
-                       connect_args={"check_same_thread": False},) 
-                       # echo=True)      # debug
-
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-db = TestingSessionLocal()
-
-fake = Faker()
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-class TestUser():
-    def __init__(self, num = 0, role = "user"):
-        self.username = f"{role}_{num}"
-        self.email    = fake.email()
-        self.password = f"{self.username}_{self.email}"
-        self.role     = role 
-
-    def __call__(self) -> dict:
-        return {
-            "username": self.username,
-            "email": self.email,
-            "password": self.password,
-            "role": self.role
-            }
-
-class TestPhoto():
-    def __init__(self, total_users = 0):
-        self.photo_url   = fake.uri(deep=7)
-        self.description = fake.sentence()
-        self.owner_id    = randint(1, total_users)
-    
-    def __call__(self) -> dict:
-        return {
-            "photo_url": self.photo_url,
-            "description": self.description,
-            "owner_id": self.owner_id
-            }
-
-
-def make_fake_users(num_users = 1, num_moders = 1, num_admins = 1) -> None:
-    users = []
-    # fake admins
-    for i in range(num_admins):
-        users.append(TestUser(i, "admin"))
-    # fake users
-    for i in range(num_users):
-        users.append(TestUser(i))
-    # fake moderators
-    for i in range(num_moders):
-        users.append(TestUser(i, "moder")) 
-
-    # ugly 1 by 1 commit
-    for user in users:
-        new_user_record = User(**user())
-        new_user_record.avatar = ""
-        new_user_record.confirmed = True
-        new_user_record.password = pwd_context.hash(user.password)
-        db.add(new_user_record)
-        db.commit()
-
-def make_fake_photos(num_photos, num_users) -> None:
-    # fake pictures
-    for _ in range(num_photos):
-        photo = TestPhoto(num_users)
-        new_poto_record = Photo(**photo())
-        db.add(new_poto_record)
-        db.commit()
-
-# disabled due to circular import issue
-# if __name__ == "__main__":
-#     make_fake_users(FAKE_PARAMS["users"], FAKE_PARAMS["moders"], FAKE_PARAMS["admins"])
-#     make_fake_photos(FAKE_PARAMS["photos"], FAKE_PARAMS["total users"]) 
+# every fake user has this password, its bcrypt hash is computed once per process
+FAKE_PASSWORD = "fake_password"
+
+WORDS = ("sunset", "beach", "mountain", "city", "night", "portrait", "forest", "river", "snow", "street",
+         "macro", "flower", "dog", "cat", "bird", "car", "bridge", "sky", "lake", "desert",
+         "winter", "summer", "autumn", "spring", "family", "travel", "food", "sport", "music", "art")
+DOMAINS = ("example.com", "example.org", "example.net", "mail.example.com")
+RATE_WEIGHTS = (5, 8, 17, 35, 35)   # 1..5 stars, skewed to good rates
+CHUNK = 10_000
+
+
+@lru_cache
+def _default_engine() -> Engine:
+    return create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+
+
+@lru_cache
+def fake_password_hash() -> str:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto").hash(FAKE_PASSWORD)
+
+
+def _zipf_cum_weights(size: int, exponent: float = 1.1) -> list[float]:
+    """
+    Cumulative weights for rng.choices, item i is picked with probability ~ 1 / (i + 1) ** exponent
+    """
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, size + 1)))
+
+
+def _tag_names(count: int) -> list[str]:
+    names = list(WORDS)
+    for first in WORDS:
+        for second in WORDS:
+            if first != second:
+                names.append(f"{first}_{second}")
+    suffix = 2
+    while len(names) < count:
+        names.extend(f"{word}{suffix}" for word in WORDS)
+        suffix += 1
+    return names[:count]
+
+
+def _next_id(conn: Connection, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def generate_users(conn: Connection, rng: random.Random, num_users: int = 0, num_moders: int = 0,
+                   num_admins: int = 0) -> int:
+    """
+    Insert users named {role}_{num}, all with FAKE_PASSWORD
+
+    Returns:
+        int: number of inserted users
+    """
+    now = datetime.now()
+    password = fake_password_hash()
+    first_id = _next_id(conn, User)
+    roles = [("admin", num_admins), ("user", num_users), ("moder", num_moders)]
+    rows = []
+    user_id = first_id
+    for role, count in roles:
+        for num in range(count):
+            username = f"{role}_{num}"
+            rows.append({"id": user_id, "username": username, "email": f"{username}@{rng.choice(DOMAINS)}",
+                         "password": password, "role": role, "confirmed": True, "banned": False, "avatar": "",
+                         "created_at": now - timedelta(days=rng.randint(0, 730)), "updated_at": now})
+            user_id += 1
+            if len(rows) >= CHUNK:
+                bulk_insert(conn, User.__table__, rows)
+                rows = []
+    bulk_insert(conn, User.__table__, rows)
+    return user_id - first_id
+
+
+def generate_tags(conn: Connection, num_tags: int) -> list[int]:
+    """
+    Insert tag vocabulary
+
+    Returns:
+        list[int]: ids of inserted tags, most popular first
+    """
+    first_id = _next_id(conn, Tag)
+    rows = [{"id": first_id + i, "name": name} for i, name in enumerate(_tag_names(num_tags))]
+    bulk_insert(conn, Tag.__table__, rows)
+    return [row["id"] for row in rows]
+
+
+def generate_photos(engine: Engine, rng: random.Random, num_photos: int, user_ids: list[int],
+                    tag_ids: list[int] | None = None, num_comments: int = 0, num_rates: int = 0,
+                    progress: bool = False) -> None:
+    """
+    Insert photos with tag links, comments and rates in chunks.
+    Owners, tags and rated photos follow Zipf-like popularity, counts per photo are heavy-tailed.
+
+    Args:
+        engine (Engine): database engine
+        rng (random.Random): seeded random generator
+        num_photos (int): number of photos
+        user_ids (list[int]): ids of existing users, in popularity order
+        tag_ids (list[int], optional): ids of existing tags, in popularity order
+        num_comments (int, optional): approximate number of comments
+        num_rates (int, optional): approximate number of rates
+        progress (bool, optional): print progress to stderr
+    """
+    tag_ids = tag_ids or []
+    now = datetime.now()
+    owner_weights = _zipf_cum_weights(len(user_ids), exponent=1.0)
+    tag_weights = _zipf_cum_weights(len(tag_ids)) if tag_ids else []
+    comments_mean = num_comments / num_photos if num_photos else 0
+    rates_mean = num_rates / num_photos if num_photos else 0
+    faker = Faker()
+    faker.seed_instance(rng.random())
+    sentences = [faker.sentence()[:255] for _ in range(1000)]
+
+    with engine.connect() as conn:
+        first_id = _next_id(conn, Photo)
+
+    for chunk_start in range(0, num_photos, CHUNK):
+        photos, links, comments, rates = [], [], [], []
+        count = min(CHUNK, num_photos - chunk_start)
+        owners = rng.choices(user_ids, cum_weights=owner_weights, k=count)
+        for offset, owner_id in enumerate(owners):
+            photo_id = first_id + chunk_start + offset
+            created_at = now - timedelta(seconds=rng.randint(0, 730 * 86400))
+
+            if tag_ids:
+                photo_tags = set(rng.choices(tag_ids, cum_weights=tag_weights, k=rng.randint(0, 5)))
+                links.extend({"photos": photo_id, "tags": tag_id} for tag_id in photo_tags)
+
+            if comments_mean:
+                for _ in range(_heavy_tail(rng, comments_mean)):
+                    comments.append({"text": rng.choice(sentences), "photo_id": photo_id,
+                                     "user_id": rng.choice(user_ids), "created_at": created_at,
+                                     "updated_at": created_at})
+
+            rating = 0.0
+            num_photo_rates = _heavy_tail(rng, rates_mean) if rates_mean else 0
+            if num_photo_rates:
+                # one extra rater in case the owner is sampled, owners can't rate own photos
+                raters = rng.sample(user_ids, min(len(user_ids), num_photo_rates + 1))
+                raters = [user_id for user_id in raters if user_id != owner_id][:num_photo_rates]
+                values = rng.choices(range(1, 6), weights=RATE_WEIGHTS, k=len(raters))
+                rates.extend({"rate": value, "photo_id": photo_id, "user_id": user_id,
+                              "created_at": created_at, "updated_at": created_at}
+                             for user_id, value in zip(raters, values))
+                if values:
+                    rating = sum(values) / len(values)
+
+            photos.append({"id": photo_id, "owner_id": owner_id, "rating": rating,
+                           "photo_url": f"https://res.cloudinary.com/fake/image/upload/{photo_id}.jpg",
+                           "description": " ".join(rng.sample(WORDS, 3)), "changed_photo_url": None,
+                           "created_at": created_at, "updated_at": created_at})
+
+        with engine.begin() as conn:
+            bulk_insert(conn, Photo.__table__, photos)
+            bulk_insert(conn, association_table, links)
+            bulk_insert(conn, Comment.__table__, comments)
+            bulk_insert(conn, Rate.__table__, rates)
+        if progress:
+            print(f"  photos {chunk_start + count}/{num_photos}", file=sys.stderr)
+
+
+def _heavy_tail(rng: random.Random, mean: float) -> int:
+    """
+    Pareto distributed count with the given mean (alpha = 1.5 has mean 3), randomly rounded
+    """
+    return int(rng.paretovariate(1.5) * mean / 3 + rng.random())
+
+
+def generate(engine: Engine, num_users: int, num_photos: int, num_tags: int = 1000, num_comments: int = 0,
+             num_rates: int = 0, num_moders: int = 0, num_admins: int = 0, seed: int = 42,
+             progress: bool = False) -> None:
+    """
+    Generate full fake dataset
+
+    Args:
+        engine (Engine): database engine
+        num_users (int): number of users with "user" role
+        num_photos (int): number of photos
+        num_tags (int, optional): size of tag vocabulary. Defaults to 1000.
+        num_comments (int, optional): approximate number of comments. Defaults to 0.
+        num_rates (int, optional): approximate number of rates. Defaults to 0.
+        num_moders (int, optional): number of moderators. Defaults to 0.
+        num_admins (int, optional): number of admins. Defaults to 0.
+        seed (int, optional): random seed, same seed gives the same data. Defaults to 42.
+        progress (bool, optional): print progress to stderr
+    """
+    rng = random.Random(seed)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        generate_users(conn, rng, num_users, num_moders, num_admins)
+        tag_ids = generate_tags(conn, num_tags) if num_tags else []
+        user_ids = list(conn.execute(select(User.id).order_by(User.id)).scalars())
+    rng.shuffle(user_ids)
+    generate_photos(engine, rng, num_photos, user_ids, tag_ids, num_comments, num_rates, progress)
+    with engine.begin() as conn:
+        rebuild_usage(conn)
+        reset_sequences(conn)
+
+
+def make_fake_users(num_users = 1, num_moders = 1, num_admins = 1, engine: Engine | None = None) -> None:
+    engine = engine or _default_engine()
+    with engine.begin() as conn:
+        generate_users(conn, random.Random(num_users), num_users, num_moders, num_admins)
+        reset_sequences(conn)
+
+
+def make_fake_photos(num_photos, num_users, engine: Engine | None = None) -> None:
+    engine = engine or _default_engine()
+    generate_photos(engine, random.Random(num_photos), num_photos, list(range(1, num_users + 1)))
+    with engine.begin() as conn:
+        reset_sequences(conn)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate deterministic fake PhotoShare data")
+    parser.add_argument("--db-url", default=SQLALCHEMY_DATABASE_URL)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--moders", type=int, default=5)
+    parser.add_argument("--admins", type=int, default=1)
+    parser.add_argument("--photos", type=int, default=10_000)
+    parser.add_argument("--tags", type=int, default=1000)
+    parser.add_argument("--comments", type=int, default=20_000)
+    parser.add_argument("--rates", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate all tables first")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.db_url)
+    if args.reset:
+        Base.metadata.drop_all(engine)
+    start = time.perf_counter()
+    generate(engine, args.users, args.photos, args.tags, args.comments, args.rates,
+             args.moders, args.admins, args.seed, progress=True)
+    print(f"done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
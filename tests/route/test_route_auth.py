@@ -1,15 +1,12 @@
 import pytest
 from jose import jwt
-from unittest.mock import MagicMock #, patch
 
 from app.src.database.models import User
 from app.src.services.auth import auth_service
 
 
 #---- signup ----
-def test_signup_ok(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("app.src.services.email.send_email", mock_send_email)
+def test_signup_ok(client, user, job_queue):
     response = client.post(
         "/api/auth/signup",
         json=user
@@ -20,10 +17,11 @@ def test_signup_ok(client, user, monkeypatch):
     assert data["user"]["email"] == user.get("email")
     assert data["detail"] == "User created successfully"
     assert "password" not in data
+    [job] = job_queue.backend.queued.values()
+    assert job.name == "email.confirm"
+    assert job.kwargs["email"] == user.get("email")
 
-def test_signup_fail_existing_user(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("app.src.services.email.send_email", mock_send_email)
+def test_signup_fail_existing_user(client, user):
     response = client.post(
         "/api/auth/signup",
         json=user
@@ -80,6 +78,24 @@ def test_login_fail_user_not_confirmed(client, session, user):
     data = response.json()
     assert data['detail'] == "Email not confirmed"
 
+def test_login_fail_rate_limited(client, user, rate_limiter):
+    capacity = rate_limiter.limits["login"].capacity
+    for i in range(capacity):
+        response = client.post(
+            "/api/auth/login",
+            data={"username": "some@amail.com", "password": user.get("password")},
+        )
+        assert response.status_code == 401
+        assert response.headers["RateLimit-Remaining"] == str(capacity - i - 1)
+    response = client.post(
+        "/api/auth/login",
+        data={"username": "some@amail.com", "password": user.get("password")},
+    )
+    assert response.status_code == 429
+    assert response.headers["RateLimit-Limit"] == str(capacity)
+    assert response.headers["RateLimit-Remaining"] == "0"
+    assert int(response.headers["Retry-After"]) > 0
+
 #---- refresh token ----
 # requred user to be authenticated (via token)
 def test_refresh_token_ok(client, token):
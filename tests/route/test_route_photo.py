@@ -1,11 +1,15 @@
+import io
 import pytest
 
 from unittest.mock import MagicMock, AsyncMock, patch
 from fastapi import UploadFile
+from PIL import Image
 
 from app.src.schemas import PhotoModel
+from app.src.database.models import Photo
 
-from app.src.services import cloudinary_services
+from app.src.services import cloudinary_services, trending
+from app.src.services.rate_limit import RateLimiter
 
 # @patch("app.src.service.cloudinary_services.upload_photo", )
 @pytest.mark.skip(reason="not ready - issues with cloudinary api mock")
@@ -39,6 +43,37 @@ def test_create_photo_failure_cloudinary(client, token, photo):
     )
     assert response.status_code == 500
 
+def test_create_photo_exact_duplicate_reuses_file(client, token, monkeypatch):
+    image = io.BytesIO()
+    Image.new("RGB", (64, 48), (12, 200, 90)).save(image, "PNG")
+    upload = AsyncMock(return_value={"secure_url": "https://res.cloudinary.com/test/image/upload/dup.png"})
+    monkeypatch.setattr("app.src.services.cloudinary_services.upload_photo", upload)
+    monkeypatch.setattr("app.src.services.thumbnails.create_thumbnails", AsyncMock(return_value=[None]))
+    headers = {'Authorization': f'Bearer {token["access_token"]}'}
+
+    responses = [
+        client.post("/api/photos/upload", files={"file": ("dup.png", image.getvalue(), "image/png")},
+                    data={"description": "duplicate", "tags": ""}, headers=headers)
+        for _ in range(2)
+    ]
+    assert [response.status_code for response in responses] == [201, 201]
+    first, second = (response.json() for response in responses)
+    assert upload.await_count == 1
+    assert second["detail"] == "Photo successfully uploaded, the same image is already stored"
+    assert second["photo"]["photo_url"] == first["photo"]["photo_url"]
+    assert second["photo"]["similar_to_id"] == first["photo"]["id"]
+
+def test_create_photos_fail_more_files_than_rate_limit(client, token, monkeypatch):
+    monkeypatch.setattr("app.src.services.rate_limit._limiter", RateLimiter(None, {"upload": "3/minute"}))
+    upload = AsyncMock()
+    monkeypatch.setattr("app.src.services.cloudinary_services.upload_photos", upload)
+    files = [("files", (f"{i}.png", b"image", "image/png")) for i in range(4)]
+    response = client.post("/api/photos/upload/bulk", files=files,
+                           headers={'Authorization': f'Bearer {token["access_token"]}'})
+    assert response.status_code == 422, response.text
+    assert response.json()["detail"] == "Upload at most 3 files at once"
+    upload.assert_not_awaited()
+
 # delete photo
 @pytest.mark.skip(reason="not ready - need to fit photo.user_id = user.id")
 def test_delete_photo_ok_user(client, token, photo):
@@ -184,6 +219,119 @@ def test_update_photo_tags_fail_error(client, token, photo):
     )
     assert response.status_code == 422
 
+# feed
+def test_read_feed_pages(client, session):
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 30}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/photos/feed", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) <= 30
+        seen.extend((item["created_at"], item["id"]) for item in data["items"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == session.query(Photo).count()
+    assert seen == sorted(seen, reverse=True)
+
+def test_read_feed_fail_invalid_cursor(client):
+    response = client.get("/api/photos/feed", params={"cursor": "not a cursor"})
+    assert response.status_code == 400
+
+# batch lookup
+def test_read_photos_by_ids(client, session):
+    ids = [photo.id for photo in session.query(Photo).order_by(Photo.id.desc()).limit(3)]
+    response = client.get("/api/photos", params={"ids": ",".join(map(str, ids + [999999]))})
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["id"] for item in data["items"]] == ids
+    assert data["missing"] == [999999]
+
+def test_read_photos_by_ids_fail_too_many(client):
+    response = client.get("/api/photos", params={"ids": ",".join(str(i) for i in range(1, 1000))})
+    assert response.status_code == 422
+
+# comments
+def test_get_comments_pages(client, admin_token, photo):
+    # read before the requests, they close the shared session and detach the photo
+    photo_id = photo.id
+    headers = {'Authorization': f'Bearer {admin_token["access_token"]}'}
+    client.post(f"/api/photos/{photo_id}/comment", params={"comment_text": "paged comment"}, headers=headers)
+    response = client.get(f"/api/photos/{photo_id}/comments", params={"limit": 1}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["items"]) == 1
+    assert data["total"] >= 1
+    seen = len(data["items"])
+    while data["next_cursor"]:
+        data = client.get(f"/api/photos/{photo_id}/comments",
+                          params={"limit": 1, "cursor": data["next_cursor"]}, headers=headers).json()
+        seen += len(data["items"])
+    assert seen == data["total"]
+
+def test_get_comment_counts(client, photo):
+    response = client.get("/api/photos/comments/counts", params={"ids": f"{photo.id},999999"})
+    assert response.status_code == 200
+    assert response.json()["999999"] == 0
+
+def test_get_comment_counts_fail_invalid(client):
+    response = client.get("/api/photos/comments/counts", params={"ids": "1,a"})
+    assert response.status_code == 422
+
+# conditional get
+def test_read_photo_not_modified(client, photo):
+    response = client.get(f"/api/photos/{photo.id}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    assert "s-maxage" in response.headers["cache-control"]
+
+    response = client.get(f"/api/photos/{photo.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(f"/api/photos/{photo.id}", params={"response_type": "url"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+def test_read_photo_etag_changes_with_tags(client, admin_token, photo):
+    etag = client.get(f"/api/photos/{photo.id}").headers["etag"]
+    client.patch(
+        f"/api/photos/{photo.id}/tags",
+        data={"tags": "etag_changed"},
+        headers={'Authorization': f'Bearer {admin_token["access_token"]}'}
+    )
+    response = client.get(f"/api/photos/{photo.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+def test_read_trending(client, photo):
+    photo_id = photo.id
+    trending.record_rate(photo, 5)
+    trending.record_rate(Photo(id=photo_id + 1000, owner_id=photo.owner_id, created_at=photo.created_at), 5)
+    response = client.get("/api/photos/trending")
+    assert response.status_code == 200
+    # the snapshot without photo url is skipped
+    assert [item["id"] for item in response.json()] == [photo_id]
+    assert response.json()[0]["votes"] == 1
+
+# tags autocomplete
+def test_autocomplete_tags(client, admin_token, photo):
+    access_token = admin_token["access_token"]
+    response = client.patch(
+        f"/api/photos/{photo.id}/tags",
+        data={"tags": "#Autocomplete autocompleted"},
+        headers={'Authorization': f'Bearer {access_token}'}
+    )
+    assert response.status_code == 200
+    response = client.get("/api/tags/autocomplete", params={"q": "#AUTOCOMP"})
+    assert response.status_code == 200
+    names = [tag["name"] for tag in response.json()]
+    assert "autocomplete" in names
+
 # # update description
 # def test_update_description_ok():
 #     ...
@@ -1,3 +1,4 @@
+import json
 import pytest
 
 from unittest.mock import patch
@@ -30,6 +31,35 @@ def test_read_users_me_ok(client, token):
     # assert data["username"] == user.get("username")
     assert data["email"] == email
 
+#---- export ----
+def test_export_users_me_ok(client, token):
+    access_token = token["access_token"]
+    email = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])["sub"]
+    response = client.get(
+        "/api/users/me/export",
+        headers={'Authorization': f'Bearer {access_token}', 'Accept-Encoding': 'gzip'}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert records[0]["type"] == "user"
+    assert records[0]["email"] == email
+    assert {record["type"] for record in records[1:]} <= {"photo", "comment", "rate"}
+
+def test_export_user_not_admin(client, token):
+    response = client.get(
+        "/api/users/1/export",
+        headers={'Authorization': f'Bearer {token["access_token"]}'}
+    )
+    assert response.status_code == 403
+
+def test_export_user_not_found(client, admin_token):
+    response = client.get(
+        "/api/users/100000/export",
+        headers={'Authorization': f'Bearer {admin_token["access_token"]}'}
+    )
+    assert response.status_code == 404
+
 
 # def test_avatar(client, session, user, monkeypatch):
 #     ...
@@ -9,6 +9,12 @@ def test_read_main():
     assert response.status_code == 200
     assert response.json() == {"PhotoShare": "FastAPI group project"}
 
+def test_read_metrics():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE photoshare_http_request_duration_seconds histogram" in response.text
+
 if __name__ == "__main__":
     unittest.main()    
     
\ No newline at end of file
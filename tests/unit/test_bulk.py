@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.database.bulk import bulk_insert
+from app.src.database.models import User
+
+
+class TestBulkInsert(unittest.TestCase):
+    def _copy(self, rows: list[dict]) -> tuple[str, str]:
+        conn = MagicMock()
+        conn.dialect.name = "postgresql"
+        cursor = conn.connection.cursor.return_value
+        bulk_insert(conn, User.__table__, rows)
+        sql, buffer = cursor.copy_expert.call_args.args
+        cursor.close.assert_called_once()
+        return sql, buffer.getvalue()
+
+    def test_copy_keeps_empty_strings(self):
+        sql, data = self._copy([
+            {"id": 1, "username": 'say "hi", anna', "avatar": "", "refresh_token": None, "confirmed": True,
+             "created_at": datetime(2024, 4, 1, 12, 0)},
+        ])
+        self.assertEqual(sql, "COPY users (id, username, avatar, refresh_token, confirmed, created_at) "
+                              "FROM STDIN WITH (FORMAT csv)")
+        # an unquoted empty field is NULL, a quoted one is an empty string
+        self.assertEqual(data, '1,"say ""hi"", anna","",,"t","2024-04-01 12:00:00"\n')
+
+    def test_executemany_elsewhere(self):
+        conn = MagicMock()
+        conn.dialect.name = "sqlite"
+        rows = [{"id": 1, "username": "anna"}]
+        bulk_insert(conn, User.__table__, rows)
+        conn.execute.assert_called_once()
+        self.assertEqual(conn.execute.call_args.args[1], rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,8 @@ import unittest
 from unittest.mock import patch, MagicMock
 from fastapi import HTTPException
 import cloudinary.uploader
+import threading
+import time
 
 import sys
 import os
@@ -13,6 +15,7 @@ load_dotenv()
 from app.src.conf.config import settings
 from app.src.services.cloudinary_services import (
     upload_photo,
+    upload_photos,
     delete_photo,
     transformed_photo_url,
 )  
@@ -44,6 +47,31 @@ class TestCloudinaryService(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(context.exception.status_code, 400)
         self.assertEqual(context.exception.detail, "Error uploading image.")
 
+    async def test_upload_photos_bounded_concurrency(self):
+        lock = threading.Lock()
+        running, peak = 0, 0
+
+        def upload(file, **options):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+            if file == "bad":
+                raise cloudinary.exceptions.Error("test error")
+            return {"secure_url": f"https://res.cloudinary.com/{file}.jpg"}
+
+        self.mock_upload.side_effect = upload
+        files = ["a", "bad", "c", "d", "e", "f"]
+        results = await upload_photos(files, concurrency=2)
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(results[0], {"secure_url": "https://res.cloudinary.com/a.jpg"})
+        self.assertIsInstance(results[1], cloudinary.exceptions.Error)
+        self.assertEqual(len(results), len(files))
+
     async def test_delete_photo(self):
         self.mock_destroy.return_value = {"result": "ok"}
         cloudinary_url = "https://res.cloudinary.com/test-image.jpg"
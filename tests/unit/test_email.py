@@ -0,0 +1,154 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+from dotenv import load_dotenv
+import aiosmtplib
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services import email
+from benchmarks.standins import Latency, LocalSMTP
+
+
+def _message(address: str):
+    return email.render_message(address, "Confirm your email ", "email_template.html",
+                                {"host": "http://test/", "username": "anna", "token": f"token-{address}"})
+
+
+class TestRenderMessage(unittest.TestCase):
+    def test_templates_loaded_once(self):
+        self.assertIs(email.templates(), email.templates())
+        self.assertIn("email_password_reset_template.html", email.templates())
+
+    def test_rendered(self):
+        message = _message("anna@example.com")
+        self.assertEqual(message["To"], "anna@example.com")
+        self.assertEqual(message.get_content_type(), "text/html")
+        self.assertIn("http://test/api/auth/confirmed_email/token-anna@example.com", message.get_content())
+
+
+class TestMailer(unittest.IsolatedAsyncioTestCase):
+    # sends fail instead of hanging the run when a sender task is lost
+    TIMEOUT = 5
+
+    async def asyncSetUp(self):
+        self.smtp = await LocalSMTP(reject={"spam@example.com"}).__aenter__()
+        self.addAsyncCleanup(self.smtp.__aexit__, None, None, None)
+
+    async def _mailer(self, **options) -> email.Mailer:
+        mailer = self.smtp.mailer(**options)
+        self.addAsyncCleanup(mailer.close)
+        return mailer
+
+    async def _send(self, mailer: email.Mailer, message) -> None:
+        await asyncio.wait_for(mailer.send(message), self.TIMEOUT)
+
+    async def test_spike_shares_connections(self):
+        mailer = await self._mailer(pool_size=2, batch_size=10)
+        addresses = [f"user{i}@example.com" for i in range(50)]
+        await asyncio.gather(*(self._send(mailer, _message(address)) for address in addresses))
+        self.assertEqual(sorted(message["To"] for message in self.smtp.outbox), sorted(addresses))
+        self.assertEqual(self.smtp.connections, 2)
+
+    async def test_connection_reused(self):
+        mailer = await self._mailer()
+        for i in range(3):
+            await self._send(mailer, _message(f"user{i}@example.com"))
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(self.smtp.token_for("user2@example.com"), "token-user2@example.com")
+
+    async def test_refused_message_fails_alone(self):
+        mailer = await self._mailer(pool_size=1)
+        results = await asyncio.gather(self._send(mailer, _message("spam@example.com")),
+                                       self._send(mailer, _message("anna@example.com")), return_exceptions=True)
+        self.assertIsInstance(results[0], aiosmtplib.SMTPRecipientsRefused)
+        self.assertIsNone(results[1])
+        self.assertEqual([message["To"] for message in self.smtp.outbox], ["anna@example.com"])
+
+    async def test_reconnect_after_server_closed_connection(self):
+        mailer = await self._mailer()
+        await self._send(mailer, _message("anna@example.com"))
+        self.smtp.drop_connections()
+        await asyncio.sleep(0.01)
+        await self._send(mailer, _message("bob@example.com"))
+        self.assertEqual(len(self.smtp.outbox), 2)
+        self.assertEqual(self.smtp.connections, 2)
+
+    async def test_idle_connection_reopened(self):
+        mailer = await self._mailer(idle_timeout=0.0)
+        await self._send(mailer, _message("anna@example.com"))
+        await self._send(mailer, _message("bob@example.com"))
+        self.assertEqual(self.smtp.connections, 2)
+
+    async def test_server_down_raised(self):
+        await self.smtp.__aexit__(None, None, None)
+        mailer = await self._mailer()
+        with self.assertRaises(OSError):
+            await self._send(mailer, _message("anna@example.com"))
+
+    async def test_send_template_uses_mailer_of_process(self):
+        async with self.smtp.installed():
+            send = email.send_template("anna@example.com", "Reset password", "email_password_reset_template.html",
+                                       {"host": "http://test/", "username": "anna", "token": "abc"})
+            await asyncio.wait_for(send, self.TIMEOUT)
+        self.assertEqual(self.smtp.token_for("anna@example.com"), "abc")
+
+    async def test_invalid_message_fails_alone(self):
+        mailer = await self._mailer(pool_size=1)
+        invalid = _message("anna@example.com")
+        invalid["From"] = ""
+        results = await asyncio.gather(self._send(mailer, invalid), self._send(mailer, _message("bob@example.com")),
+                                       return_exceptions=True)
+        self.assertIsInstance(results[0], Exception)
+        self.assertNotIsInstance(results[0], asyncio.TimeoutError)
+        self.assertIsNone(results[1])
+        self.assertEqual([message["To"] for message in self.smtp.outbox], ["bob@example.com"])
+
+    async def test_sender_survives_failed_batch(self):
+        mailer = await self._mailer(pool_size=1)
+        with patch.object(mailer, "_send_batch", side_effect=RuntimeError("bug")):
+            with self.assertRaises(RuntimeError):
+                await self._send(mailer, _message("anna@example.com"))
+        await self._send(mailer, _message("bob@example.com"))
+        self.assertEqual([message["To"] for message in self.smtp.outbox], ["bob@example.com"])
+
+    async def test_dead_senders_restarted(self):
+        mailer = await self._mailer(pool_size=2)
+        await self._send(mailer, _message("anna@example.com"))
+        for task in mailer._senders:
+            task.cancel()
+        await asyncio.gather(*mailer._senders, return_exceptions=True)
+        await self._send(mailer, _message("bob@example.com"))
+        self.assertEqual(len(self.smtp.outbox), 2)
+        self.assertEqual(len(mailer._senders), 2)
+
+    async def test_cancelled_message_not_sent(self):
+        self.smtp.latency = Latency(200)
+        mailer = await self._mailer(pool_size=1)
+        first = asyncio.create_task(self._send(mailer, _message("anna@example.com")))
+        await asyncio.sleep(0.05)
+        # a job timing out while its message waits behind a slow one
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(mailer.send(_message("bob@example.com")), 0.01)
+        await first
+        await self._send(mailer, _message("carl@example.com"))
+        self.assertEqual([message["To"] for message in self.smtp.outbox], ["anna@example.com", "carl@example.com"])
+
+    async def test_sender_set(self):
+        mailer = await self._mailer()
+        await self._send(mailer, _message("anna@example.com"))
+        self.assertEqual(self.smtp.outbox[0]["From"], self.smtp.sender)
+
+    def test_sender_required(self):
+        with self.assertRaises(ValueError):
+            email.Mailer(email.SMTPPool(1, 60.0), 10, "")
+        with patch.object(email.settings, "mail_from", ""), self.assertRaises(ValueError):
+            email.create_mailer()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import io
+import os
+import sys
+import unittest
+from datetime import datetime
+
+from dotenv import load_dotenv
+from PIL import ExifTags, Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services.exif import read_exif
+
+
+def _jpeg(orientation=1, gps=True) -> bytes:
+    exif = Image.Exif()
+    exif[ExifTags.Base.Make] = "Canon"
+    exif[ExifTags.Base.Model] = "Canon EOS R6\x00"
+    exif[ExifTags.Base.Orientation] = orientation
+    exif[ExifTags.IFD.Exif] = {ExifTags.Base.DateTimeOriginal: "2024:05:17 18:42:03",
+                               ExifTags.Base.LensModel: "RF24-105mm F4 L IS USM"}
+    if gps:
+        exif[ExifTags.IFD.GPSInfo] = {
+            ExifTags.GPS.GPSLatitudeRef: "N", ExifTags.GPS.GPSLatitude: (50.0, 27.0, 0.0),
+            ExifTags.GPS.GPSLongitudeRef: "W", ExifTags.GPS.GPSLongitude: (30.0, 31.0, 12.0),
+        }
+    file = io.BytesIO()
+    Image.new("RGB", (300, 200)).save(file, "JPEG", exif=exif)
+    return file.getvalue()
+
+
+class TestReadExif(unittest.TestCase):
+    def test_all_fields(self):
+        result = read_exif(_jpeg())
+        self.assertEqual(result["taken_at"], datetime(2024, 5, 17, 18, 42, 3))
+        self.assertEqual((result["camera_make"], result["camera_model"]), ("Canon", "Canon EOS R6"))
+        self.assertEqual(result["lens"], "RF24-105mm F4 L IS USM")
+        self.assertEqual((result["width"], result["height"], result["orientation"]), (300, 200, 1))
+        self.assertAlmostEqual(result["gps_latitude"], 50.45)
+        self.assertAlmostEqual(result["gps_longitude"], -30.52)
+
+    def test_rotated_size_as_displayed(self):
+        result = read_exif(_jpeg(orientation=6, gps=False))
+        self.assertEqual((result["width"], result["height"]), (200, 300))
+        self.assertIsNone(result["gps_latitude"])
+
+    def test_no_exif(self):
+        file = io.BytesIO()
+        Image.new("RGB", (10, 20)).save(file, "PNG")
+        result = read_exif(file.getvalue())
+        self.assertEqual((result["width"], result["height"]), (10, 20))
+        self.assertIsNone(result["taken_at"])
+        self.assertIsNone(result["camera_model"])
+
+    def test_not_an_image(self):
+        self.assertEqual(read_exif(b"<svg/>"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
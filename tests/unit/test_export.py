@@ -0,0 +1,71 @@
+import gzip
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from sqlalchemy.orm import Session
+
+import sys
+import os
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services import export
+from app.src.database.models import User, Photo, Tag, Comment, Rate
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=Session)
+        self.session.get.return_value = User(id=1, username="anna", email="anna@example.com", role="user",
+                                             created_at=datetime(2024, 4, 1))
+
+    def test_export_records(self):
+        photo = Photo(id=3, photo_url="https://example.com/3.jpg", description="sea", rating=4.5,
+                      tags=[Tag(name="sea"), Tag(name="sun")], created_at=datetime(2024, 4, 2))
+        with patch.object(export.repository_users, "iter_users_photos", return_value=iter([photo])), \
+             patch.object(export.repository_users, "iter_users_comments",
+                          return_value=iter([Comment(id=5, photo_id=9, text="nice")])), \
+             patch.object(export.repository_users, "iter_users_rates",
+                          return_value=iter([Rate(id=6, photo_id=9, rate=5)])):
+            records = list(export.export_records(1, self.session))
+        self.assertEqual([record["type"] for record in records], ["user", "photo", "comment", "rate"])
+        self.assertEqual(records[1]["tags"], ["sea", "sun"])
+        self.assertEqual(records[3]["rate"], 5)
+
+    def test_export_records_unknown_user(self):
+        self.session.get.return_value = None
+        self.assertEqual(list(export.export_records(1, self.session)), [])
+
+    def test_ndjson_groups_whole_lines(self):
+        records = [{"id": i, "created_at": datetime(2024, 4, 1)} for i in range(100)]
+        chunks = list(export.ndjson(records, chunk_size=200))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(chunk.endswith(b"\n") for chunk in chunks))
+        lines = b"".join(chunks).splitlines()
+        self.assertEqual(json.loads(lines[99]), {"id": 99, "created_at": "2024-04-01T00:00:00"})
+
+    def test_gzip_chunks_is_single_member(self):
+        chunks = [b'{"id": %d}\n' % i for i in range(1000)]
+        compressed = b"".join(export.gzip_chunks(chunks))
+        self.assertEqual(gzip.decompress(compressed), b"".join(chunks))
+
+    def test_accepts_gzip(self):
+        self.assertTrue(export.accepts_gzip("gzip, deflate, br"))
+        self.assertTrue(export.accepts_gzip("br;q=1.0, gzip;q=0.8"))
+        self.assertFalse(export.accepts_gzip("gzip;q=0"))
+        self.assertFalse(export.accepts_gzip("identity"))
+        self.assertFalse(export.accepts_gzip(None))
+
+    def test_stream_export_closes_session(self):
+        factory = MagicMock()
+        db = factory.return_value.__enter__.return_value
+        db.get.return_value = None
+        self.assertEqual(list(export.stream_export(1, factory, compress=False)), [])
+        factory.return_value.__exit__.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
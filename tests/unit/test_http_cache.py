@@ -0,0 +1,36 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services.http_cache import weak_etag, etag_matches
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        self.updated_at = datetime(2024, 4, 1, 12, 0)
+        self.etag = weak_etag(1, self.updated_at, 4.5, "detailed")
+
+    def test_weak_etag_changes_with_parts(self):
+        self.assertTrue(self.etag.startswith('W/"'))
+        self.assertEqual(self.etag, weak_etag(1, self.updated_at, 4.5, "detailed"))
+        self.assertNotEqual(self.etag, weak_etag(1, self.updated_at, 4.0, "detailed"))
+        self.assertNotEqual(self.etag, weak_etag(1, datetime(2024, 4, 1, 12, 1), 4.5, "detailed"))
+        self.assertNotEqual(self.etag, weak_etag(1, self.updated_at, 4.5, "url"))
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches(self.etag, self.etag))
+        self.assertTrue(etag_matches(self.etag.removeprefix("W/"), self.etag))
+        self.assertTrue(etag_matches(f'"other", {self.etag}', self.etag))
+        self.assertTrue(etag_matches("*", self.etag))
+        self.assertFalse(etag_matches('W/"other"', self.etag))
+        self.assertFalse(etag_matches(None, self.etag))
+
+
+if __name__ == "__main__":
+    unittest.main()
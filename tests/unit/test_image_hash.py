@@ -0,0 +1,60 @@
+import asyncio
+import io
+import os
+import sys
+import unittest
+
+from dotenv import load_dotenv
+from PIL import Image, ImageDraw
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services import image_hash
+
+
+def _picture(size=(640, 480), shift=0) -> Image.Image:
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    for i in range(8):
+        draw.rectangle((i * width // 8, 0, (i + 1) * width // 8, height), fill=(30 * i, 200 - 20 * i, 90 + shift))
+    draw.ellipse((width // 4, height // 4, width * 3 // 4, height * 3 // 4), fill=(250, 40, 40))
+    return image
+
+
+def _encode(image: Image.Image, fmt="JPEG", **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+class TestImageHash(unittest.TestCase):
+    def test_near_copies_are_close(self):
+        original = _encode(_picture())
+        resized = _encode(_picture().resize((320, 240)), quality=70)
+        self.assertLessEqual(image_hash.hamming(image_hash.dhash(original), image_hash.dhash(resized)), 3)
+        self.assertNotEqual(image_hash.sha256_hex(original), image_hash.sha256_hex(resized))
+
+    def test_different_images_are_far(self):
+        other = Image.new("RGB", (640, 480), "black")
+        ImageDraw.Draw(other).rectangle((0, 0, 320, 480), fill="white")
+        self.assertGreater(image_hash.hamming(image_hash.dhash(_encode(_picture())), image_hash.dhash(_encode(other))), 10)
+
+    def test_not_an_image(self):
+        self.assertIsNone(image_hash.dhash(b"<svg xmlns='http://www.w3.org/2000/svg'/>"))
+
+    def test_bands_round_trip(self):
+        value = 0x0123_4567_89AB_CDEF
+        self.assertEqual(image_hash.bands(value), [0x0123, 0x4567, 0x89AB, 0xCDEF])
+        self.assertEqual(image_hash.from_bands(image_hash.bands(value)), value)
+
+    def test_fingerprint(self):
+        data = _encode(_picture(), "PNG")
+        sha256, dhash = asyncio.run(image_hash.fingerprint(data))
+        self.assertEqual(sha256, image_hash.sha256_hex(data))
+        self.assertEqual(dhash, image_hash.dhash(data))
+
+
+if __name__ == "__main__":
+    unittest.main()
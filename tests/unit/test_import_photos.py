@@ -0,0 +1,80 @@
+import io
+import os
+import sys
+import unittest
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, select
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.cli import import_photos
+from app.src.database.models import Base, User, Photo, Tag, Rate, TagUsage, association_table
+
+
+class TestParseRecord(unittest.TestCase):
+    def test_csv_fields(self):
+        record = import_photos.parse_record({"photo_url": " https://e/1.jpg ", "owner": "anna", "description": "",
+                                             "created_at": "2024-01-02T03:04:05", "tags": "#Sea sun sea",
+                                             "ratings": "bob:5 carl@example.com:3"})
+        self.assertEqual(record["photo_url"], "https://e/1.jpg")
+        self.assertIsNone(record["description"])
+        self.assertEqual(record["created_at"].year, 2024)
+        self.assertEqual(record["tags"], ["sea", "sun"])
+        self.assertEqual(record["ratings"], {"bob": 5, "carl@example.com": 3})
+
+    def test_ndjson_ratings_list(self):
+        record = import_photos.parse_record({"photo_url": "u", "owner": 3, "tags": ["a"],
+                                             "ratings": [{"user": "bob", "rate": 4}]})
+        self.assertEqual(record["owner"], "3")
+        self.assertEqual(record["ratings"], {"bob": 4})
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            import_photos.parse_record({"photo_url": "u"})
+        with self.assertRaises(ValueError):
+            import_photos.parse_record({"photo_url": "u", "owner": "anna", "ratings": {"bob": 6}})
+
+    def test_read_records_csv(self):
+        file = io.StringIO("photo_url,owner\nhttps://e/1.jpg,anna\n")
+        self.assertEqual(list(import_photos.read_records(file, "csv")), [{"photo_url": "https://e/1.jpg", "owner": "anna"}])
+
+
+class TestImportRecords(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(User.__table__.insert(), [
+                {"id": 1, "username": "anna", "email": "anna@example.com", "password": "x"},
+                {"id": 2, "username": "bob", "email": "bob@example.com", "password": "x"},
+            ])
+            conn.execute(Tag.__table__.insert(), [{"id": 1, "name": "sea"}])
+            conn.execute(Photo.__table__.insert(), [{"id": 10, "photo_url": "old", "owner_id": 1}])
+
+    def test_import(self):
+        records = [
+            {"photo_url": "https://e/1.jpg", "owner": "anna@example.com", "tags": "sea sun",
+             "ratings": "bob:4 anna:5"},
+            {"photo_url": "https://e/2.jpg", "owner": "bob", "tags": ["sun"], "ratings": {"anna": 2}},
+            {"photo_url": "https://e/3.jpg", "owner": "ghost"},
+            {"owner": "anna"},
+        ]
+        with self.engine.begin() as conn:
+            stats = import_photos.import_records(conn, records, chunk_size=2)
+        self.assertEqual((stats.records, stats.invalid, stats.photos, stats.unknown_owner), (4, 1, 2, 1))
+        self.assertEqual((stats.tags_created, stats.rates), (1, 2))
+
+        with self.engine.connect() as conn:
+            photos = conn.execute(select(Photo.id, Photo.owner_id, Photo.rating).order_by(Photo.id)).all()
+            self.assertEqual(photos, [(10, 1, 0.0), (11, 1, 4.0), (12, 2, 2.0)])
+            self.assertEqual(conn.execute(select(Rate.user_id).where(Rate.photo_id == 11)).scalars().all(), [2])
+            links = conn.execute(select(association_table).order_by("photos", "tags")).all()
+            self.assertEqual(links, [(11, 1), (11, 2), (12, 2)])
+            usage = dict(conn.execute(select(TagUsage.tag_id, TagUsage.usage_count)).all())
+            self.assertEqual(usage, {1: 1, 2: 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import sys
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services import jobs
+from app.src.services.metrics import JOBS_PROCESSED
+
+
+class TestBackoff(unittest.TestCase):
+    def test_doubles_up_to_max(self):
+        with patch.object(jobs.settings, "job_retry_delay", 2.0), \
+             patch.object(jobs.settings, "job_retry_max_delay", 10.0):
+            self.assertTrue(1.0 <= jobs.backoff(1) <= 2.0)
+            self.assertTrue(4.0 <= jobs.backoff(3) <= 8.0)
+            self.assertTrue(5.0 <= jobs.backoff(10) <= 10.0)
+
+
+class TestJob(unittest.TestCase):
+    def test_round_trip(self):
+        job = jobs.Job("email.confirm", {"email": "a@example.com"}, attempt=2)
+        self.assertEqual(jobs.Job.loads(job.dumps()), job)
+
+
+class TestWorker(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = jobs.MemoryBackend()
+        self.queue = jobs.JobQueue(self.backend)
+        self.worker = jobs.Worker(self.backend, concurrency=2, block=0.01)
+        self.handler = AsyncMock()
+        self.registry = patch.dict(jobs._registry, {"test.job": jobs.JobSpec(self.handler, 3, 1.0)})
+        self.registry.start()
+        self.addCleanup(self.registry.stop)
+
+    async def _drain(self):
+        """
+        Run the worker until queued, pending and delayed jobs are done
+        """
+        stop = asyncio.Event()
+        run = asyncio.create_task(self.worker.run(stop))
+        for _ in range(500):
+            await asyncio.sleep(0.01)
+            if not (self.backend.queued or self.backend.pending or self.backend.delayed):
+                break
+        stop.set()
+        await run
+
+    async def test_job_acknowledged(self):
+        await self.queue.enqueue("test.job", photo_id=1)
+        await self._drain()
+        self.handler.assert_awaited_once_with(photo_id=1)
+        self.assertEqual(await self.backend.backlog(), {"queued": 0, "delayed": 0, "dead": 0})
+
+    async def test_failed_job_retried(self):
+        self.handler.side_effect = [RuntimeError("down"), None]
+        retries = JOBS_PROCESSED.labels("test.job", "retry").value
+        with patch.object(jobs, "backoff", return_value=0.0):
+            await self.queue.enqueue("test.job", photo_id=1)
+            await self._drain()
+        self.assertEqual(self.handler.await_count, 2)
+        self.assertEqual(JOBS_PROCESSED.labels("test.job", "retry").value, retries + 1)
+        self.assertEqual(self.backend.dead, [])
+
+    async def test_dead_after_max_attempts(self):
+        self.handler.side_effect = RuntimeError("down")
+        with patch.object(jobs, "backoff", return_value=0.0):
+            await self.queue.enqueue("test.job", photo_id=1)
+            await self._drain()
+        self.assertEqual(self.handler.await_count, 3)
+        [dead] = self.backend.dead
+        self.assertEqual(dead.attempt, 3)
+        self.assertEqual(dead.error, "RuntimeError('down')")
+
+    async def test_timeout_is_failure(self):
+        async def slow(**kwargs):
+            await asyncio.sleep(10)
+
+        with patch.dict(jobs._registry, {"test.job": jobs.JobSpec(slow, 1, 0.01)}):
+            await self.queue.enqueue("test.job")
+            await self._drain()
+        self.assertEqual(len(self.backend.dead), 1)
+
+    async def test_unknown_job_is_dead(self):
+        await self.queue.enqueue("test.missing")
+        await self._drain()
+        self.assertEqual([job.error for job in self.backend.dead], ["unknown job"])
+
+    async def test_concurrency_limit(self):
+        running, peak = 0, 0
+
+        async def handler(**kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+        with patch.dict(jobs._registry, {"test.job": jobs.JobSpec(handler, 1, 1.0)}):
+            for _ in range(6):
+                await self.queue.enqueue("test.job")
+            await self._drain()
+        self.assertEqual(peak, 2)
+
+    async def test_lost_job_reclaimed(self):
+        await self.queue.enqueue("test.job", photo_id=1)
+        # fetched by a worker that died before acknowledging it
+        await self.backend.fetch("lost", 1, 0)
+        await asyncio.sleep(0.06)
+        with patch.object(jobs.settings, "job_visibility_timeout", 0.05), patch.object(jobs, "backoff", return_value=0.0):
+            await self._drain()
+        self.handler.assert_awaited_once_with(photo_id=1)
+        self.assertEqual(self.backend.pending, {})
+        self.assertEqual(self.backend.dead, [])
+
+    async def test_job_losing_its_worker_is_dead(self):
+        await self.queue.enqueue("test.job", photo_id=1)
+        with patch.object(jobs, "backoff", return_value=0.0):
+            for _ in range(3):
+                # fetched by a worker that died before acknowledging it
+                await self.backend.promote()
+                await self.backend.fetch("lost", 1, 0)
+                for entry_id, job in await self.backend.reclaim("worker", 0, 1):
+                    await self.worker._fail(entry_id, job, "worker lost")
+        self.handler.assert_not_awaited()
+        [dead] = self.backend.dead
+        self.assertEqual((dead.attempt, dead.error), (3, "worker lost"))
+
+
+class TestEagerQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_runs_in_caller(self):
+        handler = AsyncMock(side_effect=RuntimeError("down"))
+        backend = jobs.MemoryBackend()
+        with patch.dict(jobs._registry, {"test.job": jobs.JobSpec(handler, 3, 1.0)}):
+            await jobs.JobQueue(backend, eager=True).enqueue("test.job", photo_id=1)
+        handler.assert_awaited_once_with(photo_id=1)
+        self.assertEqual(backend.queued, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+import unittest
+
+from dotenv import load_dotenv
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services.logging import (
+    BatchingRotatingFileHandler,
+    ContextQueueHandler,
+    JsonFormatter,
+    RequestLoggingMiddleware,
+    bind_request_context,
+    request_context,
+)
+
+
+class TestJsonLogging(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmp_dir.name, "test.log")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _record(self, message="hello %s", args=("world",), **extra):
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, message, args, None)
+        for key, value in extra.items():
+            setattr(record, key, value)
+        return record
+
+    def test_json_formatter_fields(self):
+        record = self._record(request_id="abc", user_id=7, latency_ms=1.5)
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["message"], "hello world")
+        self.assertEqual(entry["request_id"], "abc")
+        self.assertEqual(entry["user_id"], 7)
+        self.assertEqual(entry["latency_ms"], 1.5)
+        self.assertNotIn("route", entry)
+
+    def test_queue_handler_attaches_request_context(self):
+        token = request_context.set({"request_id": "req-1"})
+        try:
+            bind_request_context(user_id=3)
+            record = ContextQueueHandler(None).prepare(self._record())
+        finally:
+            request_context.reset(token)
+        self.assertEqual(record.request_id, "req-1")
+        self.assertEqual(record.user_id, 3)
+        self.assertEqual(record.msg, "hello world")
+        self.assertIsNone(record.args)
+
+    def test_batching_handler_buffers_until_batch_size(self):
+        handler = BatchingRotatingFileHandler(self.log_file, max_bytes=0, backup_count=0,
+                                              batch_size=3, flush_interval=3600)
+        handler.setFormatter(JsonFormatter())
+        handler.handle(self._record())
+        handler.handle(self._record())
+        self.assertFalse(os.path.exists(self.log_file))
+        handler.handle(self._record())
+        with open(self.log_file) as f:
+            self.assertEqual(len(f.readlines()), 3)
+        handler.close()
+
+    def test_batching_handler_rotates_by_size(self):
+        handler = BatchingRotatingFileHandler(self.log_file, max_bytes=200, backup_count=2,
+                                              batch_size=1, flush_interval=3600)
+        handler.setFormatter(JsonFormatter())
+        for _ in range(10):
+            handler.handle(self._record())
+        handler.close()
+        self.assertTrue(os.path.exists(self.log_file + ".1"))
+
+
+class TestRequestLoggingMiddleware(unittest.TestCase):
+    def test_request_id_header_and_access_log(self):
+        app = FastAPI()
+        app.add_middleware(RequestLoggingMiddleware)
+
+        @app.get("/items/{item_id}")
+        def read_item(item_id: int):
+            bind_request_context(user_id=42)
+            return {"id": item_id}
+
+        client = TestClient(app)
+        with self.assertLogs("photoshare.access", level="INFO") as logs:
+            response = client.get("/items/5", headers={"X-Request-ID": "fixed-id"})
+
+        self.assertEqual(response.headers["x-request-id"], "fixed-id")
+        record = logs.records[0]
+        self.assertEqual(record.route, "/items/{item_id}")
+        self.assertEqual(record.status, 200)
+        self.assertEqual(record.user_id, 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import unittest
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, APIRouter
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    MetricsMiddleware,
+    REQUEST_LATENCY,
+    REQUESTS_TOTAL,
+    _Metric,
+)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_with_labels(self):
+        counter = Counter("test_total", "Test counter", ("result",), registry=self.registry)
+        counter.labels("hit").inc()
+        counter.labels("hit").inc(2)
+        counter.labels("miss").inc()
+        output = self.registry.render()
+        self.assertIn("# TYPE test_total counter", output)
+        self.assertIn('test_total{result="hit"} 3', output)
+        self.assertIn('test_total{result="miss"} 1', output)
+
+    def test_metric_without_children_rejected(self):
+        class Incomplete(_Metric):
+            type_name = "counter"
+
+        with self.assertRaises(TypeError):
+            Incomplete("incomplete_total", "Incomplete metric", registry=self.registry)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("test_seconds", "Test histogram", buckets=(0.1, 1.0), registry=self.registry)
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        output = self.registry.render()
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', output)
+        self.assertIn('test_seconds_bucket{le="1.0"} 2', output)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3', output)
+        self.assertIn("test_seconds_count 3", output)
+        self.assertIn("test_seconds_sum 5.55", output)
+
+    def test_gauge_function_and_inprogress(self):
+        gauge = Gauge("test_pool", "Test gauge", registry=self.registry)
+        gauge.set_function(lambda: 7)
+        self.assertIn("test_pool 7", self.registry.render())
+
+        in_progress = Gauge("test_in_progress", "Test gauge", registry=self.registry)
+        with in_progress.track_inprogress():
+            self.assertIn("test_in_progress 1", self.registry.render())
+        self.assertIn("test_in_progress 0", self.registry.render())
+
+    def test_label_values_are_escaped(self):
+        counter = Counter("test_escape_total", "Test counter", ("path",), registry=self.registry)
+        counter.labels('a"b').inc()
+        self.assertIn('test_escape_total{path="a\\"b"} 1', self.registry.render())
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+    def test_records_route_template_for_api_routes(self):
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+        router = APIRouter(prefix="/photos")
+
+        @router.get("/{photo_id}")
+        async def read_photo(photo_id: int):
+            return {"id": photo_id}
+
+        app.include_router(router, prefix="/api")
+
+        @app.get("/other")
+        async def other():
+            return {}
+
+        client = TestClient(app)
+        client.get("/api/photos/1")
+        client.get("/api/photos/2")
+        client.get("/other")
+
+        histogram = REQUEST_LATENCY.labels("GET", "/api/photos/{photo_id}")
+        self.assertGreaterEqual(sum(histogram.counts), 2)
+        self.assertGreaterEqual(REQUESTS_TOTAL.labels("GET", "/api/photos/{photo_id}", 200).value, 2)
+        self.assertNotIn(("GET", "/other"), REQUEST_LATENCY._children)
+
+
+if __name__ == "__main__":
+    unittest.main()
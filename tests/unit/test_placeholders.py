@@ -0,0 +1,88 @@
+import base64
+import io
+import os
+import sys
+import unittest
+
+from dotenv import load_dotenv
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services import placeholders
+
+
+def _image_file(pixels: np.ndarray, fmt="PNG") -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def _lqip_image(lqip: str) -> Image.Image:
+    prefix = "data:image/webp;base64,"
+    assert lqip.startswith(prefix)
+    return Image.open(io.BytesIO(base64.b64decode(lqip[len(prefix):])))
+
+
+class TestBoxDownsample(unittest.TestCase):
+    def test_block_averages(self):
+        pixels = np.random.default_rng(0).integers(0, 256, (301, 401, 3), dtype=np.uint8)
+        result = placeholders._box_downsample(pixels, 64)
+        # ceil(401 / 64) = 7 pixel blocks, incomplete edge blocks dropped
+        expected = pixels[:301 // 7 * 7, :401 // 7 * 7].reshape(43, 7, 57, 7, 3).mean(axis=(1, 3))
+        self.assertEqual(result.shape, (43, 57, 3))
+        np.testing.assert_allclose(result, expected, atol=1e-3)
+
+    def test_small_image_unchanged(self):
+        pixels = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+        np.testing.assert_array_equal(placeholders._box_downsample(pixels, 16), pixels)
+
+    def test_thin_image(self):
+        pixels = np.zeros((1000, 3, 3), dtype=np.uint8)
+        self.assertEqual(placeholders._box_downsample(pixels, 16).shape, (15, 1, 3))
+
+
+class TestDominantColor(unittest.TestCase):
+    def test_largest_area_wins(self):
+        pixels = np.zeros((10, 10, 3), dtype=np.uint8)
+        pixels[:6] = (200, 30, 30)
+        pixels[6:] = (10, 10, 240)
+        self.assertEqual(placeholders.dominant_color(pixels), "#c81e1e")
+
+    def test_averages_similar_shades(self):
+        pixels = np.array([[[100, 100, 100], [102, 100, 100], [0, 255, 0]]], dtype=np.uint8)
+        self.assertEqual(placeholders.dominant_color(pixels), "#656464")
+
+
+class TestRenderPlaceholder(unittest.TestCase):
+    def test_jpeg(self):
+        pixels = np.zeros((1200, 1600, 3), dtype=np.uint8)
+        pixels[:700] = (30, 120, 200)
+        result = placeholders.render_placeholder(_image_file(pixels, "JPEG"))
+        color = bytes.fromhex(result["dominant_color"][1:])
+        for channel, expected in zip(color, (30, 120, 200)):
+            self.assertAlmostEqual(channel, expected, delta=4)
+        with _lqip_image(result["lqip"]) as image:
+            self.assertEqual(image.format, "WEBP")
+            # whole pixel blocks only, the longer side is between LQIP_SIZE / 2 and LQIP_SIZE
+            self.assertEqual(image.size, (15, 11))
+        self.assertLess(len(result["lqip"]), 300)
+
+    def test_transparent_shown_on_white(self):
+        pixels = np.zeros((50, 50, 4), dtype=np.uint8)
+        result = placeholders.render_placeholder(_image_file(pixels))
+        self.assertEqual(result["dominant_color"], "#ffffff")
+
+    def test_not_an_image(self):
+        self.assertIsNone(placeholders.render_placeholder(b"<svg/>"))
+
+
+class TestCreatePlaceholder(unittest.IsolatedAsyncioTestCase):
+    async def test_placeholder(self):
+        result = await placeholders.create_placeholder(_image_file(np.full((40, 30, 3), 90, dtype=np.uint8)))
+        self.assertEqual(result["dominant_color"], "#5a5a5a")
+
+    async def test_not_an_image(self):
+        self.assertEqual(await placeholders.create_placeholder(b"text"), {})
@@ -0,0 +1,81 @@
+import os
+import sys
+import unittest
+import warnings
+
+from dotenv import load_dotenv
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.conf.config import settings
+from app.src.database import profiling
+
+
+class TestQueryProfiling(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        profiling.install(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+            conn.execute(text("INSERT INTO items (name) VALUES ('a'), ('b'), ('c')"))
+
+    def test_statement_shape_ignores_parameter_count(self):
+        self.assertEqual(
+            profiling.statement_shape("SELECT * FROM items WHERE id IN (?, ?, ?)"),
+            profiling.statement_shape("SELECT *\n  FROM items WHERE id IN (?)"),
+        )
+
+    def test_queries_are_counted_only_while_tracking(self):
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            with profiling.track_queries() as stats:
+                conn.execute(text("SELECT * FROM items")).all()
+                conn.execute(text("UPDATE items SET name = 'x'"))
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(stats.rows, 3)
+        self.assertGreater(stats.duration, 0)
+
+    def test_repeated_statement_warns(self):
+        with self.assertWarns(profiling.NPlusOneWarning):
+            with self.engine.connect() as conn, profiling.track_queries(threshold=2):
+                for item_id in range(1, 4):
+                    conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": item_id}).all()
+
+    def test_repeated_statement_below_threshold(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", profiling.NPlusOneWarning)
+            with self.engine.connect() as conn, profiling.track_queries(threshold=3):
+                for item_id in range(1, 4):
+                    conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": item_id}).all()
+
+    def test_middleware_headers_in_debug_mode(self):
+        app = FastAPI()
+        app.add_middleware(profiling.QueryStatsMiddleware)
+
+        @app.get("/items")
+        async def read_items():
+            with self.engine.connect() as conn:
+                return [row.name for row in conn.execute(text("SELECT name FROM items"))]
+
+        client = TestClient(app)
+        debug = settings.debug
+        try:
+            settings.debug = True
+            response = client.get("/items")
+            self.assertEqual(response.headers["x-db-query-count"], "1")
+            self.assertIn("x-db-time-ms", response.headers)
+
+            settings.debug = False
+            response = client.get("/items")
+            self.assertNotIn("x-db-query-count", response.headers)
+        finally:
+            settings.debug = debug
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from dotenv import load_dotenv
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services import rate_limit
+from app.src.services.rate_limit import Limit, LocalBuckets, RateLimiter
+
+
+class TestLimit(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(Limit.parse("10/minute"), Limit(10, 60))
+        self.assertEqual(Limit.parse(" 3 / 0.5 "), Limit(3, 0.5))
+        self.assertEqual(Limit.parse("5/day").rate, 5 / 86400)
+
+    def test_parse_invalid(self):
+        for value in ("10", "0/minute", "10/week", "10/0", "-1/second"):
+            with self.assertRaises(ValueError, msg=value):
+                Limit.parse(value)
+
+
+class TestLocalBuckets(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch.object(rate_limit.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.buckets = LocalBuckets(max_buckets=2)
+        self.limit = Limit(2, 10)
+
+    def test_refill(self):
+        self.assertEqual(self.buckets.take("a", self.limit, 1), (True, 1))
+        self.assertEqual(self.buckets.take("a", self.limit, 1), (True, 0))
+        self.assertEqual(self.buckets.take("a", self.limit, 1), (False, 0))
+        self.now += 5
+        self.assertEqual(self.buckets.take("a", self.limit, 1), (True, 0))
+        self.now += 60
+        self.assertEqual(self.buckets.take("a", self.limit, 1), (True, 1))
+
+    def test_least_recently_used_dropped(self):
+        for key in ("a", "b", "a", "c"):
+            self.buckets.take(key, self.limit, 1)
+        self.assertEqual(list(self.buckets._buckets), ["a", "c"])
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_headers(self):
+        limiter = RateLimiter(None, {"login": "2/minute"})
+        first = await limiter.hit("login", "ip:1")
+        self.assertEqual(first.headers(), {"RateLimit-Limit": "2", "RateLimit-Remaining": "1",
+                                           "RateLimit-Reset": "30", "RateLimit-Policy": "2;w=60"})
+        await limiter.hit("login", "ip:1")
+        refused = await limiter.hit("login", "ip:1")
+        self.assertFalse(refused.allowed)
+        self.assertEqual(refused.headers()["Retry-After"], "30")
+        self.assertTrue((await limiter.hit("login", "ip:2")).allowed)
+
+    async def test_unconfigured_not_limited(self):
+        self.assertIsNone(await RateLimiter(None, {}).hit("login", "ip:1"))
+
+    async def test_cost_above_capacity_rejected(self):
+        limiter = RateLimiter(None, {"upload": "3/minute"})
+        with self.assertRaises(ValueError):
+            await limiter.hit("upload", "user:1", cost=10)
+        self.assertTrue((await limiter.hit("upload", "user:1", cost=3)).allowed)
+        self.assertFalse((await limiter.hit("upload", "user:1")).allowed)
+
+    def test_max_cost(self):
+        limiter = RateLimiter(None, {"upload": "3/minute"})
+        self.assertEqual(limiter.max_cost("upload", 100), 3)
+        self.assertEqual(limiter.max_cost("upload", 2), 2)
+        self.assertEqual(limiter.max_cost("qr", 100), 100)
+
+    async def test_redis_script(self):
+        client = MagicMock()
+        script = client.register_script.return_value = AsyncMock(return_value=[1, b"4.5"])
+        decision = await RateLimiter(client, {"login": "5/minute"}).hit("login", "ip:1")
+        script.assert_awaited_once_with(keys=["ratelimit:login:ip:1"], args=[5, 5 / 60, 1])
+        self.assertEqual((decision.allowed, decision.tokens), (True, 4.5))
+
+    async def test_local_fallback_when_redis_down(self):
+        client = MagicMock()
+        script = client.register_script.return_value = AsyncMock(side_effect=RedisConnectionError("down"))
+        limiter = RateLimiter(client, {"login": "1/minute"})
+        self.assertTrue((await limiter.hit("login", "ip:1")).allowed)
+        self.assertFalse((await limiter.hit("login", "ip:1")).allowed)
+        # Redis is not asked again until REDIS_RETRY_AFTER
+        script.assert_awaited_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import MagicMock
+from sqlalchemy.orm import Session
+from datetime import datetime
+
+import sys
+import os
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.repository.comments import get_comments_page, count_comments
+from app.src.database.models import Comment
+
+
+class TestComments(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=Session)
+        self.query = self.session.query.return_value.filter.return_value
+        self.comments = [Comment(id=1, text="first", photo_id=5, user_id=2),
+                         Comment(id=2, text="second", photo_id=5, user_id=3)]
+
+    async def test_get_comments_page_first(self):
+        self.query.order_by.return_value.limit.return_value.all.return_value = self.comments
+        result = await get_comments_page(5, self.session, 2)
+        self.assertEqual(result, self.comments)
+        self.query.filter.assert_not_called()
+        self.query.order_by.return_value.limit.assert_called_once_with(2)
+
+    async def test_get_comments_page_after_cursor(self):
+        self.query.filter.return_value.order_by.return_value.limit.return_value.all.return_value = self.comments[1:]
+        result = await get_comments_page(5, self.session, 2, (datetime(2024, 4, 1), 1))
+        self.assertEqual(result, self.comments[1:])
+        self.query.filter.assert_called_once()
+
+    async def test_count_comments_fills_missing(self):
+        self.query.group_by.return_value.all.return_value = [(5, 12), (7, 1)]
+        result = await count_comments([5, 6, 7], self.session)
+        self.assertEqual(result, {5: 12, 6: 0, 7: 1})
+
+    async def test_count_comments_empty(self):
+        result = await count_comments([], self.session)
+        self.assertEqual(result, {})
+        self.session.query.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
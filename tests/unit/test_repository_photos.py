@@ -1,7 +1,8 @@
 import unittest
 from unittest.mock import MagicMock, AsyncMock
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Session
-from datetime import date
+from datetime import date, datetime
 
 import sys
 import os
@@ -12,14 +13,20 @@ load_dotenv()
 
 from app.src.repository.photos import (
     create_photo,
+    create_photos,
     edit_photo_tags,
     get_photo_by_id,
     process_tags,
     edit_photo_description,
     delete_photo,
     find_photos,
+    get_feed,
+    get_photos_by_ids,
+    get_photos_by_sha256,
+    find_similar_photos,
+    _new_photo,
 )
-from app.src.schemas import PhotoModel
+from app.src.schemas import PhotoModel, MetadataFilter
 from app.src.database.models import User, Photo, Tag
 from pydantic import ValidationError
 
@@ -83,6 +90,20 @@ class TestPhotosUser(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(photo_model.owner_id, self.user.id)
         self.assertEqual(photo_model.description, new_photo.description)
 
+    async def test_create_photos_ok(self):
+        photos_to_create = [
+            (PhotoModel(photo_url=f"http://example.com/{i}.jpg", owner_id=self.user.id, description=f"photo {i}"),
+             ["#Sea", "sun", "sea"])
+            for i in range(3)
+        ]
+        new_photos = await create_photos(self.session, photos_to_create)
+
+        self.assertEqual(len(new_photos), 3)
+        self.assertEqual([photo.description for photo in new_photos], ["photo 0", "photo 1", "photo 2"])
+        self.assertEqual([tag.name for tag in new_photos[0].tags], ["sea", "sun"])
+        self.assertIs(new_photos[0].tags[0], new_photos[2].tags[0])
+        self.session.commit.assert_called_once()
+
     async def test_get_photo_by_id_found(self):
         photo_id = 1
         self.session.query().filter().first.return_value = self.mock_photo
@@ -99,6 +120,13 @@ class TestPhotosUser(unittest.IsolatedAsyncioTestCase):
         self.assertNotEqual(photo, self.mock_photo)
         self.assertIsNone(photo)
 
+    async def test_get_photo_by_id_with_tags(self):
+        self.session.query().options().filter().first.return_value = self.mock_photo
+        photo = await get_photo_by_id(self.session, 1, with_tags=True)
+
+        self.assertEqual(photo, self.mock_photo)
+        self.session.query().options.assert_called()
+
     async def test_edit_photo_tags_ok(self):
         photo_id = 1
         user_id = self.user.id
@@ -264,7 +292,7 @@ class TestPhotosUser(unittest.IsolatedAsyncioTestCase):
 class TestFindPhotos(unittest.IsolatedAsyncioTestCase):
     async def asyncSetUp(self):
         self.db = MagicMock(spec=Session)
-        self.mock_query = self.db.query.return_value
+        self.mock_query = self.db.query.return_value.options.return_value
         self.mock_filter = self.mock_query.filter.return_value
         self.mock_3_filter = self.mock_query.filter.filter.filter.return_value
         self.mock_order_by = self.mock_filter.order_by.return_value
@@ -317,6 +345,105 @@ class TestFindPhotos(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(len(result), 2)
         self.assertEqual(result[0].id, 2)
 
+    async def test_find_photos_sort_by_taken_nulls_last(self):
+        await find_photos(self.db, key_word="Test", sort_by="taken")
+        order = self.mock_filter.order_by.call_args.args
+        sql = ", ".join(str(clause.compile(dialect=postgresql.dialect())) for clause in order)
+        self.assertEqual(sql, "photos.taken_at DESC NULLS LAST, photos.id DESC")
+
+    async def test_find_photos_by_metadata_only(self):
+        self.mock_filter.all.return_value = [self.photo_1]
+        metadata = MetadataFilter(camera_make="Canon", min_width=1000)
+        result = await find_photos(self.db, metadata=metadata)
+        self.assertEqual(result, [self.photo_1])
+        conditions = self.mock_query.filter.call_args.args
+        self.assertEqual(len(conditions), 2)
+
+    async def test_find_photos_empty_metadata(self):
+        result = await find_photos(self.db, metadata=MetadataFilter())
+        self.assertEqual(result, [])
+        self.db.query.assert_not_called()
+
+
+class TestPhotoExif(unittest.TestCase):
+    def test_gps_not_in_responses(self):
+        photo = Photo(camera_make="Canon", gps_latitude=50.45, gps_longitude=-30.52)
+        self.assertEqual(photo.exif["camera_make"], "Canon")
+        self.assertNotIn("gps_latitude", photo.exif)
+        self.assertNotIn("gps_longitude", photo.exif)
+
+    def test_gps_only_is_no_metadata(self):
+        self.assertIsNone(Photo(gps_latitude=50.45, gps_longitude=-30.52).exif)
+
+
+class TestPhotosByIds(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db = MagicMock(spec=Session)
+        self.query = self.db.query.return_value.options.return_value
+        self.photos = [Photo(id=1, description="one"), Photo(id=3, description="three")]
+
+    async def test_get_photos_by_ids_keeps_order(self):
+        self.query.filter.return_value.all.return_value = self.photos
+        result = await get_photos_by_ids(self.db, [3, 2, 1])
+        self.assertEqual([photo.id for photo in result], [3, 1])
+
+    async def test_get_photos_by_ids_empty(self):
+        result = await get_photos_by_ids(self.db, [])
+        self.assertEqual(result, [])
+        self.db.query.assert_not_called()
+
+
+class TestDuplicates(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db = MagicMock(spec=Session)
+
+    def test_new_photo_splits_dhash(self):
+        photo = _new_photo(PhotoModel(photo_url="u", owner_id=1, description="d", sha256="ab",
+                                      dhash=0x0001_0002_0003_0004))
+        self.assertEqual((photo.dhash_0, photo.dhash_1, photo.dhash_2, photo.dhash_3), (1, 2, 3, 4))
+        self.assertEqual(photo.sha256, "ab")
+
+    async def test_get_photos_by_sha256_oldest(self):
+        self.db.query.return_value.filter.return_value.order_by.return_value.all.return_value = [
+            Photo(id=9, sha256="ab"), Photo(id=4, sha256="ab")]
+        result = await get_photos_by_sha256(self.db, ["ab", "cd"])
+        self.assertEqual(result["ab"].id, 4)
+        self.assertNotIn("cd", result)
+
+    async def test_find_similar_photos_closest_within_distance(self):
+        self.db.query.return_value.filter.return_value.all.return_value = [
+            (5, 1, 2, 3, 0x0107),   # 2 bits off
+            (6, 1, 2, 3, 0x0105),   # 1 bit off
+            (7, 1, 9, 9, 9),        # far
+            (8, None, None, None, None),
+        ]
+        result = await find_similar_photos(self.db, [0x0001_0002_0003_0104, 0x0001_0002_0003_FF00], 3)
+        self.assertEqual(result, {0x0001_0002_0003_0104: 6})
+
+    async def test_find_similar_photos_empty(self):
+        self.assertEqual(await find_similar_photos(self.db, [], 3), {})
+        self.db.query.assert_not_called()
+
+
+class TestFeed(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.db = MagicMock(spec=Session)
+        self.query = self.db.query.return_value.options.return_value
+        self.photos = [MagicMock(spec=Photo, id=2), MagicMock(spec=Photo, id=1)]
+
+    async def test_get_feed_first_page(self):
+        self.query.order_by.return_value.limit.return_value.all.return_value = self.photos
+        result = await get_feed(self.db, 2)
+        self.assertEqual(result, self.photos)
+        self.query.filter.assert_not_called()
+        self.query.order_by.return_value.limit.assert_called_once_with(2)
+
+    async def test_get_feed_after_cursor(self):
+        self.query.filter.return_value.order_by.return_value.limit.return_value.all.return_value = self.photos[1:]
+        result = await get_feed(self.db, 2, (datetime(2024, 3, 30), 2))
+        self.assertEqual(result, self.photos[1:])
+        self.query.filter.assert_called_once()
+
 
 if __name__ == "__main__":
     unittest.main()
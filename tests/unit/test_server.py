@@ -0,0 +1,48 @@
+import os
+import runpy
+import sys
+import unittest
+from unittest.mock import patch
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.conf.config import settings
+
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "gunicorn.conf.py")
+
+try:
+    import gunicorn  # noqa: F401
+except ImportError:
+    gunicorn = None
+
+
+class TestGunicornConfig(unittest.TestCase):
+    def test_from_settings(self):
+        with patch.object(settings, "server_workers", 3), patch.object(settings, "server_keepalive", 7):
+            config = runpy.run_path(CONFIG_FILE)
+        self.assertEqual(config["workers"], 3)
+        self.assertEqual(config["keepalive"], 7)
+        self.assertEqual(config["max_requests"], settings.server_max_requests)
+        self.assertEqual(config["max_requests_jitter"], settings.server_max_requests_jitter)
+        self.assertTrue(config["preload_app"])
+        self.assertEqual(config["worker_class"], "app.src.services.server.UvicornWorker")
+
+    def test_worker_per_cpu_by_default(self):
+        with patch.object(settings, "server_workers", 0), patch("multiprocessing.cpu_count", return_value=6):
+            config = runpy.run_path(CONFIG_FILE)
+        self.assertEqual(config["workers"], 6)
+
+
+@unittest.skipIf(gunicorn is None, "gunicorn is not installed")
+class TestUvicornWorker(unittest.TestCase):
+    def test_loop_and_parser_from_settings(self):
+        from app.src.services.server import UvicornWorker
+        self.assertEqual(UvicornWorker.CONFIG_KWARGS["loop"], settings.server_loop)
+        self.assertEqual(UvicornWorker.CONFIG_KWARGS["http"], settings.server_http)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from benchmarks.import_time import ROOT, parse_importtime
+
+# the app must import with required settings only and without building service clients
+CHECK = """
+import sys
+import main, worker
+from app.src.services import redis_client
+assert redis_client.get_redis.cache_info().currsize == 0, "Redis client created on import"
+assert "numpy" not in sys.modules, "numpy imported on import"
+assert "uvicorn" not in sys.modules, "uvicorn imported on import"
+"""
+
+
+class TestStartup(unittest.TestCase):
+    def test_import_is_lazy(self):
+        env = {"PATH": os.environ.get("PATH", ""), "SQLALCHEMY_DATABASE_URL": "sqlite://",
+               "JWT_SECRET_KEY": "secret", "LOG_FILE": os.devnull}
+        completed = subprocess.run([sys.executable, "-c", CHECK], cwd=ROOT, env=env, capture_output=True, text=True)
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+
+    def test_parse_importtime(self):
+        stderr = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       120 |        120 |   json.decoder\n"
+                  "import time:       300 |        420 | json\n")
+        self.assertEqual(parse_importtime(stderr), [
+            {"name": "json.decoder", "self_ms": 0.12, "cumulative_ms": 0.12},
+            {"name": "json", "self_ms": 0.3, "cumulative_ms": 0.42},
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.repository.tags import normalize_tag, adjust_usage
+from app.src.services.tag_index import TagIndex, REFRESH_OVERLAP
+
+
+NOW = datetime(2024, 4, 1, 12, 0)
+
+
+class TestNormalizeTag(unittest.TestCase):
+    def test_normalize_tag(self):
+        self.assertEqual(normalize_tag(" #Sea "), "sea")
+        self.assertEqual(normalize_tag("##SUNSET"), "sunset")
+        self.assertEqual(normalize_tag("#"), "")
+
+
+class TestAdjustUsage(unittest.TestCase):
+    def setUp(self):
+        self.session = MagicMock(spec=Session)
+
+    def test_adjust_usage_updates_existing_and_adds_missing(self):
+        self.session.scalars.return_value = [1]
+        adjust_usage(self.session, [1, 2, None], 1)
+        self.session.execute.assert_called_once()
+        added = list(self.session.add_all.call_args.args[0])
+        self.assertEqual([(usage.tag_id, usage.usage_count) for usage in added], [(2, 1)])
+
+    def test_adjust_usage_nothing_to_do(self):
+        adjust_usage(self.session, [None], 1)
+        adjust_usage(self.session, [1], 0)
+        self.session.scalars.assert_not_called()
+
+
+class TestTagIndex(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.index = TagIndex()
+        self.index.apply([
+            (1, "sea", 10, NOW),
+            (2, "seal", 3, NOW),
+            (3, "season", 25, NOW),
+            (4, "sun", 40, NOW),
+            (5, "seaweed", 0, NOW),
+        ])
+
+    def test_suggest_ranks_prefix_by_usage(self):
+        self.assertEqual(self.index.suggest("sea"), [("season", 25), ("sea", 10), ("seal", 3)])
+        self.assertEqual(self.index.suggest("sea", limit=1), [("season", 25)])
+        self.assertEqual(self.index.suggest("x"), [])
+
+    def test_apply_changes_counts(self):
+        self.assertEqual(self.index.suggest("sea")[0], ("season", 25))
+        self.index.apply([(2, "seal", 30, NOW + timedelta(seconds=1)), (6, "seagull", 1, NOW)])
+        self.assertEqual(self.index.suggest("sea"),
+                         [("seal", 30), ("season", 25), ("sea", 10), ("seagull", 1)])
+
+    def test_cache_bounded(self):
+        index = TagIndex(cache_size=2)
+        index.apply([(1, "sea", 10, NOW), (2, "sun", 40, NOW)])
+        index.suggest("s")
+        index.suggest("se")
+        index.suggest("s")
+        index.suggest("su")
+        self.assertEqual(list(index._cache), [("s", 10), ("su", 10)])
+
+    async def test_refresh_reads_changes_since_last_update(self):
+        get_changes = MagicMock(return_value=[(1, "sea", 11, NOW + timedelta(minutes=1))])
+
+        async def fake_get_usage_changes(db, since):
+            return get_changes(db, since)
+
+        with patch("app.src.repository.tags.get_usage_changes", fake_get_usage_changes):
+            await self.index.refresh("db")
+            await self.index.maybe_refresh("db", max_age=60)
+        get_changes.assert_called_once_with("db", NOW - REFRESH_OVERLAP)
+        self.assertIn(("sea", 11), self.index.suggest("sea"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from dotenv import load_dotenv
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services import jobs, tasks
+from app.src.database.models import Base, User, Photo
+
+
+class TestDeleteFiles(unittest.IsolatedAsyncioTestCase):
+    async def test_deleted(self):
+        delete = AsyncMock(return_value=[{"result": "ok"}, {"result": "not found"}])
+        with patch.object(tasks.cloudinary_services, "delete_photos", delete):
+            await tasks.delete_files(["u1", "u2"])
+        delete.assert_awaited_once_with(["u1", "u2"], tasks.settings.upload_concurrency)
+
+    async def test_failure_raised_for_retry(self):
+        delete = AsyncMock(return_value=[{"result": "ok"}, ConnectionError("down")])
+        with patch.object(tasks.cloudinary_services, "delete_photos", delete):
+            with self.assertRaises(RuntimeError):
+                await tasks.delete_files(["u1", "u2"])
+
+
+class TestPasswordResetEmail(unittest.IsolatedAsyncioTestCase):
+    async def test_link_carries_reset_id(self):
+        send = AsyncMock()
+        with patch.object(tasks.email_service, "send_template", send):
+            await tasks.send_password_reset_email("anna@example.com", "anna", "http://test/", "reset-id")
+        token = send.await_args.args[3]["token"]
+        payload = jwt.decode(token, tasks.auth_service.SECRET_KEY, algorithms=[tasks.auth_service.ALGORITHM])
+        self.assertEqual((payload["sub"], payload["reset"]), ("anna@example.com", "reset-id"))
+
+
+class TestRenderThumbnails(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.session_factory = sessionmaker(bind=engine)
+        with self.session_factory() as db:
+            db.add(User(id=1, username="anna", email="anna@example.com", password="x"))
+            db.add_all([Photo(id=1, photo_url="https://e/1.jpg", owner_id=1),
+                        Photo(id=2, photo_url="https://e/1.jpg", owner_id=1),
+                        Photo(id=3, photo_url="https://e/3.jpg", owner_id=1, thumbnails={"128": "t3"})])
+            db.commit()
+        self.queue = jobs.JobQueue(jobs.MemoryBackend())
+        for patcher in (patch.object(tasks, "get_session_factory", return_value=self.session_factory),
+                        patch.object(tasks, "_download", return_value=b"image"),
+                        patch.object(jobs, "_queue", self.queue)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _thumbnails(self) -> dict:
+        with self.session_factory() as db:
+            return {photo.id: photo.thumbnails for photo in db.query(Photo)}
+
+    async def test_shared_by_duplicates(self):
+        create = AsyncMock(return_value=[{"128": "t1"}])
+        with patch.object(tasks.thumbnails, "create_thumbnails", create):
+            await tasks.render_thumbnails(1)
+            await tasks.render_thumbnails(2)
+        create.assert_awaited_once()
+        self.assertEqual(self._thumbnails(), {1: {"128": "t1"}, 2: {"128": "t1"}, 3: {"128": "t3"}})
+
+    async def test_rendered_once(self):
+        create = AsyncMock()
+        with patch.object(tasks.thumbnails, "create_thumbnails", create):
+            await tasks.render_thumbnails(3)
+            await tasks.render_thumbnails(404)
+        create.assert_not_awaited()
+
+    async def test_failure_raised_for_retry(self):
+        with patch.object(tasks.thumbnails, "create_thumbnails", AsyncMock(return_value=[None])):
+            with self.assertRaises(RuntimeError):
+                await tasks.render_thumbnails(1)
+
+    async def test_photo_deleted_meanwhile(self):
+        async def create(files):
+            with self.session_factory() as db:
+                db.query(Photo).filter(Photo.photo_url == "https://e/1.jpg").delete()
+                db.commit()
+            return [{"128": "t1"}]
+
+        with patch.object(tasks.thumbnails, "create_thumbnails", create):
+            await tasks.render_thumbnails(1)
+        [job] = self.queue.backend.queued.values()
+        self.assertEqual((job.name, job.kwargs), (tasks.DELETE_FILES, {"urls": ["t1"]}))
+
+
+if __name__ == "__main__":
+    unittest.main()
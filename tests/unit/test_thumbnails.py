@@ -0,0 +1,86 @@
+import asyncio
+import io
+import os
+import sys
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from dotenv import load_dotenv
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services import thumbnails
+
+
+def _image_file(size=(2000, 1000), fmt="JPEG", mode="RGB") -> bytes:
+    buffer = io.BytesIO()
+    Image.new(mode, size, (200, 100, 50) if mode == "RGB" else (200, 100, 50, 128)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class TestRenderThumbnails(unittest.TestCase):
+    def test_sizes_keep_aspect_ratio(self):
+        renditions = thumbnails.render_thumbnails(_image_file(), [128, 512, 1024], 80)
+        self.assertEqual(sorted(renditions), [128, 512, 1024])
+        with Image.open(io.BytesIO(renditions[512])) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertEqual(image.size, (512, 256))
+
+    def test_no_upscaling(self):
+        renditions = thumbnails.render_thumbnails(_image_file((300, 200), "PNG", "RGBA"), [128, 512], 80)
+        with Image.open(io.BytesIO(renditions[512])) as image:
+            self.assertEqual(image.size, (300, 200))
+            self.assertEqual(image.mode, "RGBA")
+
+    def test_not_an_image(self):
+        self.assertEqual(thumbnails.render_thumbnails(b"<svg/>", [128], 80), {})
+
+
+class TestCreateThumbnails(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # render in process, the pool itself is covered by concurrent.futures
+        self.render = patch.object(thumbnails, "_render", side_effect=self._render_inline)
+        self.render.start()
+        self.addCleanup(self.render.stop)
+
+    @staticmethod
+    async def _render_inline(file):
+        return thumbnails.render_thumbnails(file.read(), [128, 512], 80)
+
+    async def test_urls_by_size(self):
+        upload = AsyncMock(side_effect=lambda files, concurrency: [{"secure_url": f"u{i}"} for i in range(len(files))])
+        with patch.object(thumbnails.settings, "thumbnail_sizes", [128, 512]), \
+             patch.object(thumbnails.cloudinary_services, "upload_photos", upload):
+            result = await thumbnails.create_thumbnails([io.BytesIO(_image_file()), io.BytesIO(b"not an image")])
+        self.assertEqual(result, [{"512": "u0", "128": "u1"}, None])
+
+    async def test_failed_upload_removes_leftovers(self):
+        upload = AsyncMock(return_value=[{"secure_url": "u0"}, RuntimeError("down")])
+        delete = AsyncMock()
+        with patch.object(thumbnails.settings, "thumbnail_sizes", [128, 512]), \
+             patch.object(thumbnails.cloudinary_services, "upload_photos", upload), \
+             patch.object(thumbnails.cloudinary_services, "delete_photo", delete):
+            result = await thumbnails.create_thumbnails([io.BytesIO(_image_file())])
+        self.assertEqual(result, [None])
+        delete.assert_awaited_once_with("u0")
+
+    async def test_disabled(self):
+        with patch.object(thumbnails.settings, "thumbnail_sizes", []):
+            self.assertEqual(await thumbnails.create_thumbnails([io.BytesIO(b"x")]), [None])
+
+
+class TestPool(unittest.TestCase):
+    def test_renders_in_worker_process(self):
+        async def run():
+            return await thumbnails._render(io.BytesIO(_image_file()))
+        try:
+            renditions = asyncio.run(run())
+        finally:
+            thumbnails.shutdown()
+        self.assertEqual(sorted(renditions), sorted(thumbnails.settings.thumbnail_sizes))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import json
+import math
+import os
+import sys
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from dotenv import load_dotenv
+from redis.exceptions import ConnectionError
+from sqlalchemy import create_engine
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+load_dotenv()
+
+from app.src.services import trending
+from app.src.database.models import Base, Photo, Rate, User
+
+
+class TestTrending(unittest.TestCase):
+    def setUp(self):
+        self.photo = Photo(id=7, photo_url="https://example.com/7.jpg", owner_id=3, description="sea",
+                           created_at=datetime(2024, 4, 1, 12, 0))
+
+    def test_record_rate_runs_script(self):
+        with patch.object(trending, "_update") as update:
+            trending.record_rate(self.photo, 4)
+        kwargs = update.call_args.kwargs
+        self.assertEqual(kwargs["keys"], [trending.SCORES_KEY, trending.VOTES_KEY, trending.PHOTOS_KEY])
+        self.assertEqual(kwargs["args"][:4], [7, 1, 4, self.photo.created_at.timestamp()])
+        self.assertEqual(json.loads(kwargs["args"][6])["photo_url"], "https://example.com/7.jpg")
+
+    def test_remove_rate_negates_deltas(self):
+        with patch.object(trending, "_update") as update:
+            trending.remove_rate(self.photo, 4)
+        self.assertEqual(update.call_args.kwargs["args"][1:3], [-1, -4])
+        self.assertEqual(update.call_args.kwargs["args"][6], "")
+
+    def test_safely_swallows_redis_errors(self):
+        update = MagicMock(side_effect=ConnectionError("down"), __name__="record_rate")
+        trending.safely(update, self.photo, 5)
+        update.assert_called_once_with(self.photo, 5)
+
+    def test_top_reads_snapshots_and_votes(self):
+        redis = MagicMock()
+        redis.zrevrange.return_value = [(b"7", 20000.5), (b"9", 19999.1)]
+        redis.pipeline.return_value.execute.return_value = [
+            [trending._snapshot(self.photo), None],
+            [b"4", b"18", b"1", b"5"],
+        ]
+        with patch.object(trending, "get_redis", return_value=redis):
+            result = trending.top(2)
+        redis.zrevrange.assert_called_once_with(trending.SCORES_KEY, 0, 1, withscores=True)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]["id"], 7)
+        self.assertEqual(result[0]["votes"], 4)
+        self.assertEqual(result[0]["rating"], 4.5)
+        self.assertEqual(result[0]["score"], 20000.5)
+
+    def test_top_skips_invalid_snapshots(self):
+        broken = Photo(id=9, photo_url=None, owner_id=3, created_at=self.photo.created_at)
+        redis = MagicMock()
+        redis.zrevrange.return_value = [(b"9", 20000.5), (b"7", 19999.1)]
+        redis.pipeline.return_value.execute.return_value = [
+            [trending._snapshot(broken), trending._snapshot(self.photo)],
+            [b"1", b"5", b"4", b"18"],
+        ]
+        with patch.object(trending, "get_redis", return_value=redis):
+            result = trending.top(2)
+        self.assertEqual([item["id"] for item in result], [7])
+
+    def test_top_empty(self):
+        redis = MagicMock()
+        redis.zrevrange.return_value = []
+        with patch.object(trending, "get_redis", return_value=redis):
+            self.assertEqual(trending.top(), [])
+        redis.pipeline.assert_not_called()
+
+
+class TestRebuild(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.created_at = datetime(2024, 4, 1, 12, 0)
+        with self.engine.begin() as conn:
+            conn.execute(User.__table__.insert(), [{"id": i, "username": f"u{i}", "email": f"u{i}@example.com",
+                                                    "password": "x"} for i in (1, 2, 3)])
+            conn.execute(Photo.__table__.insert(), [{"id": i, "photo_url": f"https://e/{i}.jpg", "owner_id": 1,
+                                                     "created_at": self.created_at} for i in (1, 2, 3)])
+            conn.execute(Rate.__table__.insert(), [{"rate": 5, "photo_id": 1, "user_id": 2},
+                                                   {"rate": 4, "photo_id": 1, "user_id": 3},
+                                                   {"rate": 3, "photo_id": 2, "user_id": 2}])
+        self.redis = MagicMock()
+        patcher = patch.object(trending, "get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _rebuild(self) -> int:
+        with self.engine.connect() as conn:
+            return trending.rebuild(conn)
+
+    def test_scores_from_rates(self):
+        self.assertEqual(self._rebuild(), 2)
+        pipe = self.redis.pipeline.return_value
+        [scores] = [c.args[1] for c in pipe.zadd.call_args_list]
+        self.assertEqual(scores, {1: trending._score(2, 9, 3, 12, self.created_at),
+                                  2: trending._score(1, 3, 3, 12, self.created_at)})
+        votes = {}
+        for c in pipe.hset.call_args_list:
+            if c.args[0] == trending.VOTES_KEY + trending.REBUILD_SUFFIX:
+                votes.update(c.kwargs["mapping"])
+        self.assertEqual(votes, {"all:n": 3, "all:sum": 12, "1:n": 2, "1:sum": 9, "2:n": 1, "2:sum": 3})
+        pipe.rename.assert_any_call(trending.SCORES_KEY + trending.REBUILD_SUFFIX, trending.SCORES_KEY)
+
+    def test_rates_given_during_rebuild_are_replayed(self):
+        with self.engine.connect() as conn:
+            def rate_meanwhile():
+                self.redis.pipeline.return_value.execute.side_effect = None
+                conn.execute(Rate.__table__.insert(), {"rate": 2, "photo_id": 3, "user_id": 2})
+            self.redis.pipeline.return_value.execute.side_effect = rate_meanwhile
+            with patch.object(trending, "record_rate") as record_rate:
+                self.assertEqual(trending.rebuild(conn), 2)
+        [(photo, rate)] = [c.args for c in record_rate.call_args_list]
+        self.assertEqual((photo.id, rate), (3, 2))
+
+    def test_score_matches_script(self):
+        # prior 5 votes at the mean 4.0: (5 * 4 + 9) / 7
+        with patch.object(trending.settings, "trending_prior_votes", 5), \
+             patch.object(trending.settings, "trending_decay_seconds", 86400):
+            score = trending._score(2, 9, 3, 12, self.created_at)
+        self.assertAlmostEqual(score, math.log(29 / 7) + self.created_at.timestamp() / 86400)
+
+    def test_no_rates_clears_leaderboard(self):
+        with self.engine.begin() as conn:
+            conn.execute(Rate.__table__.delete())
+        self.assertEqual(self._rebuild(), 0)
+        pipe = self.redis.pipeline.return_value
+        pipe.delete.assert_called_with(trending.SCORES_KEY, trending.VOTES_KEY, trending.PHOTOS_KEY)
+        pipe.rename.assert_called_once_with(trending.VOTES_KEY + trending.REBUILD_SUFFIX, trending.VOTES_KEY)
+
+
+if __name__ == "__main__":
+    unittest.main()
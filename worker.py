@@ -0,0 +1,67 @@
+"""
+Background job worker, runs jobs enqueued by the web app (emails, file deletion, thumbnails).
+
+    python worker.py
+    python worker.py --concurrency 16 --metrics-port 9100
+
+Any number of workers can run next to each other, every job goes to one of them.
+SIGTERM and SIGINT stop fetching new jobs and let running ones finish.
+"""
+import argparse
+import asyncio
+import signal
+
+from app.src.conf.config import settings
+from app.src.services import tasks  # noqa: F401  registers job handlers
+from app.src.services import email, thumbnails
+from app.src.services.jobs import Worker, create_backend
+from app.src.services.logging import start_logging, stop_logging
+from app.src.services.metrics import CONTENT_TYPE, REGISTRY
+
+
+async def serve_metrics(port: int) -> asyncio.Server:
+    """
+    Minimal HTTP server answering every request with metrics of this worker in Prometheus text format
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = REGISTRY.render().encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: " + CONTENT_TYPE.encode() +
+                         b"\r\nContent-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "0.0.0.0", port)
+
+
+async def main(concurrency: int, metrics_port: int | None) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    # fails before taking jobs when mail settings are incomplete
+    email.get_mailer()
+    server = await serve_metrics(metrics_port) if metrics_port else None
+    worker = Worker(create_backend(), concurrency)
+    start_logging()
+    try:
+        await worker.run(stop)
+    finally:
+        if server is not None:
+            server.close()
+        await email.close_mailer()
+        thumbnails.shutdown()
+        stop_logging()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run PhotoShare background jobs")
+    parser.add_argument("--concurrency", type=int, default=settings.job_concurrency, help="jobs run at once")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.metrics_port))